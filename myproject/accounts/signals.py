@@ -0,0 +1,78 @@
+# accounts/signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from search import autocomplete, fulltext
+from search.documents import is_workshop_cascade, refresh_workshop_document
+from .models import ActivityArea, ServicePrice, WorkshopProfile
+
+
+@receiver(post_save, sender=WorkshopProfile)
+def workshop_saved(sender, instance, **kwargs):
+    refresh_workshop_document(instance.pk)
+    autocomplete.workshop_changed(instance)
+
+
+@receiver(post_delete, sender=WorkshopProfile)
+def workshop_deleted(sender, instance, **kwargs):
+    # документ удаляется каскадом, а строку FTS-индекса убираем сами
+    fulltext.remove_workshop(instance.pk)
+    autocomplete.workshop_deleted(instance.pk)
+
+
+@receiver(m2m_changed, sender=WorkshopProfile.activity_area.through)
+def workshop_activity_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # изменили набор студий у ActivityArea
+        workshop_ids = pk_set or []
+    else:
+        workshop_ids = [instance.pk]
+    for workshop_id in workshop_ids:
+        refresh_workshop_document(workshop_id)
+
+
+@receiver(post_save, sender=ActivityArea)
+def activity_area_saved(sender, instance, created, **kwargs):
+    # название, код и категория сферы денормализованы в документы её студий
+    if not created:
+        for workshop_id in instance.workshopprofile_set.values_list('pk', flat=True):
+            refresh_workshop_document(workshop_id)
+
+
+@receiver(pre_delete, sender=ActivityArea)
+def activity_area_deleting(sender, instance, **kwargs):
+    # после удаления связи со студиями уже не найти — запоминаем их заранее
+    instance._workshop_ids = list(instance.workshopprofile_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=ActivityArea)
+def activity_area_deleted(sender, instance, **kwargs):
+    for workshop_id in getattr(instance, '_workshop_ids', ()):
+        refresh_workshop_document(workshop_id)
+
+
+@receiver(post_save, sender=ServicePrice)
+def service_price_saved(sender, instance, **kwargs):
+    refresh_workshop_document(instance.workshop_id)
+    autocomplete.service_changed(instance)
+
+
+@receiver(post_delete, sender=ServicePrice)
+def service_price_deleted(sender, instance, origin=None, **kwargs):
+    autocomplete.service_deleted(instance.pk)
+    if not is_workshop_cascade(origin):
+        refresh_workshop_document(instance.workshop_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # логин сохраняет только last_login — документ не меняется
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    workshop = WorkshopProfile.objects.filter(user=instance).first()
+    if workshop:
+        refresh_workshop_document(workshop.pk)
+        autocomplete.workshop_changed(workshop)
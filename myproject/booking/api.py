@@ -0,0 +1,170 @@
+# booking/api.py
+"""
+Компактный JSON API для календарных виджетов: занятость месяца, свободные
+слоты дня, запись на слот и отмена записи.
+
+Ответы маленькие: строки дня и слота — массивы, порядок полей передаётся
+один раз в 'fields'. GET-ответы несут ETag от тела ответа, и повторный
+запрос с If-None-Match получает 304 — занятость месяца при этом берётся
+из кэша month_occupancy, т.е. без запросов к слотам и записям.
+Запись и отмена возвращают обновлённую строку занятости своего дня,
+чтобы виджет перерисовал одну клетку, не перечитывая месяц.
+"""
+import hashlib
+import json
+from datetime import date
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET, require_POST
+
+from accounts.models import ClientProfile
+from showcase.models import Specialist
+
+from .forms import AppointmentForm
+from .models import Appointment, Availability
+from .services import SlotUnavailable, book_slot, free_slots, month_occupancy
+
+OCCUPANCY_FIELDS = ['free', 'held', 'pending', 'confirmed', 'first_free']
+SLOT_FIELDS = ['id', 'start', 'end', 'service', 'price']
+
+
+def _hhmm(value):
+    return value.strftime('%H:%M') if value else None
+
+
+def _day_row(counts):
+    return [counts['free'], counts['held'], counts['pending'], counts['confirmed'], _hhmm(counts['first_free'])]
+
+
+def _day_occupancy(specialist_id, day):
+    """Строка занятости одного дня (из кэша месяца, если он не сброшен)."""
+    return _day_row(month_occupancy(specialist_id, day.year, day.month)[day.day])
+
+
+def _client(request):
+    try:
+        return request.user.clientprofile
+    except ClientProfile.DoesNotExist:
+        return None
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _conditional_json(request, data):
+    """JSON-ответ с ETag от тела; совпавший If-None-Match — 304 без тела."""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = f'"{hashlib.md5(body).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@require_GET
+def occupancy(request, pk):
+    """
+    GET ?month=YYYY-MM (по умолчанию текущий):
+    {"month": "2026-10", "fields": [...], "days": {"5": [free, held, pending, confirmed, "HH:MM"|null]}}.
+    Дни без слотов и записей не передаются.
+    """
+    specialist = get_object_or_404(Specialist.objects.only('pk'), pk=pk)
+    today = timezone.localdate()
+    try:
+        year, month = map(int, request.GET.get('month', '').split('-'))
+        date(year, month, 1)
+    except ValueError:
+        year, month = today.year, today.month
+
+    days = {
+        str(day): _day_row(counts)
+        for day, counts in month_occupancy(specialist.pk, year, month).items()
+        if counts['free'] or counts['held'] or counts['pending'] or counts['confirmed']
+    }
+    return _conditional_json(request, {'month': f'{year:04d}-{month:02d}', 'fields': OCCUPANCY_FIELDS, 'days': days})
+
+
+@login_required
+@require_GET
+def day_slots(request, pk):
+    """
+    GET ?date=YYYY-MM-DD: свободные слоты дня для текущего пользователя
+    (его собственное удержание слот не скрывает):
+    {"date": ..., "fields": [...], "slots": [[id, "HH:MM", "HH:MM", service, price]]}.
+    """
+    specialist = get_object_or_404(Specialist.objects.only('pk'), pk=pk)
+    try:
+        day = parse_date(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+    except ValueError:   # формат верный, но даты нет: 2026-02-30
+        day = None
+    if day is None:
+        return _error('Неверная дата.', 400)
+
+    rows = free_slots(specialist, day, client=_client(request)).values_list(
+        'pk', 'start_time', 'end_time', 'service__service_name', 'service__price',
+    )
+    slots = [
+        [slot_id, _hhmm(start), _hhmm(end), service, str(price) if price is not None else None]
+        for slot_id, start, end, service, price in rows
+    ]
+    return _conditional_json(request, {'date': day.isoformat(), 'fields': SLOT_FIELDS, 'slots': slots})
+
+
+@login_required
+@require_POST
+def book(request, pk):
+    """
+    POST notes=...: записать текущего клиента на слот.
+    201 {"appointment": id, "status": ..., "date": ..., "day": [...]}; 409 — слот занят.
+    """
+    availability = get_object_or_404(Availability, pk=pk)
+    client = _client(request)
+    if client is None:
+        return _error('Клиентский профиль не найден.', 403)
+    form = AppointmentForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Неверные данные.', 'fields': form.errors}, status=400)
+    try:
+        appointment = book_slot(availability, client, notes=form.cleaned_data['notes'])
+    except SlotUnavailable as exc:
+        return _error(str(exc), 409)
+    return JsonResponse({
+        'appointment': appointment.pk,
+        'status': appointment.status,
+        'date': availability.date.isoformat(),
+        'day': _day_occupancy(availability.specialist_id, availability.date),
+    }, status=201)
+
+
+@login_required
+@require_POST
+def cancel(request, pk):
+    """
+    POST: отменить свою запись (прошедшую — нельзя, 409).
+    {"appointment": id, "status": "cancelled", "date": ..., "day": [...]}.
+    """
+    client = _client(request)
+    if client is None:
+        return _error('Клиентский профиль не найден.', 403)
+    appointment = get_object_or_404(Appointment.objects.select_related('availability'), pk=pk, client=client)
+    day = appointment.availability.date
+    if day < timezone.localdate():
+        return _error('Нельзя отменить прошедшую запись.', 409)
+    if appointment.status != Appointment.STATUS_CANCELLED:
+        appointment.status = Appointment.STATUS_CANCELLED
+        appointment.save(update_fields=['status', 'updated_at'])
+    return JsonResponse({
+        'appointment': appointment.pk,
+        'status': appointment.status,
+        'date': day.isoformat(),
+        'day': _day_occupancy(appointment.specialist_id, day),
+    })
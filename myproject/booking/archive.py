@@ -0,0 +1,127 @@
+# booking/archive.py
+"""
+Архивация прошедших слотов и записей.
+
+Слоты старше горизонта уходят из живых таблиц пачками: записи переносятся
+в ArchivedAppointment, счётчики месяца прибавляются к SpecialistMonthStats,
+затем записи и слоты удаляются. Каждая пачка — отдельная транзакция, так
+что архивацию можно прервать и запустить снова. Удаление идёт мимо ORM
+(без сбора объектов и сигналов) — кэш занятости затронутых месяцев
+сбрасывается явно.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment, Availability, SlotHold, SpecialistMonthStats
+from .services import ACTIVE_STATUSES, invalidate_month_occupancy
+
+# слоты старше стольких дней уходят в архив
+ARCHIVE_AFTER_DAYS = getattr(settings, 'BOOKING_ARCHIVE_AFTER_DAYS', 90)
+ARCHIVE_BATCH_SIZE = 500
+
+STATUS_COUNTERS = {
+    Appointment.STATUS_CONFIRMED: 'confirmed',
+    Appointment.STATUS_PENDING: 'pending',
+    Appointment.STATUS_CANCELLED: 'cancelled',
+}
+
+
+@dataclass
+class ArchiveResult:
+    slots: int = 0
+    appointments: int = 0
+    batches: int = 0
+
+
+def archive_cutoff(days=None):
+    """Первая дата, которая остаётся в живых таблицах."""
+    return timezone.localdate() - timedelta(days=ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def archive_before(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Перенести в архив все слоты с датой раньше cutoff. Возвращает ArchiveResult."""
+    result = ArchiveResult()
+    while True:
+        slots, appointments = _archive_batch(cutoff, batch_size)
+        if not slots:
+            return result
+        result.slots += slots
+        result.appointments += appointments
+        result.batches += 1
+
+
+def _archive_batch(cutoff, batch_size):
+    with transaction.atomic():
+        slots = list(
+            Availability.objects
+            .filter(date__lt=cutoff)
+            .order_by('date', 'pk')
+            .values_list('pk', 'specialist_id', 'date')[:batch_size]
+        )
+        if not slots:
+            return 0, 0
+        slot_months = {pk: (specialist_id, day.replace(day=1)) for pk, specialist_id, day in slots}
+        appointments = list(
+            Appointment.objects
+            .filter(availability_id__in=slot_months)
+            .order_by()
+            .values_list('pk', 'availability_id', 'specialist_id', 'client_id', 'service__service_name',
+                         'status', 'starts_at', 'ends_at', 'notes', 'created_at')
+        )
+
+        stats = {}
+        booked = set()
+        for pk, availability_id, specialist_id, client_id, service_name, status, *_ in appointments:
+            counters = stats.setdefault(slot_months[availability_id], Counter())
+            counters[STATUS_COUNTERS.get(status, 'cancelled')] += 1
+            if status in ACTIVE_STATUSES:
+                booked.add(availability_id)
+        for pk, month in slot_months.items():
+            counters = stats.setdefault(month, Counter())
+            counters['slots'] += 1
+            counters['booked_slots'] += pk in booked
+
+        ArchivedAppointment.objects.bulk_create(
+            [
+                ArchivedAppointment(
+                    appointment_id=pk, specialist_id=specialist_id, client_id=client_id,
+                    service_name=service_name or '', status=status, starts_at=starts_at, ends_at=ends_at,
+                    notes=notes, created_at=created_at,
+                )
+                for pk, _, specialist_id, client_id, service_name, status, starts_at, ends_at, notes, created_at
+                in appointments
+            ],
+            ignore_conflicts=True,
+        )
+        _add_month_stats(stats)
+        _delete_rows(Appointment, [row[0] for row in appointments])
+        _delete_rows(SlotHold, list(slot_months), column='availability_id')
+        _delete_rows(Availability, list(slot_months))
+
+    # вне транзакции: иначе параллельный запрос успеет закэшировать старые данные
+    for specialist_id, month in stats:
+        invalidate_month_occupancy(specialist_id, month)
+    return len(slots), len(appointments)
+
+
+def _add_month_stats(stats):
+    for (specialist_id, month), counters in stats.items():
+        row, _ = SpecialistMonthStats.objects.get_or_create(specialist_id=specialist_id, month=month)
+        SpecialistMonthStats.objects.filter(pk=row.pk).update(
+            **{name: F(name) + value for name, value in counters.items() if value}
+        )
+
+
+def _delete_rows(model, values, column='id'):
+    if not values:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {connection.ops.quote_name(column)} IN ({placeholders})', values)
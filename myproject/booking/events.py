@@ -0,0 +1,153 @@
+# booking/events.py
+"""
+События "слот занят" / "слот освободился" для открытой страницы записи.
+
+Сигналы Appointment и Availability (booking.signals) после коммита
+публикуют событие в канал специалиста и даты; SSE-эндпоинт
+(views.slot_events) держит подписку и отдаёт события браузеру, так что
+смотрящие на популярного специалиста не перезагружают страницу и не
+нагружают БД.
+
+Поток держит соединение открытым, поэтому он включается только под
+ASGI: настройка BOOKING_LIVE_EVENTS. Под WSGI каждое соединение заняло бы
+поток воркера навсегда — там эндпоинт отвечает 204 (EventSource после
+этого не переподключается), а страница записи не подписывается.
+
+Брокер выбирается настройкой BOOKING_EVENTS_BROKER (путь к классу).
+InProcessBroker доставляет события только подписчикам своего процесса —
+этого хватает одному ASGI-процессу и тестам; для нескольких воркеров его
+заменяют брокером с тем же интерфейсом (publish/subscribe) поверх общей
+шины.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BROKER_PATH = getattr(settings, 'BOOKING_EVENTS_BROKER', 'booking.events.InProcessBroker')
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 20
+
+SLOT_TAKEN = 'taken'
+SLOT_FREED = 'freed'
+
+
+def live_events_enabled():
+    return getattr(settings, 'BOOKING_LIVE_EVENTS', False)
+
+
+def slot_channel(specialist_id, day):
+    return f'slots:{specialist_id}:{day.isoformat()}'
+
+
+class InProcessBroker:
+    """
+    Подписчики — asyncio.Queue в цикле событий ASGI-процесса. publish
+    вызывается из любых потоков (синхронные view работают в пуле потоков),
+    поэтому событие кладётся в очередь через call_soon_threadsafe.
+    Медленный подписчик с переполненной очередью теряет события.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:   # цикл подписчика уже закрыт
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        """async with broker.subscribe(channel) as queue: event = await queue.get()"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        logger.warning('Очередь подписчика переполнена, событие %s пропущено', event.get('type'))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(BROKER_PATH)()
+
+
+def publish_slot_event(kind, specialist_id, slot_id, starts_at, ends_at):
+    """Опубликовать событие после коммита текущей транзакции (сразу — вне транзакции)."""
+    tz = timezone.get_current_timezone()
+    start, end = starts_at.astimezone(tz), ends_at.astimezone(tz)
+    event = {'type': kind, 'slot': slot_id, 'start': start.strftime('%H:%M'), 'end': end.strftime('%H:%M')}
+    channel = slot_channel(specialist_id, start.date())
+    transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+def publish_slot_events(slots):
+    """
+    Пачка событий для массовых операций со слотами (bulk_create, вставка
+    генератором): slots — [(kind, specialist_id, slot_id, date, start_time, end_time)]
+    в локальном времени, как в Availability. Один on_commit на всю пачку.
+    """
+    channels, times, messages = {}, {}, []   # каналы и время повторяются из слота в слот
+    for kind, specialist_id, slot_id, day, start, end in slots:
+        channel = channels.get((specialist_id, day))
+        if channel is None:
+            channel = channels[specialist_id, day] = slot_channel(specialist_id, day)
+        for t in (start, end):
+            if t not in times:
+                times[t] = t.strftime('%H:%M')
+        messages.append((channel, {'type': kind, 'slot': slot_id, 'start': times[start], 'end': times[end]}))
+    if messages:
+        transaction.on_commit(lambda: _publish_all(messages))
+
+
+def _publish_all(messages):
+    broker = get_broker()
+    for channel, event in messages:
+        broker.publish(channel, event)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def stream_slot_events(channel, keepalive=KEEPALIVE_SECONDS):
+    """
+    Поток SSE канала. Раз в keepalive секунд без событий шлётся комментарий,
+    чтобы прокси не закрывали соединение. При отключении клиента генератор
+    отменяется, и подписка снимается в subscribe().
+    """
+    async with get_broker().subscribe(channel) as queue:
+        yield f'retry: {keepalive * 1000}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_sse(event)
@@ -0,0 +1,107 @@
+# booking/export.py
+"""
+Выгрузка записей студии в CSV.
+
+Строки читаются через values_list(...).iterator(chunk_size) и сразу
+пишутся в поток ответа, так что память не зависит от объёма истории.
+Сначала идут архивные записи (ArchivedAppointment, они всегда старше
+живых), затем живые — порядок по времени сохраняется.
+
+Текстовые поля, которые вводят клиенты и студии, экранируются: ячейка,
+начинающаяся с = + - @ или табуляции/перевода строки, в Excel считается
+формулой, поэтому перед такими значениями ставится апостроф. Телефоны и
+числа (+375 29 123-45-67, -10) формулой не станут и выгружаются как есть.
+"""
+import csv
+import re
+from datetime import datetime, time as dt_time, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment
+
+EXPORT_CHUNK_SIZE = 2000
+
+HEADER = ['Дата', 'Начало', 'Конец', 'Специалист', 'Клиент', 'Телефон', 'Услуга', 'Статус', 'Заметки', 'Создана']
+STATUS_LABELS = dict(Appointment.STATUS_CHOICES)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+PHONE_OR_NUMBER = re.compile(r'\+?[\d ()-]+')   # только пробел: табуляция в начале ячейки — тоже префикс формулы
+
+# общие для живых и архивных записей колонки; услуга берётся по-разному
+COLUMNS = (
+    'starts_at', 'ends_at', 'specialist__first_name', 'specialist__last_name',
+    'client__name', 'client__phone', 'status', 'notes', 'created_at',
+)
+
+
+def _text_cell(value):
+    """Пользовательский текст для ячейки: без None и без запуска формул."""
+    value = value or ''
+    if value.startswith(FORMULA_PREFIXES) and not PHONE_OR_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """Псевдофайл для csv.writer: write() просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def _period_filter(workshop, date_from=None, date_to=None, specialist_id=None):
+    filters = {'specialist__showcase__workshop': workshop}
+    if specialist_id:
+        filters['specialist_id'] = specialist_id
+    if date_from:
+        filters['starts_at__gte'] = timezone.make_aware(datetime.combine(date_from, dt_time.min))
+    if date_to:
+        filters['starts_at__lt'] = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), dt_time.min))
+    return filters
+
+
+def export_rows(workshop, date_from=None, date_to=None, specialist_id=None):
+    """Строки выгрузки (списки значений) по всем специалистам студии."""
+    filters = _period_filter(workshop, date_from, date_to, specialist_id)
+    archived = (
+        ArchivedAppointment.objects.filter(**filters)
+        .order_by('starts_at', 'pk')
+        .values_list(*COLUMNS, 'service_name')
+    )
+    live = (
+        Appointment.objects.filter(**filters)
+        .order_by('starts_at', 'pk')
+        .values_list(*COLUMNS, 'service__service_name')
+    )
+    # текущая зона один раз: timezone.localtime на каждой строке дороже самой выборки
+    tz = timezone.get_current_timezone()
+    for qs in (archived, live):
+        for starts_at, ends_at, first_name, last_name, client, phone, status, notes, created_at, service \
+                in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            starts_at = starts_at.astimezone(tz)
+            ends_at = ends_at.astimezone(tz)
+            created_at = created_at.astimezone(tz)
+            yield [
+                f'{starts_at.day:02d}.{starts_at.month:02d}.{starts_at.year}',
+                f'{starts_at.hour:02d}:{starts_at.minute:02d}',
+                f'{ends_at.hour:02d}:{ends_at.minute:02d}',
+                _text_cell(f'{first_name} {last_name}'.strip()),
+                _text_cell(client),
+                _text_cell(phone),
+                _text_cell(service),
+                STATUS_LABELS.get(status, status),
+                _text_cell(notes),
+                f'{created_at.day:02d}.{created_at.month:02d}.{created_at.year} '
+                f'{created_at.hour:02d}:{created_at.minute:02d}',
+            ]
+
+
+def iter_csv(rows):
+    """
+    CSV для Excel: BOM, чтобы кириллица открылась в UTF-8, и ';' —
+    разделитель русской локали.
+    """
+    writer = csv.writer(Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
@@ -1,9 +1,10 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Availability, Appointment
+from .models import Availability, Appointment, RecurringSchedule
+from .intervals import day_conflicts
 from accounts.models import ServicePrice
 from datetime import date as _date
-from django.forms import modelformset_factory
+from django.forms import BaseModelFormSet, modelformset_factory
 
 
 class AvailabilityForm(forms.ModelForm):
@@ -18,10 +19,16 @@ class AvailabilityForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
-        # Можно передать workshop или specialist, чтобы отфильтровать услуги
+        # Можно передать workshop или specialist, чтобы отфильтровать услуги,
+        # либо готовые ServiceChoices — общие для всех форм formset'а
         workshop = kwargs.pop('workshop', None)
         specialist = kwargs.pop('specialist', None)
+        service_choices = kwargs.pop('service_choices', None)
         super().__init__(*args, **kwargs)
+        self._service_choices = service_choices
+        if service_choices is not None:
+            self.fields['service'] = service_choices.field()
+            return
         self.fields['service'].queryset = ServicePrice.objects.none()
         if workshop:
             self.fields['service'].queryset = ServicePrice.objects.filter(workshop=workshop)
@@ -31,6 +38,13 @@ class AvailabilityForm(forms.ModelForm):
             except Exception:
                 self.fields['service'].queryset = ServicePrice.objects.none()
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self._service_choices is not None:
+            # услуга уже проверена по списку ServiceChoices; ForeignKey.validate() сделал бы exists() на каждую форму
+            exclude.add('service')
+        return exclude
+
     def clean(self):
         cleaned_data = super().clean()
         start_time = cleaned_data.get('start_time')
@@ -46,14 +60,132 @@ class AvailabilityForm(forms.ModelForm):
         return cleaned_data
 
 
+class ServiceChoices:
+    """
+    Услуги студии, прочитанные один раз на запрос. Поле каждой формы
+    строится из готового списка: ни выпадающий список, ни проверка
+    выбранного значения не делают запросов.
+    """
+
+    def __init__(self, workshop):
+        self.services = {service.pk: service for service in ServicePrice.objects.filter(workshop=workshop)}
+        self.choices = [('', '---------')] + [
+            (pk, f"{service.service_name} - {service.price} руб.") for pk, service in self.services.items()
+        ]
+
+    def _coerce(self, value):
+        return self.services[int(value)]
+
+    def field(self):
+        return forms.TypedChoiceField(
+            choices=self.choices,
+            coerce=self._coerce,
+            required=False,
+            empty_value=None,
+            label=Availability._meta.get_field('service').verbose_name,
+            widget=forms.Select(attrs={'class': 'form-control'}),
+        )
+
+
+class LoadedObjectField(forms.ModelChoiceField):
+    """
+    Скрытое поле id формы formset'а: объект берётся из queryset'а, уже
+    прочитанного formset'ом, а не запросом queryset.get() на каждую форму.
+    id не из этого queryset'а — ошибка invalid_choice.
+    """
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.formset._existing_object(self.formset.model._meta.pk.to_python(value))
+        except ValidationError:
+            obj = None
+        if obj is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+        return obj
+
+
+class BaseAvailabilityFormSet(BaseModelFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields[name]
+        form.fields[name] = LoadedObjectField(
+            self, field.queryset, initial=field.initial, required=False, widget=field.widget,
+        )
+
+
 AvailabilityFormSet = modelformset_factory(
     Availability,
     form=AvailabilityForm,
+    formset=BaseAvailabilityFormSet,
     extra=1,
     can_delete=True
 )
 
 
+def _overlap_error(form, message):
+    form.add_error('start_time', message)
+    form.add_error('end_time', message)
+
+
+def mark_overlapping_slots(formset, specialist):
+    """
+    Проверка пересечений слотов валидного AvailabilityFormSet: между формами
+    и со слотами специалиста в БД, которых нет в formset'е. Ошибки
+    добавляются в формы. Возвращает True, если что-то нашлось.
+    """
+    has_errors = False
+    submitted_by_date = {}
+    formset_pks = set()
+    for idx, form in enumerate(formset.forms):
+        if form.instance.pk:
+            formset_pks.add(form.instance.pk)
+        cd = getattr(form, 'cleaned_data', None)
+        if not cd or cd.get('DELETE'):
+            continue
+        d, st, et = cd.get('date'), cd.get('start_time'), cd.get('end_time')
+        if not d or not st or not et:
+            form.add_error(None, 'Дата, время начала и конца обязательны.')
+            has_errors = True
+            continue
+        if not (st < et):
+            form.add_error('start_time', 'Время начала должно быть раньше времени окончания.')
+            form.add_error('end_time', 'Время окончания должно быть позже времени начала.')
+            has_errors = True
+            continue
+        submitted_by_date.setdefault(d, []).append((st, et, idx))
+
+    if not submitted_by_date:
+        return has_errors
+
+    # слоты тех же дат, которые не редактируются в этом formset'е (удалённые тоже в formset_pks)
+    existing_by_date = {}
+    existing = (
+        Availability.objects
+        .filter(specialist=specialist, date__in=list(submitted_by_date))
+        .exclude(pk__in=formset_pks)
+        .values_list('date', 'start_time', 'end_time', 'pk')
+    )
+    for d, st, et, pk in existing:
+        existing_by_date.setdefault(d, []).append((st, et, pk))
+
+    for d, submitted in submitted_by_date.items():
+        with_existing, between_forms = day_conflicts(existing_by_date.get(d, []), submitted)
+        for (_, _, idx), (db_st, db_et, _) in with_existing:
+            _overlap_error(formset.forms[idx], f"Пересекается со слотом {db_st:%H:%M}–{db_et:%H:%M}.")
+        clashing = {idx for pair in between_forms for _, _, idx in pair}
+        for idx in sorted(clashing):
+            _overlap_error(formset.forms[idx], 'Пересекается с другим слотом в форме.')
+        has_errors = has_errors or bool(with_existing or between_forms)
+    return has_errors
+
+
 class AppointmentForm(forms.ModelForm):
     class Meta:
         model = Appointment
@@ -66,3 +198,53 @@ class AppointmentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         # если нужно, можно принимать specialist или availability для валидаций
         super().__init__(*args, **kwargs)
+
+
+class RecurringScheduleForm(forms.ModelForm):
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=RecurringSchedule.WEEKDAY_CHOICES,
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple,
+        label='Дни недели',
+    )
+
+    class Meta:
+        model = RecurringSchedule
+        fields = ['weekdays', 'start_time', 'end_time', 'slot_minutes', 'service', 'valid_from', 'valid_until']
+        widgets = {
+            'start_time': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+            'end_time': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+            'slot_minutes': forms.NumberInput(attrs={'class': 'form-control', 'min': 5, 'step': 5}),
+            'service': forms.Select(attrs={'class': 'form-control'}),
+            'valid_from': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+            'valid_until': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        workshop = kwargs.pop('workshop', None)
+        super().__init__(*args, **kwargs)
+        self.fields['service'].queryset = (
+            ServicePrice.objects.filter(workshop=workshop) if workshop else ServicePrice.objects.none()
+        )
+        if self.instance.pk:
+            self.initial['weekdays'] = self.instance.weekday_list
+
+    def clean_weekdays(self):
+        return ','.join(str(d) for d in sorted(set(self.cleaned_data['weekdays'])))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_time = cleaned_data.get('start_time')
+        end_time = cleaned_data.get('end_time')
+        slot_minutes = cleaned_data.get('slot_minutes')
+        valid_from = cleaned_data.get('valid_from')
+        valid_until = cleaned_data.get('valid_until')
+
+        if start_time and end_time and start_time >= end_time:
+            raise ValidationError('Время начала должно быть раньше времени окончания.')
+        if slot_minutes is not None and slot_minutes < 5:
+            raise ValidationError('Слот не может быть короче 5 минут.')
+        if valid_from and valid_until and valid_until < valid_from:
+            raise ValidationError('Дата окончания раньше даты начала.')
+
+        return cleaned_data
@@ -0,0 +1,104 @@
+# booking/holds.py
+"""
+Короткие удержания слотов: клиент выбрал время и заполняет форму, а
+другие клиенты видят слот как "бронируется" и не могут его занять.
+
+Удержание хранится в двух местах: в кэше (быстрая проверка без БД,
+ключ истекает сам) и в таблице SlotHold — она общая для всех процессов
+и остаётся источником истины, если кэш пуст или не разделяется между
+воркерами. У клиента не больше одного удержания: новое снимает прежние.
+Истёкшие строки нигде не учитываются (фильтр expires_at > now) и
+удаляются одним DELETE по индексу в sweep_expired_holds.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Appointment, Availability, SlotHold
+from .services import ACTIVE_STATUSES, SlotUnavailable, hold_cache_key, invalidate_month_occupancy
+
+HOLD_SECONDS = getattr(settings, 'BOOKING_HOLD_SECONDS', 5 * 60)
+
+
+def current_hold(availability_id, now=None):
+    """(client_id, expires_at) действующего удержания слота или None."""
+    now = now or timezone.now()
+    cached = cache.get(hold_cache_key(availability_id))
+    if cached is not None and cached[1] > now:
+        return cached
+    hold = (
+        SlotHold.objects
+        .filter(availability_id=availability_id, expires_at__gt=now)
+        .values_list('client_id', 'expires_at')
+        .first()
+    )
+    if hold is not None:
+        _remember(availability_id, *hold, now=now)
+    return hold
+
+
+def _remember(availability_id, client_id, expires_at, now):
+    timeout = max(1, int((expires_at - now).total_seconds()))
+    cache.set(hold_cache_key(availability_id), (client_id, expires_at), timeout)
+
+
+def hold_slot(availability, client, seconds=HOLD_SECONDS):
+    """
+    Удержать слот за клиентом на seconds секунд (повторный вызов продлевает
+    удержание). Возвращает время истечения или бросает SlotUnavailable.
+    """
+    now = timezone.now()
+    # быстрый отказ без БД, если в кэше чужое действующее удержание
+    cached = cache.get(hold_cache_key(availability.pk))
+    if cached is not None and cached[1] > now and cached[0] != client.pk:
+        raise SlotUnavailable('Это время сейчас бронирует другой клиент.')
+
+    expires_at = now + timedelta(seconds=seconds)
+    try:
+        with transaction.atomic():
+            locked = Availability.objects.select_for_update().filter(pk=availability.pk).values_list('pk', flat=True)
+            if not list(locked):
+                raise SlotUnavailable('Слот удалён.')
+            if Appointment.objects.filter(availability=availability, status__in=ACTIVE_STATUSES).exists():
+                raise SlotUnavailable('Это время уже занято.')
+            if SlotHold.objects.filter(availability=availability, expires_at__gt=now).exclude(client=client).exists():
+                raise SlotUnavailable('Это время сейчас бронирует другой клиент.')
+            released = _release_other_holds(client, availability.pk)
+            SlotHold.objects.update_or_create(
+                availability=availability, defaults={'client': client, 'expires_at': expires_at},
+            )
+    except IntegrityError as exc:
+        raise SlotUnavailable('Это время сейчас бронирует другой клиент.') from exc
+
+    _remember(availability.pk, client.pk, expires_at, now)
+    for availability_id, specialist_id, day in released:
+        cache.delete(hold_cache_key(availability_id))
+        invalidate_month_occupancy(specialist_id, day)
+    invalidate_month_occupancy(availability.specialist_id, availability.date)
+    return expires_at
+
+
+def _release_other_holds(client, keep_availability_id):
+    holds = SlotHold.objects.filter(client=client).exclude(availability_id=keep_availability_id)
+    released = list(holds.values_list('availability_id', 'availability__specialist_id', 'availability__date'))
+    if released:
+        holds.delete()
+    return released
+
+
+def release_slot(availability, client):
+    """Снять удержание слота клиентом. Возвращает True, если удержание было."""
+    deleted, _ = SlotHold.objects.filter(availability=availability, client=client).delete()
+    if deleted:
+        cache.delete(hold_cache_key(availability.pk))
+        invalidate_month_occupancy(availability.specialist_id, availability.date)
+    return bool(deleted)
+
+
+def sweep_expired_holds(now=None):
+    """Удалить истёкшие удержания. Кэш не трогаем: истёкшие удержания и так не учитываются."""
+    deleted, _ = SlotHold.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,118 @@
+# booking/ics.py
+"""
+Календарные ленты (iCalendar, RFC 5545) записей специалиста и клиента.
+
+Календарные приложения не логинятся, поэтому лента открывается по
+подписанному токену в URL. Версия ленты — (число записей, последнее
+updated_at): её даёт один агрегат по индексу (specialist|client,
+updated_at), и неизменившаяся лента отвечает 304 без чтения записей.
+События отдаются потоком с .iterator(), без сборки всего файла в памяти.
+"""
+from datetime import timezone as dt_timezone
+
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils.crypto import constant_time_compare
+
+from .models import Appointment
+
+FEED_SALT = 'booking.ics'
+PRODID = '-//Master Poisk//Booking//RU'
+ITERATOR_CHUNK_SIZE = 500
+
+ICS_STATUS = {
+    Appointment.STATUS_PENDING: 'TENTATIVE',
+    Appointment.STATUS_CONFIRMED: 'CONFIRMED',
+    Appointment.STATUS_CANCELLED: 'CANCELLED',
+}
+
+
+def feed_token(kind, pk):
+    """kind — 'specialist' или 'client'."""
+    return signing.Signer(salt=FEED_SALT).signature(f'{kind}:{pk}')
+
+
+def check_feed_token(kind, pk, token):
+    return constant_time_compare(feed_token(kind, pk), token)
+
+
+def feed_version(appointments):
+    """(число записей, время последнего изменения | None) — одним запросом."""
+    row = appointments.order_by().aggregate(count=Count('pk'), last_modified=Max('updated_at'))
+    return row['count'], row['last_modified']
+
+
+def _escape(text):
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Строка свойства с CRLF; длиннее 75 октетов — переносится с пробелом в начале продолжения."""
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > 74:
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _specialist_event(appointment):
+    client = appointment.client
+    summary = client.name or client.user.get_full_name() or client.user.username
+    if appointment.service:
+        summary = f'{summary} — {appointment.service.service_name}'
+    description = [f'Телефон: {client.phone}'] if client.phone else []
+    return summary, description
+
+
+def _client_event(appointment):
+    specialist = appointment.specialist
+    workshop = specialist.showcase.workshop
+    summary = appointment.service.service_name if appointment.service else 'Запись'
+    summary = f'{summary} — {workshop.workshop_name}'
+    description = [f'Специалист: {specialist}']
+    if workshop.phone:
+        description.append(f'Телефон студии: {workshop.phone}')
+    return summary, description
+
+
+def iter_calendar(name, appointments, for_client=False):
+    """Строки .ics по записям (QuerySet) — генератор для StreamingHttpResponse."""
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold(f'PRODID:{PRODID}')
+    yield _fold('CALSCALE:GREGORIAN')
+    yield _fold('METHOD:PUBLISH')
+    yield _fold(f'X-WR-CALNAME:{_escape(name)}')
+    event = _client_event if for_client else _specialist_event
+    for appointment in appointments.for_listing().order_by('starts_at', 'pk').iterator(ITERATOR_CHUNK_SIZE):
+        summary, description = event(appointment)
+        if appointment.notes:
+            description.append(f'Заметки: {appointment.notes}')
+        workshop = appointment.specialist.showcase.workshop
+        yield _fold('BEGIN:VEVENT')
+        yield _fold(f'UID:booking-appointment-{appointment.pk}@master-poisk')
+        yield _fold(f'DTSTAMP:{_utc(appointment.updated_at)}')
+        yield _fold(f'LAST-MODIFIED:{_utc(appointment.updated_at)}')
+        yield _fold(f'DTSTART:{_utc(appointment.starts_at)}')
+        yield _fold(f'DTEND:{_utc(appointment.ends_at)}')
+        yield _fold(f'SUMMARY:{_escape(summary)}')
+        if description:
+            yield _fold(f'DESCRIPTION:{_escape(chr(10).join(description))}')
+        yield _fold(f'LOCATION:{_escape(", ".join(filter(None, [workshop.city, workshop.workshop_address])))}')
+        yield _fold(f'STATUS:{ICS_STATUS.get(appointment.status, "TENTATIVE")}')
+        yield _fold('END:VEVENT')
+    yield _fold('END:VCALENDAR')
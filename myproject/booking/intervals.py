@@ -0,0 +1,94 @@
+# booking/intervals.py
+"""
+Полуоткрытые интервалы времени [start, end) в пределах одного дня.
+
+IntervalSet держит интервалы отсортированными по началу и хранит
+префиксный максимум концов, поэтому проверка "пересекается ли новый
+интервал с чем-нибудь" — это bisect за O(log n), а поиск всех
+пересечений внутри набора — один проход по отсортированному списку.
+Используется при проверке formset'а расписания и генератором слотов.
+"""
+from bisect import bisect_left, bisect_right
+
+
+def overlaps(start1, end1, start2, end2):
+    return start1 < end2 and start2 < end1
+
+
+class IntervalSet:
+    """Интервалы (start, end, payload), отсортированные по start. Пересечения внутри набора допустимы."""
+
+    def __init__(self, intervals=()):
+        self._items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self._starts = [item[0] for item in self._items]
+        self._reach = []   # _reach[i] — максимальный end среди _items[0..i]
+        self._update_reach(0)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _update_reach(self, index):
+        del self._reach[index:]
+        reach = self._reach[-1] if self._reach else None
+        for _, end, _ in self._items[index:]:
+            reach = end if reach is None or end > reach else reach
+            self._reach.append(reach)
+
+    def find_overlap(self, start, end):
+        """Какой-нибудь интервал набора, пересекающийся с [start, end), или None."""
+        i = bisect_left(self._starts, end)
+        if i == 0 or self._reach[i - 1] <= start:
+            return None
+        # среди начавшихся раньше end есть заканчивающийся после start — ищем его с конца
+        j = i - 1
+        while self._items[j][1] <= start:
+            j -= 1
+        return self._items[j]
+
+    def add(self, start, end, payload=None):
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._items.insert(i, (start, end, payload))
+        self._update_reach(i)
+
+    def add_if_free(self, start, end, payload=None):
+        """Добавить интервал, если он ни с чем не пересекается. Возвращает помешавший интервал или None."""
+        conflict = self.find_overlap(start, end)
+        if conflict is None:
+            self.add(start, end, payload)
+        return conflict
+
+    def overlapping_pairs(self):
+        """
+        Пары пересекающихся интервалов одним проходом: каждый интервал,
+        начавшийся до конца "самого длинного" из предыдущих, образует
+        пару с ним. Каждый участник пересечений попадает хотя бы в одну пару.
+        """
+        pairs = []
+        holder = None
+        for item in self._items:
+            if holder is not None and item[0] < holder[1]:
+                pairs.append((holder, item))
+            if holder is None or item[1] > holder[1]:
+                holder = item
+        return pairs
+
+
+def day_conflicts(existing, submitted):
+    """
+    Проверка слотов одного дня.
+    existing — [(start, end, payload)] уже сохранённые слоты,
+    submitted — [(start, end, payload)] слоты из формы.
+    Возвращает (conflicts_with_existing, conflicts_between_submitted):
+    [(submitted_item, existing_item)] и [(submitted_item, submitted_item)].
+    """
+    stored = IntervalSet(existing)
+    with_existing = []
+    for item in submitted:
+        conflict = stored.find_overlap(item[0], item[1])
+        if conflict is not None:
+            with_existing.append((item, conflict))
+    return with_existing, IntervalSet(submitted).overlapping_pairs()
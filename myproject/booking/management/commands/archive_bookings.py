@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_before, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Переносит прошедшие слоты и записи в архив и накапливает статистику по месяцам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help=f'Архивировать слоты старше N дней (по умолчанию {ARCHIVE_AFTER_DAYS}).')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, повторяя архивацию.')
+        parser.add_argument('--interval', type=int, default=60 * 60, help='Пауза между проходами в режиме --loop, с.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['days'], options['batch_size'])
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def run_once(self, days, batch_size):
+        cutoff = archive_cutoff(days)
+        started = time.perf_counter()
+        result = archive_before(cutoff, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'До {cutoff:%d.%m.%Y}: в архив перенесено записей {result.appointments}, '
+            f'удалено слотов {result.slots} (пачек: {result.batches}, {elapsed:.2f} с)'
+        ))
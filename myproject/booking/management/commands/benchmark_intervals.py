@@ -0,0 +1,83 @@
+import random
+import time
+from datetime import time as dtime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.intervals import day_conflicts, overlaps
+
+DAY_SECONDS = 24 * 60 * 60 - 1
+
+
+def _to_time(seconds):
+    return dtime(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def _random_day(rng, count, overlap_rate):
+    """count интервалов в пределах суток; примерно overlap_rate из них налезают на соседа."""
+    step = DAY_SECONDS // count
+    intervals = []
+    for i in range(count):
+        start = i * step
+        length = step * 2 if rng.random() < overlap_rate else max(1, step - 1)
+        end = min(start + length, DAY_SECONDS)
+        intervals.append((_to_time(start), _to_time(end), i))
+    rng.shuffle(intervals)
+    return intervals
+
+
+def _naive_conflicts(existing, submitted):
+    """Прежний алгоритм из owner_schedule_manage: каждая форма против всех слотов БД и всех предыдущих форм."""
+    with_existing, between_forms = [], []
+    seen = []
+    for item in submitted:
+        for other in existing:
+            if overlaps(item[0], item[1], other[0], other[1]):
+                with_existing.append((item, other))
+                break
+        for other in seen:
+            if overlaps(item[0], item[1], other[0], other[1]):
+                between_forms.append((other, item))
+                break
+        seen.append(item)
+    return with_existing, between_forms
+
+
+def _measure(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк проверки пересечений слотов (IntervalSet против попарного сравнения), без БД.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,200,400,800,1600', help='Числа слотов в formset через запятую')
+        parser.add_argument('--overlap-rate', type=float, default=0.05)
+        parser.add_argument('--max-growth', type=float, default=3.0,
+                            help='Допустимый рост времени на слот между самым малым и самым большим размером')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+
+        per_slot = []
+        self.stdout.write(f"{'слотов':>8} {'попарно, мс':>13} {'IntervalSet, мс':>16} {'мкс/слот':>10}")
+        for size in sizes:
+            existing = _random_day(rng, size, options['overlap_rate'])
+            submitted = _random_day(rng, size, options['overlap_rate'])
+            naive = _measure(_naive_conflicts, existing, submitted)
+            sweep = _measure(day_conflicts, existing, submitted)
+            per_slot.append(sweep / size)
+            self.stdout.write(f"{size:>8} {naive * 1000:>13.2f} {sweep * 1000:>16.2f} {sweep / size * 1e6:>10.2f}")
+
+        growth = per_slot[-1] / per_slot[0]
+        if growth > options['max_growth']:
+            raise CommandError(f"время на слот выросло в {growth:.1f} раза — рост хуже линейного")
+        self.stdout.write(self.style.SUCCESS(f"время на слот выросло в {growth:.1f} раза: рост близок к линейному"))
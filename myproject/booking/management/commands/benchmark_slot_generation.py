@@ -0,0 +1,79 @@
+import time
+from datetime import time as dtime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import WorkshopProfile
+from booking.models import Availability, RecurringSchedule
+from booking.schedules import generate_slots
+from showcase.models import Showcase, Specialist
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк generate_slots: шаблоны Пн–Пт 10:00–18:00 для N специалистов на квартал вперёд. '
+        'Данные создаются во временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--specialists', type=int, default=50)
+        parser.add_argument('--weeks', type=int, default=13)
+        parser.add_argument('--slot-minutes', type=int, default=60)
+        parser.add_argument('--existing-rate', type=int, default=10,
+                            help='У каждого N-го специалиста заранее есть ручные слоты (0 — нет)')
+        parser.add_argument('--max-seconds', type=float, default=1.0,
+                            help='Ошибка, если генерация дольше этого времени')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                elapsed, result = self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(
+            f"специалистов: {options['specialists']}, недель: {options['weeks']}, "
+            f"создано слотов: {result.created}, пропущено: {result.skipped}, {elapsed:.3f} с"
+        )
+        if elapsed > options['max_seconds']:
+            raise CommandError(f"генерация заняла {elapsed:.2f} с — дольше {options['max_seconds']:.2f} с")
+        self.stdout.write(self.style.SUCCESS(f"{result.created / elapsed:,.0f} слотов/с"))
+
+    def _run(self, options):
+        start = timezone.localdate()
+        end = start + timedelta(weeks=options['weeks'])
+        user = User.objects.create_user('benchmark-slot-generation')
+        workshop = WorkshopProfile.objects.create(
+            user=user, workshop_name='Бенчмарк', workshop_address='-', phone='-', city='Минск',
+        )
+        showcase = Showcase.objects.create(workshop=workshop)
+        specialists = Specialist.objects.bulk_create(
+            Specialist(showcase=showcase, first_name=f'Мастер {i}') for i in range(options['specialists'])
+        )
+        schedules = RecurringSchedule.objects.bulk_create(
+            RecurringSchedule(
+                specialist=specialist, weekdays='0,1,2,3,4', start_time=dtime(10), end_time=dtime(18),
+                slot_minutes=options['slot_minutes'], valid_from=start,
+            )
+            for specialist in specialists
+        )
+        rate = options['existing_rate']
+        if rate:
+            Availability.objects.bulk_create(
+                Availability(specialist=specialist, date=start + timedelta(days=day),
+                             start_time=dtime(12, 15), end_time=dtime(13, 15))
+                for specialist in specialists[::rate]
+                for day in range(1, options['weeks'] * 7, 7)
+            )
+
+        started = time.perf_counter()
+        result = generate_slots(schedules, start, end)
+        return time.perf_counter() - started, result
@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from booking.schedules import generate_for_specialists
+
+
+class Command(BaseCommand):
+    help = 'Создаёт слоты Availability по активным шаблонам недельного расписания.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=13, help='На сколько недель вперёд (по умолчанию квартал).')
+        parser.add_argument('--from', dest='start', help='Начальная дата YYYY-MM-DD (по умолчанию сегодня).')
+        parser.add_argument('--specialist', type=int, action='append', dest='specialists',
+                            help='id специалиста; можно указать несколько раз.')
+
+    def handle(self, *args, **options):
+        start = timezone.localdate()
+        if options['start']:
+            start = parse_date(options['start'])
+            if start is None:
+                raise CommandError('Дата должна быть в формате YYYY-MM-DD.')
+        end = start + timedelta(weeks=options['weeks'])
+
+        started = time.perf_counter()
+        result = generate_for_specialists(options['specialists'], start=start, end=end)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано слотов: {result.created}, пропущено из-за пересечений: {result.skipped} '
+            f'({start:%d.%m.%Y}–{end:%d.%m.%Y}, {elapsed:.2f} с)'
+        ))
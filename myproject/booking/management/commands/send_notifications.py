@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking.notifications import OUTBOX_BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет уведомления из очереди NotificationOutbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help='Строк outbox за один проход.')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, проверяя очередь.')
+        parser.add_argument('--interval', type=int, default=10, help='Пауза при пустой очереди в режиме --loop, с.')
+
+    def handle(self, *args, **options):
+        while True:
+            while True:
+                result = drain_outbox(batch_size=options['batch_size'])
+                if result.processed:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Отправлено: {result.sent}, повтор позже: {result.retried}, не отправлено: {result.failed}'
+                    ))
+                    for pk, error in result.errors:
+                        self.stderr.write(f'#{pk}: {error}')
+                # пачка меньше полной — готовых строк больше нет
+                if result.processed < options['batch_size']:
+                    break
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking.holds import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие удержания слотов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, повторяя очистку.')
+        parser.add_argument('--interval', type=int, default=60, help='Пауза между проходами в режиме --loop, с.')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sweep_expired_holds()
+            self.stdout.write(self.style.SUCCESS(f'Удалено истёкших удержаний: {deleted}'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0005_remove_availability_is_bookable'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['date', 'start_time'], name='booking_avail_date_start_idx'),
+        ),
+    ]
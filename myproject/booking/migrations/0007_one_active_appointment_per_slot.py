@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+def cancel_double_bookings(apps, schema_editor):
+    """Если на слот уже есть несколько активных записей — оставляем самую раннюю."""
+    Appointment = apps.get_model('booking', 'Appointment')
+    seen = set()
+    duplicates = []
+    active = (
+        Appointment.objects
+        .filter(status__in=['pending', 'confirmed'])
+        .order_by('availability_id', 'created_at', 'pk')
+        .values_list('pk', 'availability_id')
+    )
+    for pk, availability_id in active.iterator():
+        if availability_id in seen:
+            duplicates.append(pk)
+        seen.add(availability_id)
+    if duplicates:
+        Appointment.objects.filter(pk__in=duplicates).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0006_availability_date_start_idx'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=('availability',), name='booking_one_active_appointment_per_slot'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:58
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0007_one_active_appointment_per_slot'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekdays', models.CharField(default='0,1,2,3,4', max_length=13, verbose_name='Дни недели')),
+                ('start_time', models.TimeField(verbose_name='Начало дня')),
+                ('end_time', models.TimeField(verbose_name='Конец дня')),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=60, verbose_name='Длительность слота, мин')),
+                ('valid_from', models.DateField(default=datetime.date.today, verbose_name='Действует с')),
+                ('valid_until', models.DateField(blank=True, null=True, verbose_name='Действует по')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.serviceprice', verbose_name='Услуга')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_schedules', to='showcase.specialist')),
+            ],
+            options={
+                'verbose_name': 'Шаблон расписания',
+                'verbose_name_plural': 'Шаблоны расписания',
+                'ordering': ['specialist', 'start_time'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0008_recurringschedule'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['availability', 'status'], name='booking_appt_slot_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['specialist', 'availability'], name='booking_appt_spec_slot_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:40
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_appointment_times(apps, schema_editor):
+    """Переносим дату и время слота в саму запись."""
+    Appointment = apps.get_model('booking', 'Appointment')
+    batch = []
+    for appointment in Appointment.objects.select_related('availability').iterator(chunk_size=1000):
+        slot = appointment.availability
+        appointment.starts_at = timezone.make_aware(datetime.datetime.combine(slot.date, slot.start_time))
+        appointment.ends_at = timezone.make_aware(datetime.datetime.combine(slot.date, slot.end_time))
+        batch.append(appointment)
+        if len(batch) >= 1000:
+            Appointment.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0009_appointment_hot_path_indexes'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Начало'),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Конец'),
+        ),
+        migrations.RunPython(fill_appointment_times, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, verbose_name='Начало'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, verbose_name='Конец'),
+        ),
+        migrations.AlterModelOptions(
+            name='appointment',
+            options={'ordering': ['starts_at'], 'verbose_name': 'Запись', 'verbose_name_plural': 'Записи'},
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='booking_appt_spec_slot_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['specialist', 'starts_at'], name='booking_appt_spec_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client', 'starts_at'], name='booking_appt_client_start_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0010_appointment_starts_at'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_id', models.PositiveIntegerField(unique=True, verbose_name='id исходной записи')),
+                ('service_name', models.CharField(blank=True, max_length=100, verbose_name='Услуга')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает подтверждения'), ('confirmed', 'Подтверждено'), ('cancelled', 'Отменено')], max_length=20)),
+                ('starts_at', models.DateTimeField(verbose_name='Начало')),
+                ('ends_at', models.DateTimeField(verbose_name='Конец')),
+                ('notes', models.TextField(blank=True, verbose_name='Заметки')),
+                ('created_at', models.DateTimeField(verbose_name='Создана')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_appointments', to='accounts.clientprofile')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='showcase.specialist')),
+            ],
+            options={
+                'verbose_name': 'Архивная запись',
+                'verbose_name_plural': 'Архив записей',
+                'ordering': ['starts_at'],
+                'indexes': [models.Index(fields=['specialist', 'starts_at'], name='booking_arch_spec_start_idx'), models.Index(fields=['client', 'starts_at'], name='booking_arch_client_start_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SpecialistMonthStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('slots', models.PositiveIntegerField(default=0, verbose_name='Слотов')),
+                ('booked_slots', models.PositiveIntegerField(default=0, verbose_name='Занятых слотов')),
+                ('confirmed', models.PositiveIntegerField(default=0, verbose_name='Подтверждённых записей')),
+                ('pending', models.PositiveIntegerField(default=0, verbose_name='Неподтверждённых записей')),
+                ('cancelled', models.PositiveIntegerField(default=0, verbose_name='Отменённых записей')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='month_stats', to='showcase.specialist')),
+            ],
+            options={
+                'verbose_name': 'Статистика месяца',
+                'verbose_name_plural': 'Статистика по месяцам',
+                'ordering': ['specialist', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('specialist', 'month'), name='booking_stats_specialist_month')],
+            },
+        ),
+    ]
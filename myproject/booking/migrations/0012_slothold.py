@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0011_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('availability', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='booking.availability')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='accounts.clientprofile')),
+            ],
+            options={
+                'verbose_name': 'Удержание слота',
+                'verbose_name_plural': 'Удержания слотов',
+            },
+        ),
+    ]
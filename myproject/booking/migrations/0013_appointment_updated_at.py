@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+def copy_created_at(apps, schema_editor):
+    """Для существующих записей время изменения неизвестно — берём время создания."""
+    Appointment = apps.get_model('booking', 'Appointment')
+    Appointment.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('booking', '0012_slothold'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['specialist', 'updated_at'], name='booking_appt_spec_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client', 'updated_at'], name='booking_appt_client_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0014_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedappointment',
+            name='appointment_id',
+            field=models.PositiveBigIntegerField(unique=True, verbose_name='id исходной записи'),
+        ),
+    ]
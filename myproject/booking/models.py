@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta
 from showcase.models import Specialist
@@ -19,6 +19,10 @@ class Availability(models.Model):
         verbose_name_plural = 'Доступные времена'
         unique_together = ['specialist', 'date', 'start_time']
         ordering = ['date', 'start_time']
+        indexes = [
+            # поиск ближайших свободных слотов по всем специалистам
+            models.Index(fields=['date', 'start_time'], name='booking_avail_date_start_idx'),
+        ]
 
     def __str__(self):
         svc = f" — {self.service.service_name}" if self.service else ""
@@ -30,6 +34,39 @@ class Availability(models.Model):
         end = datetime.datetime.combine(self.date, self.end_time)
         return end - start
 
+    def start_datetime(self):
+        return timezone.make_aware(datetime.datetime.combine(self.date, self.start_time))
+
+    def end_datetime(self):
+        return timezone.make_aware(datetime.datetime.combine(self.date, self.end_time))
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            # записи хранят копию даты/времени слота — переносим вместе со слотом
+            starts_at, ends_at = self.start_datetime(), self.end_datetime()
+            (self.appointments
+             .exclude(starts_at=starts_at, ends_at=ends_at)
+             .update(starts_at=starts_at, ends_at=ends_at, updated_at=timezone.now()))
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Всё, что читают списки записей (клиента, владельца, календарь), — одним JOIN'ом."""
+        return self.select_related(
+            'availability',
+            'service__activity_area',
+            'client__user',
+            'specialist__showcase__workshop',
+        )
+
+    def upcoming(self, now=None):
+        return self.filter(starts_at__gte=now or timezone.now()).order_by('starts_at', 'pk')
+
+    def past(self, now=None):
+        return self.filter(starts_at__lt=now or timezone.now()).order_by('-starts_at', '-pk')
+
 
 class Appointment(models.Model):
     STATUS_PENDING = 'pending'
@@ -47,15 +84,240 @@ class Appointment(models.Model):
     service = models.ForeignKey(ServicePrice, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Услуга')
     notes = models.TextField(blank=True, verbose_name='Заметки')
     created_at = models.DateTimeField(auto_now_add=True)
+    # меняется при любом сохранении — по нему отдаются ETag/Last-Modified календарных лент
+    updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # копия даты и времени слота (заполняется в save()): сортировка и выборка
+    # по периоду без JOIN на availability
+    starts_at = models.DateTimeField(editable=False, verbose_name='Начало')
+    ends_at = models.DateTimeField(editable=False, verbose_name='Конец')
+
+    objects = AppointmentQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
-        ordering = ['availability__date', 'availability__start_time']
+        ordering = ['starts_at']
+        indexes = [
+            # EXISTS(активная запись на слот): availability_id = ? AND status IN (...) без чтения таблицы
+            models.Index(fields=['availability', 'status'], name='booking_appt_slot_status_idx'),
+            # записи специалиста и клиента по времени — один проход по диапазону индекса
+            models.Index(fields=['specialist', 'starts_at'], name='booking_appt_spec_start_idx'),
+            models.Index(fields=['client', 'starts_at'], name='booking_appt_client_start_idx'),
+            # последнее изменение записей специалиста/клиента — поиск по индексу без чтения таблицы
+            models.Index(fields=['specialist', 'updated_at'], name='booking_appt_spec_upd_idx'),
+            models.Index(fields=['client', 'updated_at'], name='booking_appt_client_upd_idx'),
+        ]
+        constraints = [
+            # не больше одной активной записи на слот
+            models.UniqueConstraint(
+                fields=['availability'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='booking_one_active_appointment_per_slot',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.client} у {self.specialist} - {self.availability.date} {self.availability.start_time}"
 
+    def save(self, *args, **kwargs):
+        # пересчитываем, если время ещё не задано, слот назначен объектом или сменился
+        # availability_id (_occupancy_initial — id слота при загрузке, booking.signals)
+        slot_changed = self.availability_id != getattr(self, '_occupancy_initial', self.availability_id)
+        if self.availability_id and (
+            self.starts_at is None or slot_changed or 'availability' in self._state.fields_cache
+        ):
+            self.starts_at = self.availability.start_datetime()
+            self.ends_at = self.availability.end_datetime()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'starts_at', 'ends_at'}
+        event = self.notification_event()
+        # уведомление пишется в outbox в той же транзакции, что и запись
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if event:
+                NotificationOutbox.objects.create(event=event, appointment_id=self.pk)
+
+    def notification_event(self):
+        """Событие NotificationOutbox, которое вызовет сохранение записи, или None."""
+        if self._state.adding:
+            return NotificationOutbox.EVENT_CREATED
+        if self.status == getattr(self, '_status_initial', self.status):
+            return None
+        return {
+            self.STATUS_CONFIRMED: NotificationOutbox.EVENT_CONFIRMED,
+            self.STATUS_CANCELLED: NotificationOutbox.EVENT_CANCELLED,
+        }.get(self.status)
+
     def is_available(self):
         return not Appointment.objects.filter(availability=self.availability, status__in=[self.STATUS_PENDING, self.STATUS_CONFIRMED]).exists()
+
+
+class SlotHold(models.Model):
+    """
+    Временное удержание слота клиентом, пока он заполняет форму записи
+    (booking.holds). Истёкшие удержания не учитываются и удаляются
+    командой sweep_slot_holds.
+    """
+    availability = models.OneToOneField(Availability, on_delete=models.CASCADE, related_name='hold')
+    client = models.ForeignKey(ClientProfile, on_delete=models.CASCADE, related_name='slot_holds')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Действует до')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Удержание слота'
+        verbose_name_plural = 'Удержания слотов'
+
+    def __str__(self):
+        return f"{self.availability} — {self.client} до {self.expires_at:%H:%M:%S}"
+
+
+class RecurringSchedule(models.Model):
+    """
+    Шаблон недельного расписания специалиста, например "Пн–Пт 10:00–18:00,
+    слоты по 60 минут". Слоты Availability создаются из шаблонов
+    генератором booking.schedules.generate_slots.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Пн'), (1, 'Вт'), (2, 'Ср'), (3, 'Чт'), (4, 'Пт'), (5, 'Сб'), (6, 'Вс'),
+    ]
+
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name='recurring_schedules')
+    weekdays = models.CharField(max_length=13, default='0,1,2,3,4', verbose_name='Дни недели')  # "0,1,2" (0 — понедельник)
+    start_time = models.TimeField(verbose_name='Начало дня')
+    end_time = models.TimeField(verbose_name='Конец дня')
+    slot_minutes = models.PositiveSmallIntegerField(default=60, verbose_name='Длительность слота, мин')
+    service = models.ForeignKey(ServicePrice, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Услуга')
+    valid_from = models.DateField(default=datetime.date.today, verbose_name='Действует с')
+    valid_until = models.DateField(null=True, blank=True, verbose_name='Действует по')
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Шаблон расписания'
+        verbose_name_plural = 'Шаблоны расписания'
+        ordering = ['specialist', 'start_time']
+
+    def __str__(self):
+        return f"{self.specialist}: {self.weekdays_display()} {self.start_time:%H:%M}–{self.end_time:%H:%M}"
+
+    @property
+    def weekday_list(self):
+        return [int(d) for d in self.weekdays.split(',') if d.strip().isdigit()]
+
+    def weekdays_display(self):
+        names = dict(self.WEEKDAY_CHOICES)
+        return ', '.join(names[d] for d in self.weekday_list if d in names)
+
+    def slot_times(self):
+        """[(start, end)] слотов одного дня по шаблону."""
+        slots = []
+        step = timedelta(minutes=self.slot_minutes)
+        day = datetime.date.min
+        current = datetime.datetime.combine(day, self.start_time)
+        end = datetime.datetime.combine(day, self.end_time)
+        while self.slot_minutes and current + step <= end:
+            slots.append((current.time(), (current + step).time()))
+            current += step
+        return slots
+
+
+class ArchivedAppointment(models.Model):
+    """
+    Компактная копия прошедшей записи (booking.archive): без слота, с
+    названием услуги вместо ссылки. Живые таблицы хранят только рабочее окно.
+    """
+    appointment_id = models.PositiveBigIntegerField(unique=True, verbose_name='id исходной записи')
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name='archived_appointments')
+    client = models.ForeignKey(ClientProfile, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='archived_appointments')
+    service_name = models.CharField(max_length=100, blank=True, verbose_name='Услуга')
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    starts_at = models.DateTimeField(verbose_name='Начало')
+    ends_at = models.DateTimeField(verbose_name='Конец')
+    notes = models.TextField(blank=True, verbose_name='Заметки')
+    created_at = models.DateTimeField(verbose_name='Создана')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Архивная запись'
+        verbose_name_plural = 'Архив записей'
+        ordering = ['starts_at']
+        indexes = [
+            models.Index(fields=['specialist', 'starts_at'], name='booking_arch_spec_start_idx'),
+            models.Index(fields=['client', 'starts_at'], name='booking_arch_client_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client} у {self.specialist} - {self.starts_at:%d.%m.%Y %H:%M}"
+
+
+class SpecialistMonthStats(models.Model):
+    """Итоги месяца по специалисту, накопленные при архивации слотов и записей."""
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name='month_stats')
+    month = models.DateField(verbose_name='Месяц')  # первое число месяца
+    slots = models.PositiveIntegerField(default=0, verbose_name='Слотов')
+    booked_slots = models.PositiveIntegerField(default=0, verbose_name='Занятых слотов')
+    confirmed = models.PositiveIntegerField(default=0, verbose_name='Подтверждённых записей')
+    pending = models.PositiveIntegerField(default=0, verbose_name='Неподтверждённых записей')
+    cancelled = models.PositiveIntegerField(default=0, verbose_name='Отменённых записей')
+
+    class Meta:
+        verbose_name = 'Статистика месяца'
+        verbose_name_plural = 'Статистика по месяцам'
+        ordering = ['specialist', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['specialist', 'month'], name='booking_stats_specialist_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.specialist} — {self.month:%m.%Y}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Исходящие уведомления о записях (transactional outbox): строка
+    добавляется в транзакции изменения Appointment, а отправляет её
+    команда send_notifications (booking.notifications), так что запрос
+    не ждёт SMTP. appointment_id — не внешний ключ: запись может
+    уйти в архив раньше, чем уведомление будет отправлено.
+    """
+    EVENT_CREATED = 'created'
+    EVENT_CONFIRMED = 'confirmed'
+    EVENT_CANCELLED = 'cancelled'
+    EVENT_CHOICES = [
+        (EVENT_CREATED, 'Новая запись'),
+        (EVENT_CONFIRMED, 'Запись подтверждена'),
+        (EVENT_CANCELLED, 'Запись отменена'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Не отправлено'),
+    ]
+
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES, verbose_name='Событие')
+    appointment_id = models.BigIntegerField(verbose_name='id записи')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    # не раньше этого времени строку можно брать в отправку (повтор с задержкой, захват воркером)
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='Отправить после')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено')
+
+    class Meta:
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = 'Исходящие уведомления'
+        indexes = [
+            # очередь воркера: только неотправленные строки, по времени готовности
+            models.Index(fields=['available_at'], condition=models.Q(status='pending'),
+                         name='booking_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_display()} #{self.appointment_id} ({self.get_status_display()})"
@@ -0,0 +1,191 @@
+# booking/notifications.py
+"""
+Отправка уведомлений из NotificationOutbox.
+
+Запрос, меняющий запись, платит только за INSERT строки outbox
+(Appointment.save); письма отправляет воркер (команда
+send_notifications): берёт готовые строки пачкой, захватывает их,
+сдвигая available_at на время аренды (второй воркер их не возьмёт),
+загружает записи одним запросом и передаёт уведомление каждому
+отправителю. Ошибка отправителя — повтор с экспоненциальной задержкой,
+после MAX_ATTEMPTS попыток строка помечается failed. Доставка
+"хотя бы один раз": при сбое одного из нескольких отправителей повтор
+получат все.
+
+Отправители — классы с методом send(notification), список путей в
+настройке BOOKING_NOTIFICATION_SENDERS. Для тестов и отладки есть
+MemorySender и FileSender (JSON-строки в файл).
+"""
+import json
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment, NotificationOutbox
+
+SENDERS = getattr(settings, 'BOOKING_NOTIFICATION_SENDERS', ['booking.notifications.EmailSender'])
+NOTIFICATION_FILE = getattr(settings, 'BOOKING_NOTIFICATION_FILE', settings.BASE_DIR / 'notifications.jsonl')
+OUTBOX_BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+CLAIM_SECONDS = 5 * 60
+
+SUBJECTS = {
+    NotificationOutbox.EVENT_CREATED: 'Новая запись',
+    NotificationOutbox.EVENT_CONFIRMED: 'Запись подтверждена',
+    NotificationOutbox.EVENT_CANCELLED: 'Запись отменена',
+}
+
+
+@dataclass
+class Notification:
+    event: str
+    appointment_id: int
+    recipients: list
+    subject: str
+    body: str
+
+
+@dataclass
+class DrainResult:
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def processed(self):
+        return self.sent + self.retried + self.failed
+
+
+class EmailSender:
+    def send(self, notification):
+        if notification.recipients:
+            send_mail(notification.subject, notification.body, None, notification.recipients)
+
+
+class MemorySender:
+    """Складывает уведомления в список sent (общий для всех экземпляров)."""
+    sent = []
+
+    def send(self, notification):
+        self.sent.append(notification)
+
+
+class FileSender:
+    def __init__(self, path=None):
+        self.path = path or NOTIFICATION_FILE
+
+    def send(self, notification):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(asdict(notification), ensure_ascii=False) + '\n')
+
+
+@lru_cache(maxsize=None)
+def get_senders():
+    return tuple(import_string(path)() for path in SENDERS)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def build_notification(event, appointment):
+    """Кому и что отправить: о новой записи — студии, о подтверждении — клиенту, об отмене — обоим."""
+    client_email = appointment.client.user.email
+    workshop_email = appointment.specialist.showcase.workshop.user.email
+    recipients = {
+        NotificationOutbox.EVENT_CREATED: [workshop_email],
+        NotificationOutbox.EVENT_CONFIRMED: [client_email],
+        NotificationOutbox.EVENT_CANCELLED: [client_email, workshop_email],
+    }[event]
+    when = timezone.localtime(appointment.starts_at).strftime('%d.%m.%Y %H:%M')
+    service = appointment.service.service_name if appointment.service else 'без услуги'
+    body = (
+        f"{SUBJECTS[event]}: {appointment.specialist}, {when}, {service}.\n"
+        f"Студия: {appointment.specialist.showcase.workshop.workshop_name}\n"
+        f"Клиент: {appointment.client.name}, {appointment.client.phone}"
+    )
+    return Notification(
+        event=event,
+        appointment_id=appointment.pk,
+        recipients=[email for email in recipients if email],
+        subject=f"{SUBJECTS[event]} — {when}",
+        body=body,
+    )
+
+
+def _claim_batch(batch_size, now):
+    """Захватить до batch_size готовых строк; возвращает их списком."""
+    ids = list(
+        NotificationOutbox.objects
+        .filter(status=NotificationOutbox.STATUS_PENDING, available_at__lte=now)
+        .order_by('available_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    lease_until = now + timedelta(seconds=CLAIM_SECONDS)
+    NotificationOutbox.objects.filter(
+        pk__in=ids, status=NotificationOutbox.STATUS_PENDING, available_at__lte=now,
+    ).update(available_at=lease_until)
+    # строки, которые успел захватить другой воркер, получили другое available_at
+    return list(NotificationOutbox.objects.filter(pk__in=ids, available_at=lease_until).order_by('pk'))
+
+
+def drain_outbox(senders=None, batch_size=OUTBOX_BATCH_SIZE, now=None):
+    """Отправить одну пачку готовых уведомлений. Возвращает DrainResult."""
+    senders = get_senders() if senders is None else senders
+    now = now or timezone.now()
+    result = DrainResult()
+    rows = _claim_batch(batch_size, now)
+    if not rows:
+        return result
+
+    appointments = (
+        Appointment.objects
+        .select_related('client__user', 'specialist__showcase__workshop__user', 'service')
+        .in_bulk({row.appointment_id for row in rows})
+    )
+    sent_ids, failed = [], []
+    for row in rows:
+        appointment = appointments.get(row.appointment_id)
+        row.attempts += 1
+        if appointment is None:
+            row.status, row.last_error = NotificationOutbox.STATUS_FAILED, 'Запись удалена или перенесена в архив.'
+        else:
+            try:
+                notification = build_notification(row.event, appointment)
+                for sender in senders:
+                    sender.send(notification)
+            except Exception as exc:   # отправитель может упасть чем угодно — строку повторим
+                row.last_error = f'{type(exc).__name__}: {exc}'
+                if row.attempts >= MAX_ATTEMPTS:
+                    row.status = NotificationOutbox.STATUS_FAILED
+                else:
+                    row.available_at = now + retry_delay(row.attempts)
+            else:
+                sent_ids.append(row.pk)
+                continue
+        failed.append(row)
+        if row.status == NotificationOutbox.STATUS_FAILED:
+            result.failed += 1
+        else:
+            result.retried += 1
+        result.errors.append((row.pk, row.last_error))
+
+    if sent_ids:
+        NotificationOutbox.objects.filter(pk__in=sent_ids).update(
+            status=NotificationOutbox.STATUS_SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+        )
+    if failed:
+        NotificationOutbox.objects.bulk_update(failed, ['status', 'attempts', 'available_at', 'last_error'])
+    result.sent = len(sent_ids)
+    return result
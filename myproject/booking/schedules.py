@@ -0,0 +1,158 @@
+# booking/schedules.py
+"""
+Генерация слотов Availability из недельных шаблонов RecurringSchedule.
+
+Все существующие слоты периода читаются одним запросом, пересечения
+проверяются в памяти (IntervalSet по каждому дню),
+новые слоты пишутся пачками через executemany: на десятках тысяч строк
+построение моделей и подготовка значений в bulk_create стоят в разы
+дороже самой вставки. Уже созданные вручную слоты
+имеют приоритет: пересекающиеся с ними слоты шаблона пропускаются.
+Сигналы при такой вставке не срабатывают, поэтому кэш занятости и
+события "слот освободился" (booking.events) генератор обновляет сам.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .events import SLOT_FREED, publish_slot_events
+from .intervals import IntervalSet
+from .models import Availability, RecurringSchedule
+from .services import invalidate_month_occupancy
+
+BULK_BATCH_SIZE = 1000
+
+
+@dataclass
+class GenerationResult:
+    created: int = 0
+    skipped: int = 0     # пересеклись с существующими слотами или друг с другом
+    months: set = field(default_factory=set)   # (specialist_id, year, month)
+
+
+def _candidate_slots(schedules, start, end):
+    """{(specialist_id, date): [(start_time, end_time, service_id)]} по всем шаблонам."""
+    candidates = {}
+    day_slots = {schedule.pk: schedule.slot_times() for schedule in schedules}
+    weekdays = {schedule.pk: set(schedule.weekday_list) for schedule in schedules}
+    day = start
+    while day <= end:
+        weekday = day.weekday()
+        for schedule in schedules:
+            if weekday not in weekdays[schedule.pk]:
+                continue
+            if day < schedule.valid_from or (schedule.valid_until and day > schedule.valid_until):
+                continue
+            bucket = candidates.setdefault((schedule.specialist_id, day), [])
+            bucket.extend((st, et, schedule.service_id) for st, et in day_slots[schedule.pk])
+        day += timedelta(days=1)
+    return candidates
+
+
+def _existing_intervals(specialist_ids, start, end):
+    existing = {}
+    rows = (
+        Availability.objects
+        .filter(specialist_id__in=specialist_ids, date__range=(start, end))
+        .values_list('specialist_id', 'date', 'start_time', 'end_time')
+    )
+    for specialist_id, day, st, et in rows.iterator():
+        existing.setdefault((specialist_id, day), []).append((st, et))
+    return existing
+
+
+def _free_candidates(candidates, existing):
+    """
+    Кандидаты дня, не пересекающиеся ни с существующими слотами, ни друг
+    с другом (при пересечении кандидатов остаётся более ранний).
+    """
+    busy = IntervalSet((st, et, None) for st, et in existing)
+    free = []
+    for st, et, service_id in sorted(candidates, key=lambda item: (item[0], item[1])):
+        if busy.add_if_free(st, et) is None:
+            free.append((st, et, service_id))
+    return free
+
+
+def _insert_sql():
+    """INSERT слота, игнорирующий конфликт unique_together (слот создан параллельно после чтения)."""
+    ops = connection.ops
+    meta = Availability._meta
+    fields = [meta.get_field(name) for name in ('specialist', 'date', 'start_time', 'end_time', 'service', 'created_at')]
+    columns = ', '.join(ops.quote_name(f.column) for f in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    suffix = ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    return (
+        f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(meta.db_table)} "
+        f"({columns}) VALUES ({placeholders}) {suffix}"
+    ).strip()
+
+
+def _publish_created(schedules, start, end, created_at):
+    """События "слот освободился" для вставленных строк: их id читаются обратно по created_at."""
+    rows = (
+        Availability.objects
+        .filter(specialist_id__in={s.specialist_id for s in schedules}, date__range=(start, end), created_at=created_at)
+        .values_list('specialist_id', 'pk', 'date', 'start_time', 'end_time')
+    )
+    publish_slot_events((SLOT_FREED, *row) for row in rows.iterator())
+
+
+def generate_slots(schedules, start, end, batch_size=BULK_BATCH_SIZE):
+    """
+    Создать слоты по шаблонам на даты start..end (прошедшие дни пропускаются).
+    Возвращает GenerationResult.
+    """
+    schedules = [s for s in schedules if s.is_active and s.weekday_list and s.slot_minutes]
+    start = max(start, timezone.localdate())
+    result = GenerationResult()
+    if not schedules or start > end:
+        return result
+
+    candidates = _candidate_slots(schedules, start, end)
+    existing = _existing_intervals({s.specialist_id for s in schedules}, start, end)
+
+    ops = connection.ops
+    now = timezone.now()
+    created_at = ops.adapt_datetimefield_value(now)
+    db_times = {}   # время слотов по шаблону повторяется изо дня в день
+    rows = []
+    for (specialist_id, day), day_candidates in candidates.items():
+        free = _free_candidates(day_candidates, existing.get((specialist_id, day), []))
+        result.skipped += len(day_candidates) - len(free)
+        if not free:
+            continue
+        db_day = ops.adapt_datefield_value(day)
+        for st, et, service_id in free:
+            for t in (st, et):
+                if t not in db_times:
+                    db_times[t] = ops.adapt_timefield_value(t)
+            rows.append((specialist_id, db_day, db_times[st], db_times[et], service_id, created_at))
+        result.months.add((specialist_id, day.year, day.month))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        sql = _insert_sql()
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            cursor.executemany(sql, batch)
+            result.created += cursor.rowcount if cursor.rowcount >= 0 else len(batch)
+        if result.created:
+            _publish_created(schedules, start, end, now)
+
+    # вставка мимо ORM не шлёт post_save — кэш занятости сбрасываем сами
+    for specialist_id, year, month in result.months:
+        invalidate_month_occupancy(specialist_id, date(year, month, 1))
+    return result
+
+
+def generate_for_specialists(specialist_ids=None, start=None, end=None, weeks=13):
+    """Слоты по всем активным шаблонам (или шаблонам указанных специалистов)."""
+    start = start or timezone.localdate()
+    end = end or start + timedelta(weeks=weeks)
+    schedules = RecurringSchedule.objects.filter(is_active=True)
+    if specialist_ids:
+        schedules = schedules.filter(specialist_id__in=specialist_ids)
+    return generate_slots(list(schedules), start, end)
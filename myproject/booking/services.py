@@ -0,0 +1,440 @@
+# booking/services.py
+import base64
+import calendar
+import json
+import random
+import re
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, Exists, Min, OuterRef, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from accounts.models import ServicePrice
+from showcase.models import Specialist
+from .events import SLOT_FREED, SLOT_TAKEN, publish_slot_events
+from .models import Availability, Appointment, NotificationOutbox, SlotHold
+
+# статусы, при которых слот считается занятым
+ACTIVE_STATUSES = (Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED)
+
+# кэш занятости сбрасывается сигналами (booking/signals.py), TTL — страховка
+OCCUPANCY_CACHE_TIMEOUT = 60 * 60 * 24
+OCCUPANCY_HITS_KEY = 'booking:occupancy:hits'
+OCCUPANCY_MISSES_KEY = 'booking:occupancy:misses'
+
+# повторы транзакции записи, если SQLite ответил "database is locked"
+BOOKING_ATTEMPTS = 8
+BOOKING_RETRY_DELAY = 0.02
+
+NEXT_SLOTS_LIMIT = 10
+MAX_NEXT_SLOTS_LIMIT = 50
+
+APPOINTMENTS_PAGE_SIZE = 30
+
+# массовая смена статуса: из каких статусов можно перейти в целевой
+BULK_STATUS_LIMIT = 200
+BULK_STATUS_TRANSITIONS = {
+    Appointment.STATUS_CONFIRMED: (Appointment.STATUS_PENDING,),
+    Appointment.STATUS_CANCELLED: ACTIVE_STATUSES,
+}
+BULK_UPDATED = 'updated'
+BULK_UNCHANGED = 'unchanged'       # запись уже в целевом статусе
+BULK_NOT_ALLOWED = 'not_allowed'   # переход запрещён (например, подтвердить отменённую)
+BULK_NOT_FOUND = 'not_found'       # нет такой записи или она чужая
+
+# один сигнал на пачку bulk_set_status вместо post_save на каждую запись:
+# rows — [(pk, прежний статус, specialist_id, availability_id, starts_at, ends_at)]
+appointments_status_changed = Signal()
+
+
+class SlotUnavailable(Exception):
+    """Слот уже занят активной записью, удерживается другим клиентом или удалён."""
+
+
+def busy_subquery():
+    """Exists(...) — у слота есть активная (pending/confirmed) запись."""
+    return Exists(
+        Appointment.objects.filter(availability=OuterRef('pk'), status__in=ACTIVE_STATUSES)
+    )
+
+
+def held_subquery(now=None, except_client=None):
+    """Exists(...) — слот удерживается (booking.holds), кроме удержаний except_client."""
+    holds = SlotHold.objects.filter(availability=OuterRef('pk'), expires_at__gt=now or timezone.now())
+    if except_client is not None:
+        holds = holds.exclude(client=except_client)
+    return Exists(holds)
+
+
+def month_bounds(year, month):
+    first_day = date(year, month, 1)
+    return first_day, first_day + timedelta(days=calendar.monthrange(year, month)[1] - 1)
+
+
+def datetime_range(first_day, last_day):
+    """[начало first_day, начало следующего за last_day дня) — для фильтра по Appointment.starts_at."""
+    return (
+        timezone.make_aware(datetime.combine(first_day, dt_time.min)),
+        timezone.make_aware(datetime.combine(last_day + timedelta(days=1), dt_time.min)),
+    )
+
+
+def _empty_day():
+    return {'free': 0, 'held': 0, 'pending': 0, 'confirmed': 0, 'first_free': None}
+
+
+def month_occupancy(specialist, year, month):
+    """
+    Занятость специалиста по дням месяца — общая для календарей владельца,
+    клиента и JSON API:
+    {day: {'free': свободных слотов, 'held': удерживаемых клиентами,
+           'pending': записей в ожидании, 'confirmed': подтверждённых,
+           'first_free': time | None}}
+    для каждого дня месяца.
+
+    Один запрос: слоты месяца группируются по дате; свободные и первое
+    свободное время — условные агрегаты по подзапросу EXISTS, записи —
+    COUNT по LEFT JOIN на appointments.
+
+    Результат кэшируется по (specialist_id, year, month) и сбрасывается
+    сигналами при изменении слотов и записей, так что повторный показ
+    календаря без изменений не делает запросов к БД. Удержания слотов
+    истекают без всяких событий, поэтому месяц с удержаниями кэшируется
+    только до ближайшего истечения.
+    """
+    specialist_id = getattr(specialist, 'pk', specialist)
+    key = occupancy_cache_key(specialist_id, year, month)
+    occupancy = cache.get(key)
+    if occupancy is None:
+        _incr_counter(OCCUPANCY_MISSES_KEY)
+        now = timezone.now()
+        occupancy, held_until = _compute_month_occupancy(specialist_id, year, month, now)
+        timeout = OCCUPANCY_CACHE_TIMEOUT
+        if held_until is not None:
+            timeout = min(timeout, max(1, int((held_until - now).total_seconds()) + 1))
+        cache.set(key, occupancy, timeout)
+    else:
+        _incr_counter(OCCUPANCY_HITS_KEY)
+    return occupancy
+
+
+def occupancy_cache_key(specialist_id, year, month):
+    return f'booking:occupancy:{specialist_id}:{year:04d}-{month:02d}'
+
+
+def hold_cache_key(availability_id):
+    return f'booking:hold:{availability_id}'
+
+
+def invalidate_month_occupancy(specialist_id, day):
+    """
+    Сбросить кэш занятости месяца, в который попадает day: сразу (чтения
+    внутри той же транзакции видят изменения) и ещё раз после коммита —
+    сигналы срабатывают до коммита, и параллельный запрос успевает
+    закэшировать старую занятость. Вне транзакции on_commit выполняется сразу.
+    """
+    key = occupancy_cache_key(specialist_id, day.year, day.month)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _incr_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def occupancy_cache_stats():
+    """Счётчики попаданий/промахов кэша занятости: {'hits', 'misses', 'hit_ratio'}."""
+    hits = cache.get(OCCUPANCY_HITS_KEY, 0)
+    misses = cache.get(OCCUPANCY_MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else None}
+
+
+def reset_occupancy_cache_stats():
+    cache.delete_many([OCCUPANCY_HITS_KEY, OCCUPANCY_MISSES_KEY])
+
+
+def _compute_month_occupancy(specialist_id, year, month, now):
+    """({day: счётчики}, ближайшее истечение удержания или None)."""
+    first_day, last_day = month_bounds(year, month)
+    is_free = Q(is_busy=False, is_held=False)
+    rows = (
+        Availability.objects
+        .filter(specialist_id=specialist_id, date__range=(first_day, last_day))
+        .annotate(is_busy=busy_subquery(), is_held=held_subquery(now))
+        .values('date')
+        .annotate(
+            free=Count('pk', distinct=True, filter=is_free),
+            held=Count('pk', distinct=True, filter=Q(is_busy=False, is_held=True)),
+            held_until=Min('hold__expires_at', filter=Q(hold__expires_at__gt=now)),
+            first_free=Min('start_time', filter=is_free),
+            pending=Count('appointments', filter=Q(appointments__status=Appointment.STATUS_PENDING)),
+            confirmed=Count('appointments', filter=Q(appointments__status=Appointment.STATUS_CONFIRMED)),
+        )
+        .order_by()
+    )
+    occupancy = {day: _empty_day() for day in range(1, last_day.day + 1)}
+    held_until = None
+    for row in rows:
+        expires = row.pop('held_until')
+        if expires is not None and (held_until is None or expires < held_until):
+            held_until = expires
+        occupancy[row.pop('date').day] = row
+    return occupancy, held_until
+
+
+def free_slots(specialist, day, client=None):
+    """
+    Свободные слоты специалиста на дату: без pending/confirmed записей
+    и без чужих удержаний (удержания client остаются в выдаче).
+    """
+    return (
+        Availability.objects
+        .filter(specialist=specialist, date=day)
+        .filter(~busy_subquery(), ~held_subquery(except_client=client))
+        .select_related('service__activity_area')
+        .order_by('start_time')
+    )
+
+
+SLOT_FIELDS = ['date', 'start_time', 'end_time', 'service']
+
+
+def save_slots(specialist, created=(), updated=(), deleted=()):
+    """
+    Сохранить правки расписания пачкой: bulk_create новых слотов,
+    bulk_update изменённых, одно удаление для удалённых.
+    updated — пары (слот, прежняя дата). bulk-операции не вызывают save()
+    и сигналы, поэтому время записей на перенесённых слотах, кэш
+    занятости затронутых месяцев и события слотов (booking.events)
+    обновляются здесь же.
+    """
+    months = set()
+    with transaction.atomic():
+        for slot in created:
+            slot.specialist = specialist
+            months.add(slot.date.replace(day=1))
+        Availability.objects.bulk_create(created)
+        events = [(SLOT_FREED, specialist.pk, slot.pk, slot.date, slot.start_time, slot.end_time) for slot in created]
+
+        slots = {}
+        for slot, old_date in updated:
+            slots[slot.pk] = slot
+            months.update({slot.date.replace(day=1), old_date.replace(day=1)})
+        Availability.objects.bulk_update(slots.values(), SLOT_FIELDS)
+        if slots:
+            now = timezone.now()
+            appointments = list(
+                Appointment.objects.filter(availability_id__in=slots).only('pk', 'availability_id', 'status')
+            )
+            for appointment in appointments:
+                slot = slots[appointment.availability_id]
+                appointment.starts_at, appointment.ends_at = slot.start_datetime(), slot.end_datetime()
+                appointment.updated_at = now
+            Appointment.objects.bulk_update(appointments, ['starts_at', 'ends_at', 'updated_at'])
+
+            # перенесённый слот пропадает со страницы прежнего дня и, если свободен, появляется на новом
+            booked = {a.availability_id for a in appointments if a.status in ACTIVE_STATUSES}
+            for slot, old_date in updated:
+                if old_date != slot.date:
+                    events.append((SLOT_TAKEN, specialist.pk, slot.pk, old_date, slot.start_time, slot.end_time))
+                if slot.pk not in booked:
+                    events.append((SLOT_FREED, specialist.pk, slot.pk, slot.date, slot.start_time, slot.end_time))
+        publish_slot_events(events)
+
+        deleted_pks = [slot.pk for slot in deleted]
+        months.update(slot.date.replace(day=1) for slot in deleted)
+        if deleted_pks:
+            # обычное удаление: записи на слотах уходят каскадом, сигналы срабатывают
+            Availability.objects.filter(pk__in=deleted_pks).delete()
+
+    for month in months:
+        invalidate_month_occupancy(specialist.pk, month)
+
+
+def _city_regex(city):
+    # город целиком без учёта регистра; iexact — это LIKE, а он в SQLite не сворачивает кириллицу
+    return f'^{re.escape(city.strip())}$'
+
+
+def matching_services(service='', area='', city=''):
+    """
+    ServicePrice по названию услуги (подстрока без учёта регистра),
+    коду ActivityArea и городу студии.
+    """
+    qs = ServicePrice.objects.all()
+    if service:
+        # iregex, а не icontains: LIKE в SQLite не приводит кириллицу к одному регистру
+        qs = qs.filter(service_name__iregex=re.escape(service))
+    if area:
+        qs = qs.filter(activity_area__code=area)
+    if city:
+        qs = qs.filter(workshop__city__iregex=_city_regex(city))
+    return qs
+
+
+def find_next_free_slots(service='', area='', city='', limit=NEXT_SLOTS_LIMIT, now=None):
+    """
+    Ближайшие свободные слоты у всех специалистов, оказывающих услугу.
+
+    Слот подходит, если в нём указана подходящая услуга, либо услуга
+    не указана, но она есть в Specialist.services. Занятость и действующие
+    удержания (booking.holds) проверяются подзапросами NOT EXISTS, всё
+    вместе — один запрос с ORDER BY date, start_time по индексу
+    booking_avail_date_start_idx.
+    """
+    limit = max(1, min(int(limit), MAX_NEXT_SLOTS_LIMIT))
+    now = timezone.localtime(now)
+
+    qs = Availability.objects.filter(
+        Q(date__gt=now.date()) | Q(date=now.date(), start_time__gte=now.time()),
+        specialist__is_active=True,
+    )
+    if service or area:
+        services = matching_services(service, area, city).values('pk')
+        offers_service = Exists(
+            Specialist.services.through.objects.filter(
+                specialist_id=OuterRef('specialist_id'),
+                serviceprice_id__in=services,
+            )
+        )
+        qs = qs.filter(Q(service__in=services) | Q(service__isnull=True) & offers_service)
+    elif city:
+        qs = qs.filter(specialist__showcase__workshop__city__iregex=_city_regex(city))
+
+    return list(
+        qs.filter(~busy_subquery(), ~held_subquery(now))
+        .select_related('specialist__showcase__workshop', 'service')
+        .order_by('date', 'start_time', 'pk')[:limit]
+    )
+
+
+def book_slot(availability, client, notes='', status=Appointment.STATUS_PENDING):
+    """
+    Записать клиента на слот. Единственное место, где создаются записи.
+
+    Внутри транзакции слот блокируется (SELECT ... FOR UPDATE там, где СУБД
+    это умеет), занятость проверяется ещё раз, а окончательно двойную
+    запись отсекает условный уникальный индекс
+    booking_one_active_appointment_per_slot. Слот, удерживаемый другим
+    клиентом, недоступен; удержание самого клиента снимается записью. На SQLite конкурирующие
+    транзакции получают "database is locked" — такие попытки повторяются
+    с экспоненциальной задержкой.
+    Возвращает Appointment или бросает SlotUnavailable.
+    """
+    for attempt in range(BOOKING_ATTEMPTS):
+        try:
+            return _book_slot_once(availability, client, notes, status)
+        except OperationalError as exc:
+            if 'locked' not in str(exc) or attempt == BOOKING_ATTEMPTS - 1:
+                raise
+            time.sleep(BOOKING_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def _book_slot_once(availability, client, notes, status):
+    with transaction.atomic():
+        locked = Availability.objects.select_for_update().filter(pk=availability.pk).values_list('pk', flat=True)
+        if not list(locked):
+            raise SlotUnavailable('Слот удалён.')
+        if Appointment.objects.filter(availability=availability, status__in=ACTIVE_STATUSES).exists():
+            raise SlotUnavailable('Это время уже занято.')
+        holds = SlotHold.objects.filter(availability=availability)
+        if holds.filter(expires_at__gt=timezone.now()).exclude(client=client).exists():
+            raise SlotUnavailable('Это время сейчас бронирует другой клиент.')
+        holds.delete()
+        transaction.on_commit(lambda: cache.delete(hold_cache_key(availability.pk)))
+        try:
+            return Appointment.objects.create(
+                client=client,
+                specialist_id=availability.specialist_id,
+                availability=availability,
+                service_id=availability.service_id,
+                notes=notes,
+                status=status,
+            )
+        except IntegrityError as exc:
+            raise SlotUnavailable('Это время уже занято.') from exc
+
+
+def bulk_set_status(user, ids, status):
+    """
+    Сменить статус записей ids (список int) студии пользователя user одной транзакцией:
+    выборка с проверкой владельца (JOIN до workshop.user), один UPDATE,
+    одна вставка строк NotificationOutbox и один сигнал
+    appointments_status_changed на всю пачку — save() и post_save не
+    вызываются. Возвращает {id: BULK_*} по каждому переданному id.
+    """
+    allowed_from = BULK_STATUS_TRANSITIONS[status]
+    results = dict.fromkeys(ids, BULK_NOT_FOUND)
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.select_for_update()
+            .filter(pk__in=ids, specialist__showcase__workshop__user=user)
+            .values_list('pk', 'status', 'specialist_id', 'availability_id', 'starts_at', 'ends_at')
+        )
+        changed = []
+        for row in rows:
+            pk, current = row[0], row[1]
+            if current == status:
+                results[pk] = BULK_UNCHANGED
+            elif current not in allowed_from:
+                results[pk] = BULK_NOT_ALLOWED
+            else:
+                results[pk] = BULK_UPDATED
+                changed.append(row)
+        if changed:
+            pks = [row[0] for row in changed]
+            # update() не трогает auto_now — updated_at (ETag календарных лент) ставим сами
+            Appointment.objects.filter(pk__in=pks, status__in=allowed_from).update(
+                status=status, updated_at=timezone.now(),
+            )
+            event = {
+                Appointment.STATUS_CONFIRMED: NotificationOutbox.EVENT_CONFIRMED,
+                Appointment.STATUS_CANCELLED: NotificationOutbox.EVENT_CANCELLED,
+            }[status]
+            NotificationOutbox.objects.bulk_create(
+                [NotificationOutbox(event=event, appointment_id=pk) for pk in pks]
+            )
+            appointments_status_changed.send(sender=Appointment, rows=changed, status=status)
+    return results
+
+
+def encode_appointment_cursor(appointment):
+    raw = json.dumps([appointment.starts_at.isoformat(), appointment.pk]).encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_appointment_cursor(cursor):
+    """(starts_at, pk) или None, если курсор битый."""
+    if not cursor:
+        return None
+    try:
+        starts_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(starts_at), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def appointments_page(qs, cursor=None, limit=APPOINTMENTS_PAGE_SIZE):
+    """
+    Страница записей с keyset-пагинацией по (starts_at, id): следующая
+    страница начинается после последней записи предыдущей, поэтому
+    стоимость страницы не зависит ни от её номера, ни от длины истории.
+    Условие starts_at >= X вынесено отдельно, чтобы SQLite искал начало
+    страницы по индексу (specialist, starts_at), а не перебирал его.
+    Возвращает (записи, курсор следующей страницы | None).
+    """
+    after = decode_appointment_cursor(cursor)
+    if after:
+        starts_at, pk = after
+        qs = qs.filter(Q(starts_at__gt=starts_at) | Q(pk__gt=pk), starts_at__gte=starts_at)
+    items = list(qs.order_by('starts_at', 'pk')[:limit + 1])
+    next_cursor = encode_appointment_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
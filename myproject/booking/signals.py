@@ -0,0 +1,115 @@
+# booking/signals.py
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import WorkshopProfile
+from showcase.models import Showcase, Specialist
+from .events import SLOT_FREED, SLOT_TAKEN, publish_slot_event
+from .models import Appointment, Availability
+from .services import ACTIVE_STATUSES, appointments_status_changed, invalidate_month_occupancy
+
+
+# Запоминаем исходные специалиста/дату слота и слот записи: при переносе
+# нужно сбросить кэш и старого месяца, и нового. Для событий страницы
+# записи (booking.events) и уведомлений — ещё и исходный статус записи.
+
+@receiver(post_init, sender=Availability)
+def availability_loaded(sender, instance, **kwargs):
+    # __dict__: у отложенного (only/defer) поля обращение к атрибуту — запрос, а внутри
+    # refresh_from_db ещё и перезапись несохранённого значения поля из БД
+    instance._occupancy_initial = (instance.__dict__.get('specialist_id'), instance.__dict__.get('date'))
+
+
+@receiver(post_init, sender=Appointment)
+def appointment_loaded(sender, instance, **kwargs):
+    instance._occupancy_initial = instance.__dict__.get('availability_id')
+    instance._status_initial = instance.__dict__.get('status')
+
+
+def _invalidate_slot(specialist_id, day):
+    if specialist_id and day:
+        invalidate_month_occupancy(specialist_id, day)
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def availability_changed(sender, instance, **kwargs):
+    _invalidate_slot(instance.specialist_id, instance.date)
+    initial = getattr(instance, '_occupancy_initial', None)
+    if initial and initial != (instance.specialist_id, instance.date):
+        _invalidate_slot(*initial)
+    instance._occupancy_initial = (instance.specialist_id, instance.date)
+
+
+@receiver(post_save, sender=Availability)
+def availability_saved_event(sender, instance, created, **kwargs):
+    # правка времени существующего слота событий не шлёт — страница обновится при записи
+    if created:
+        publish_slot_event(SLOT_FREED, instance.specialist_id, instance.pk,
+                           instance.start_datetime(), instance.end_datetime())
+
+
+@receiver(post_delete, sender=Availability)
+def availability_deleted_event(sender, instance, **kwargs):
+    publish_slot_event(SLOT_TAKEN, instance.specialist_id, instance.pk,
+                       instance.start_datetime(), instance.end_datetime())
+
+
+def _appointment_event(instance, kind):
+    if instance.starts_at is not None:
+        publish_slot_event(kind, instance.specialist_id, instance.availability_id,
+                           instance.starts_at, instance.ends_at)
+
+
+def _availability_month(availability_id):
+    return Availability.objects.filter(pk=availability_id).values_list('specialist_id', 'date').first()
+
+
+def _deletes_availabilities(origin):
+    """Удаление началось со слота или выше (специалист, витрина, студия) — слоты уйдут каскадом."""
+    model = getattr(origin, 'model', None) or type(origin)
+    return issubclass(model, (Availability, Specialist, Showcase, WorkshopProfile))
+
+
+def _invalidate_appointment(instance):
+    initial = getattr(instance, '_occupancy_initial', None)
+    for availability_id in {instance.availability_id, initial} - {None}:
+        if availability_id == instance.availability_id and 'availability' in instance._state.fields_cache:
+            availability = instance.availability
+            _invalidate_slot(availability.specialist_id, availability.date)
+        else:
+            _invalidate_slot(*(_availability_month(availability_id) or (None, None)))
+    instance._occupancy_initial = instance.availability_id
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    _invalidate_appointment(instance)
+    active = instance.status in ACTIVE_STATUSES
+    if active != (not created and getattr(instance, '_status_initial', None) in ACTIVE_STATUSES):
+        _appointment_event(instance, SLOT_TAKEN if active else SLOT_FREED)
+    instance._status_initial = instance.status
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, origin=None, **kwargs):
+    # кэш сбросит обработчик удаления Availability
+    if _deletes_availabilities(origin):
+        return
+    _invalidate_appointment(instance)
+    if getattr(instance, '_status_initial', None) in ACTIVE_STATUSES:
+        _appointment_event(instance, SLOT_FREED)
+
+
+@receiver(appointments_status_changed, sender=Appointment)
+def appointments_bulk_changed(sender, rows, status, **kwargs):
+    """Пачка bulk_set_status: каждый затронутый месяц сбрасывается один раз."""
+    tz = timezone.get_current_timezone()
+    months = set()
+    for pk, old_status, specialist_id, availability_id, starts_at, ends_at in rows:
+        months.add((specialist_id, starts_at.astimezone(tz).date().replace(day=1)))
+        if old_status in ACTIVE_STATUSES and status not in ACTIVE_STATUSES:
+            publish_slot_event(SLOT_FREED, specialist_id, availability_id, starts_at, ends_at)
+    for specialist_id, month in months:
+        invalidate_month_occupancy(specialist_id, month)
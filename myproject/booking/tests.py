@@ -1,3 +1,1214 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import re
+import tempfile
+import threading
+import unittest
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import ActivityArea, ClientProfile, ServicePrice, WorkshopProfile
+from showcase.models import Showcase, Specialist
+from .archive import archive_before, archive_cutoff
+from .events import InProcessBroker, get_broker, slot_channel, stream_slot_events
+from .export import _text_cell
+from .forms import AvailabilityFormSet, mark_overlapping_slots
+from .ics import feed_token
+from .intervals import IntervalSet, day_conflicts
+from .holds import current_hold, hold_slot, release_slot, sweep_expired_holds
+from .models import (
+    Appointment, ArchivedAppointment, Availability, NotificationOutbox, RecurringSchedule, SlotHold,
+    SpecialistMonthStats,
+)
+from .notifications import MAX_ATTEMPTS, FileSender, MemorySender, drain_outbox
+from .schedules import generate_for_specialists, generate_slots
+from .services import (
+    SlotUnavailable, appointments_page, appointments_status_changed, book_slot, bulk_set_status,
+    find_next_free_slots, free_slots, month_occupancy, occupancy_cache_key, occupancy_cache_stats,
+    reset_occupancy_cache_stats, save_slots,
+)
+
+
+def make_specialist(username='studio'):
+    user = User.objects.create_user(username)
+    workshop = WorkshopProfile.objects.create(
+        user=user, workshop_name='Студия', workshop_address='ул. Ленина, 1', phone='+375291234567', city='Минск',
+    )
+    showcase = Showcase.objects.create(workshop=workshop)
+    return Specialist.objects.create(showcase=showcase, first_name='Анна')
+
+
+def make_client(username):
+    user = User.objects.create_user(username)
+    return ClientProfile.objects.create(user=user, name=username, phone=username, city='Минск')
+
+
+def make_slot(specialist, days=1, hour=10):
+    return Availability.objects.create(
+        specialist=specialist,
+        date=date.today() + timedelta(days=days),
+        start_time=time(hour),
+        end_time=time(hour, 45),
+    )
+
+
+class BookSlotTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.slot = make_slot(self.specialist)
+
+    def test_second_booking_is_rejected(self):
+        book_slot(self.slot, make_client('c1'))
+        with self.assertRaises(SlotUnavailable):
+            book_slot(self.slot, make_client('c2'))
+        self.assertEqual(Appointment.objects.filter(availability=self.slot).count(), 1)
+
+    def test_cancelled_appointment_frees_slot(self):
+        first = book_slot(self.slot, make_client('c1'))
+        first.status = Appointment.STATUS_CANCELLED
+        first.save()
+        second = book_slot(self.slot, make_client('c2'), status=Appointment.STATUS_CONFIRMED)
+        self.assertEqual(second.status, Appointment.STATUS_CONFIRMED)
+        self.assertEqual(second.service_id, self.slot.service_id)
+
+
+class AppointmentTimesTests(TestCase):
+    def setUp(self):
+        self.slot = make_slot(make_specialist())
+        self.appointment = book_slot(self.slot, make_client('c1'))
+
+    def test_copied_from_slot_on_booking(self):
+        self.assertEqual(self.appointment.starts_at, self.slot.start_datetime())
+        self.assertEqual(self.appointment.ends_at, self.slot.end_datetime())
+
+    def test_follow_slot_changes(self):
+        self.slot.date += timedelta(days=3)
+        self.slot.start_time = time(12)
+        self.slot.end_time = time(13)
+        self.slot.save()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.starts_at, self.slot.start_datetime())
+        self.assertEqual(self.appointment.ends_at, self.slot.end_datetime())
+
+    def test_moved_to_other_slot(self):
+        other = make_slot(self.slot.specialist, days=5, hour=15)
+        self.appointment.availability = other
+        self.appointment.save(update_fields=['availability'])
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.starts_at, other.start_datetime())
+
+    def test_moved_by_availability_id(self):
+        other = make_slot(self.slot.specialist, days=5, hour=15)
+        appointment = Appointment.objects.only('pk', 'availability_id', 'status').get(pk=self.appointment.pk)
+        appointment.availability_id = other.pk
+        appointment.save(update_fields=['availability_id'])
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        self.assertEqual((appointment.starts_at, appointment.ends_at), (other.start_datetime(), other.end_datetime()))
+
+
+class SlotHoldTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = make_specialist()
+        self.slot = make_slot(self.specialist)
+        self.alice = make_client('alice')
+        self.bob = make_client('bob')
+
+    def day_counts(self):
+        day = self.slot.date
+        return month_occupancy(self.specialist, day.year, day.month)[day.day]
+
+    def test_hold_blocks_other_clients(self):
+        hold_slot(self.slot, self.alice)
+        with self.assertRaises(SlotUnavailable):
+            hold_slot(self.slot, self.bob)
+        with self.assertRaises(SlotUnavailable):
+            book_slot(self.slot, self.bob)
+        self.assertEqual(list(free_slots(self.specialist, self.slot.date, client=self.bob)), [])
+        self.assertEqual(list(free_slots(self.specialist, self.slot.date, client=self.alice)), [self.slot])
+
+    def test_holder_books_and_hold_is_removed(self):
+        hold_slot(self.slot, self.alice)
+        book_slot(self.slot, self.alice)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_occupancy_counts_holds(self):
+        self.assertEqual((self.day_counts()['free'], self.day_counts()['held']), (1, 0))
+        hold_slot(self.slot, self.alice)
+        self.assertEqual((self.day_counts()['free'], self.day_counts()['held']), (0, 1))
+        release_slot(self.slot, self.alice)
+        self.assertEqual((self.day_counts()['free'], self.day_counts()['held']), (1, 0))
+
+    def test_new_hold_replaces_previous(self):
+        other = make_slot(self.specialist, hour=12)
+        hold_slot(self.slot, self.alice)
+        hold_slot(other, self.alice)
+        self.assertEqual(list(SlotHold.objects.values_list('availability_id', flat=True)), [other.pk])
+        self.assertIsNone(current_hold(self.slot.pk))
+        hold_slot(self.slot, self.bob)
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        hold_slot(self.slot, self.alice)
+        SlotHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+        self.assertIsNone(current_hold(self.slot.pk))
+        self.assertEqual(self.day_counts()['free'], 1)
+        self.assertEqual(sweep_expired_holds(), 1)
+        self.assertFalse(SlotHold.objects.exists())
+
+
+class BookingApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = make_specialist()
+        self.slot = make_slot(self.specialist)
+        self.client_profile = make_client('alice')
+        self.client.force_login(self.client_profile.user)
+        self.month = self.slot.date.strftime('%Y-%m')
+
+    def test_occupancy_is_compact_and_conditional(self):
+        url = reverse('booking:api_occupancy', args=[self.specialist.pk])
+        response = self.client.get(url, {'month': self.month})
+        data = response.json()
+        self.assertEqual(data['days'], {str(self.slot.date.day): [1, 0, 0, 0, '10:00']})
+        with self.assertNumQueries(3):   # сессия, пользователь, специалист; занятость — из кэша
+            cached = self.client.get(url, {'month': self.month}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_day_slots_rejects_invalid_date(self):
+        url = reverse('booking:api_day_slots', args=[self.specialist.pk])
+        for value in ('2026-02-30', 'завтра'):
+            response = self.client.get(url, {'date': value})
+            self.assertEqual((response.status_code, response.json()), (400, {'error': 'Неверная дата.'}))
+
+    def test_legacy_occupancy_url_serves_api_response(self):
+        legacy = self.client.get(reverse('booking:specialist_month_occupancy', args=[self.specialist.pk]), {'month': self.month})
+        api = self.client.get(reverse('booking:api_occupancy', args=[self.specialist.pk]), {'month': self.month})
+        self.assertEqual((legacy.content, legacy['ETag']), (api.content, api['ETag']))
+
+    def test_book_and_cancel_return_day_row(self):
+        response = self.client.post(reverse('booking:api_book', args=[self.slot.pk]), {'notes': ''})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['day'], [0, 0, 1, 0, None])
+        appointment_id = response.json()['appointment']
+
+        other = make_client('bob')
+        self.client.force_login(other.user)
+        self.assertEqual(self.client.post(reverse('booking:api_book', args=[self.slot.pk])).status_code, 409)
+        self.assertEqual(self.client.post(reverse('booking:api_cancel', args=[appointment_id])).status_code, 404)
+
+        self.client.force_login(self.client_profile.user)
+        response = self.client.post(reverse('booking:api_cancel', args=[appointment_id]))
+        self.assertEqual(response.json()['status'], Appointment.STATUS_CANCELLED)
+        self.assertEqual(response.json()['day'], [1, 0, 0, 0, '10:00'])
+
+    def test_day_slots_change_etag_after_booking(self):
+        url = reverse('booking:api_day_slots', args=[self.specialist.pk])
+        params = {'date': self.slot.date.isoformat()}
+        first = self.client.get(url, params)
+        self.assertEqual([row[0] for row in first.json()['slots']], [self.slot.pk])
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        book_slot(self.slot, make_client('bob'))
+        second = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((second.status_code, second.json()['slots']), (200, []))
+        self.assertEqual(self.client.get(url, {'date': 'x'}).status_code, 400)
+
+
+class SlotEventsTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.slot = make_slot(self.specialist)
+        self.channel = slot_channel(self.specialist.pk, self.slot.date)
+
+    def published(self, action):
+        with mock.patch.object(InProcessBroker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+        return [(channel, event['type'], event['slot']) for channel, event in (c.args for c in publish.call_args_list)]
+
+    def test_status_changes_publish_taken_and_freed(self):
+        appointment = book_slot(self.slot, make_client('alice'))
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.status = Appointment.STATUS_CONFIRMED
+        self.assertEqual(self.published(appointment.save), [])
+
+        appointment.status = Appointment.STATUS_CANCELLED
+        self.assertEqual(self.published(appointment.save), [(self.channel, 'freed', self.slot.pk)])
+        self.assertEqual(
+            self.published(lambda: book_slot(self.slot, make_client('bob'))),
+            [(self.channel, 'taken', self.slot.pk)],
+        )
+
+    def test_new_and_deleted_slots_are_published(self):
+        slots = []
+        events = self.published(lambda: slots.append(make_slot(self.specialist, hour=12)))
+        pk = slots[0].pk
+        self.assertEqual(events, [(self.channel, 'freed', pk)])
+        self.assertEqual(self.published(slots[0].delete), [(self.channel, 'taken', pk)])
+
+    def test_bulk_schedule_edits_are_published(self):
+        booked = make_slot(self.specialist, hour=12)
+        book_slot(booked, make_client('alice'))
+        new = Availability(date=self.slot.date, start_time=time(14), end_time=time(15))
+        old_day = self.slot.date
+        self.slot.date += timedelta(days=1)
+        booked.start_time, booked.end_time = time(13), time(13, 45)
+        moved_channel = slot_channel(self.specialist.pk, self.slot.date)
+
+        events = self.published(lambda: save_slots(self.specialist, [new], [(self.slot, old_day), (booked, old_day)]))
+        # перенесённый на другой день слот уходит с прежнего дня; занятый слот свободным не объявляется
+        self.assertEqual(events, [
+            (self.channel, 'freed', new.pk),
+            (self.channel, 'taken', self.slot.pk),
+            (moved_channel, 'freed', self.slot.pk),
+        ])
+
+    def test_generated_slots_are_published(self):
+        day = self.slot.date
+        RecurringSchedule.objects.create(
+            specialist=self.specialist, weekdays=str(day.weekday()), start_time=time(11), end_time=time(13),
+            valid_from=day,
+        )
+        events = self.published(lambda: generate_slots(RecurringSchedule.objects.all(), day, day))
+        created = Availability.objects.filter(specialist=self.specialist, start_time__gte=time(11)).order_by('start_time')
+        self.assertEqual(sorted(events, key=lambda e: e[2]), [(self.channel, 'freed', slot.pk) for slot in created])
+        self.assertEqual(len(events), 2)
+
+    async def test_stream_delivers_events_from_other_threads(self):
+        stream = stream_slot_events(self.channel, keepalive=5)
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+        chunk = asyncio.ensure_future(anext(stream))
+        await asyncio.to_thread(get_broker().publish, self.channel, {'type': 'taken', 'slot': 7})
+        self.assertEqual(await asyncio.wait_for(chunk, 1), 'event: taken\ndata: {"type": "taken", "slot": 7}\n\n')
+        await stream.aclose()
+        self.assertNotIn(self.channel, get_broker()._subscribers)
+
+    @override_settings(BOOKING_LIVE_EVENTS=True)
+    def test_unknown_specialist_is_404(self):
+        self.client.force_login(make_client('alice').user)
+        response = self.client.get(reverse('booking:slot_events', args=[self.specialist.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(BOOKING_LIVE_EVENTS=True)
+    def test_invalid_date_is_400(self):
+        self.client.force_login(make_client('alice').user)
+        response = self.client.get(reverse('booking:slot_events', args=[self.specialist.pk]), {'date': '2026-02-30'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+    def test_disabled_under_wsgi(self):
+        self.client.force_login(make_client('alice').user)
+        response = self.client.get(reverse('booking:slot_events', args=[self.specialist.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+        page_url = reverse('booking:client_book_appointment', args=[self.specialist.pk])
+        self.assertNotContains(self.client.get(page_url, {'date': self.slot.date.isoformat()}), 'slots-live')
+        with self.settings(BOOKING_LIVE_EVENTS=True):
+            self.assertContains(self.client.get(page_url, {'date': self.slot.date.isoformat()}), 'slots-live')
+
+
+class NextFreeSlotsTests(TestCase):
+    def setUp(self):
+        self.area = ActivityArea.objects.first()
+        self.specialist = make_specialist()
+        self.workshop = self.specialist.showcase.workshop
+        self.manicure = ServicePrice.objects.create(
+            workshop=self.workshop, activity_area=self.area, service_name='Маникюр', price=30,
+        )
+        self.now = timezone.make_aware(datetime.combine(date.today(), time(12)))
+
+    def slot(self, days, hour, service=None, specialist=None):
+        slot = make_slot(specialist or self.specialist, days=days, hour=hour)
+        if service:
+            slot.service = service
+            slot.save()
+        return slot
+
+    def test_busy_and_past_slots_are_excluded_and_order_is_by_start(self):
+        self.slot(0, 10, self.manicure)                                  # уже прошёл
+        later = self.slot(2, 9, self.manicure)
+        today = self.slot(0, 13, self.manicure)
+        busy = self.slot(1, 9, self.manicure)
+        book_slot(busy, make_client('c1'))
+        tomorrow = self.slot(1, 11, self.manicure)
+        self.assertEqual(find_next_free_slots(service='маникюр', now=self.now), [today, tomorrow, later])
+        self.assertEqual(find_next_free_slots(service='маникюр', limit=1, now=self.now), [today])
+
+    def test_held_slots_are_excluded_until_hold_expires(self):
+        held = self.slot(1, 9, self.manicure)
+        expired = self.slot(1, 10, self.manicure)
+        SlotHold.objects.create(availability=held, client=make_client('c1'), expires_at=self.now + timedelta(minutes=5))
+        SlotHold.objects.create(availability=expired, client=make_client('c2'), expires_at=self.now - timedelta(minutes=1))
+        self.assertEqual(find_next_free_slots(service='маникюр', now=self.now), [expired])
+
+    def test_slot_without_service_matches_specialist_services(self):
+        self.specialist.services.add(self.manicure)
+        generic = self.slot(1, 10)
+        other = make_specialist('other')
+        self.slot(1, 11, specialist=other)                               # услуга не указана и не оказывается
+        pedicure = ServicePrice.objects.create(
+            workshop=self.workshop, activity_area=self.area, service_name='Педикюр', price=40,
+        )
+        self.slot(1, 12, pedicure)
+        self.assertEqual(find_next_free_slots(service='Маникюр', now=self.now), [generic])
+
+    def test_city_filter(self):
+        gomel = make_specialist('gomel')
+        WorkshopProfile.objects.filter(pk=gomel.showcase.workshop_id).update(city='Гомель')
+        minsk_slot = self.slot(1, 10, self.manicure)
+        gomel_slot = self.slot(1, 11, specialist=gomel)
+        self.assertEqual(find_next_free_slots(city='минск', now=self.now), [minsk_slot])
+        self.assertEqual(find_next_free_slots(city='Гомель', now=self.now), [gomel_slot])
+        self.assertEqual(find_next_free_slots(service='маникюр', city='Гомель', now=self.now), [])
+
+
+class OccupancyCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = make_specialist()
+        self.slot = make_slot(self.specialist)
+        self.day = self.slot.date
+        self.key = occupancy_cache_key(self.specialist.pk, self.day.year, self.day.month)
+
+    def occupancy(self):
+        return month_occupancy(self.specialist, self.day.year, self.day.month)
+
+    def test_refresh_is_served_from_cache_and_counted(self):
+        reset_occupancy_cache_stats()
+        with self.assertNumQueries(1):
+            first = self.occupancy()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.occupancy(), first)
+            self.occupancy()
+        self.assertEqual(occupancy_cache_stats(), {'hits': 2, 'misses': 1, 'hit_ratio': 2 / 3})
+        reset_occupancy_cache_stats()
+        self.assertEqual(occupancy_cache_stats(), {'hits': 0, 'misses': 0, 'hit_ratio': None})
+
+    def test_booking_invalidates_month(self):
+        self.assertEqual(self.occupancy()[self.day.day]['free'], 1)
+        book_slot(self.slot, make_client('c1'))
+        self.assertEqual(self.occupancy()[self.day.day]['pending'], 1)
+
+    def test_value_cached_before_commit_is_dropped_after_commit(self):
+        self.occupancy()
+        with self.captureOnCommitCallbacks(execute=True):
+            book_slot(self.slot, make_client('c1'))
+            # параллельный запрос до коммита видит старые данные и кладёт их в кэш
+            cache.set(self.key, {'stale': True})
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(self.occupancy()[self.day.day]['pending'], 1)
+
+    def test_bulk_status_change_invalidates_after_commit(self):
+        appointment = book_slot(self.slot, make_client('c1'))
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_set_status(self.specialist.showcase.workshop.user, [appointment.pk], Appointment.STATUS_CANCELLED)
+            cache.set(self.key, {'stale': True})
+        self.assertEqual(self.occupancy()[self.day.day]['free'], 1)
+
+
+class OwnerConfirmTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.slot = make_slot(self.specialist)
+        self.client.force_login(self.specialist.showcase.workshop.user)
+
+    def confirm(self, appointment):
+        response = self.client.get(reverse('booking:owner_confirm_appointment', args=[appointment.pk]), follow=True)
+        appointment.refresh_from_db()
+        return [str(m) for m in response.context['messages']]
+
+    def test_cancelled_appointment_on_rebooked_slot_is_not_confirmed(self):
+        old = book_slot(self.slot, make_client('c1'))
+        old.status = Appointment.STATUS_CANCELLED
+        old.save()
+        book_slot(self.slot, make_client('c2'))
+        self.assertEqual(self.confirm(old), ['Подтвердить можно только запись, ожидающую подтверждения.'])
+        self.assertEqual(old.status, Appointment.STATUS_CANCELLED)
+
+    def test_pending_appointment_is_confirmed(self):
+        appointment = book_slot(self.slot, make_client('c1'))
+        self.assertEqual(self.confirm(appointment), ['Запись подтверждена.'])
+        self.assertEqual(appointment.status, Appointment.STATUS_CONFIRMED)
+
+    def test_integrity_error_is_reported(self):
+        appointment = book_slot(self.slot, make_client('c1'))
+        with mock.patch.object(Appointment, 'save', side_effect=IntegrityError):
+            self.assertEqual(self.confirm(appointment), ['Это время уже занято другой записью.'])
+        self.assertEqual(appointment.status, Appointment.STATUS_PENDING)
+
+
+class OwnerAppointmentsPageTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        client = make_client('c1')
+        for days in range(1, 4):
+            for hour in range(9, 16):
+                book_slot(make_slot(self.specialist, days=days, hour=hour), client)
+        cancelled = book_slot(make_slot(self.specialist, days=1, hour=17), client)
+        cancelled.status = Appointment.STATUS_CANCELLED
+        cancelled.save()
+        book_slot(make_slot(self.specialist, days=-2), client)
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        self.url = reverse('booking:owner_appointments_list', kwargs={'pk': self.specialist.pk})
+
+    def test_keyset_pages_cover_all_rows_in_order(self):
+        qs = self.specialist.appointments.all()
+        seen, cursor = [], None
+        while True:
+            page, cursor = appointments_page(qs, cursor, limit=4)
+            seen.extend(page)
+            if not cursor:
+                break
+        self.assertEqual(seen, list(qs.order_by('starts_at', 'pk')))
+
+    def test_default_window_and_filters(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['appointments']), 21)
+        response = self.client.get(self.url, {'status': 'cancelled'})
+        self.assertEqual(len(response.context['appointments']), 1)
+        day = date.today() + timedelta(days=1)
+        response = self.client.get(self.url, {'from': day.isoformat(), 'to': day.isoformat(), 'status': 'all'})
+        self.assertEqual(len(response.context['appointments']), 8)
+
+    def test_invalid_date_falls_back_to_default_window(self):
+        day = date.today() + timedelta(days=1)
+        response = self.client.get(self.url, {'from': '2026-02-30', 'to': day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['appointments']), 21)
+
+
+class ScheduleEditorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = make_specialist()
+        workshop = self.specialist.showcase.workshop
+        area = ActivityArea.objects.first()
+        self.services = [
+            ServicePrice.objects.create(workshop=workshop, activity_area=area, service_name=f'Услуга {i}', price=10 + i)
+            for i in range(5)
+        ]
+        self.day = date.today() + timedelta(days=1)
+        self.slot = make_slot(self.specialist, days=1, hour=9)
+        self.appointment = book_slot(self.slot, make_client('c1'))
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        self.url = reverse('booking:owner_schedule_manage', kwargs={'pk': self.specialist.pk})
+        self.params = {'month': f'{self.day:%Y-%m}', 'date': self.day.isoformat()}
+
+    def get_page(self):
+        return self.client.get(self.url, self.params)
+
+    def test_service_choices_are_not_queried_per_form(self):
+        with CaptureQueriesContext(connection) as before:
+            self.get_page()
+        for hour in range(10, 18):
+            Availability.objects.create(
+                specialist=self.specialist, date=self.day, start_time=time(hour), end_time=time(hour, 30),
+                service=self.services[hour % 5],
+            )
+        make_slot(self.specialist, days=20)   # вне окна редактора
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            response = self.get_page()
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(len(response.context['formset'].forms), 10)
+
+    def formset_data(self, changes):
+        formset = self.get_page().context['formset']
+        data = {'formset_submit': '1'}
+        for name in ('TOTAL_FORMS', 'INITIAL_FORMS', 'MIN_NUM_FORMS', 'MAX_NUM_FORMS'):
+            data[f'form-{name}'] = formset.management_form[name].value()
+        for i, form in enumerate(formset.forms):
+            for name in ('id', 'date', 'start_time', 'end_time', 'service'):
+                value = form[name].value()
+                data[f'form-{i}-{name}'] = '' if value is None else value
+        data.update(changes)
+        return data
+
+    def post_formset(self, changes):
+        return self.client.post(f'{self.url}?month={self.params["month"]}&date={self.params["date"]}',
+                                self.formset_data(changes))
+
+    def save_end_times(self, minute, num_queries=None):
+        """POST, меняющий конец каждого слота с услугой; возвращает число запросов (или проверяет num_queries)."""
+        slots = Availability.objects.filter(specialist=self.specialist, service__isnull=False)
+        count = slots.count()
+        data = self.formset_data({f'form-{i}-end_time': f'{9 + i}:{minute}' for i in range(1, count + 1)})
+        url = f'{self.url}?month={self.params["month"]}&date={self.params["date"]}'
+        with CaptureQueriesContext(connection) as ctx:
+            if num_queries is None:
+                response = self.client.post(url, data)
+            else:
+                with self.assertNumQueries(num_queries):
+                    response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(slots.filter(end_time__minute=int(minute)).count(), count)
+        return len(ctx)
+
+    def add_service_slots(self, hours):
+        for hour in hours:
+            Availability.objects.create(
+                specialist=self.specialist, date=self.day, start_time=time(hour), end_time=time(hour, 30),
+                service=self.services[hour % 5],
+            )
+
+    def test_saving_does_not_query_per_form(self):
+        self.add_service_slots(range(10, 12))
+        few = self.save_end_times('40')
+        self.add_service_slots(range(12, 22))
+        self.save_end_times('45', num_queries=few)
+
+    def test_foreign_slot_id_is_rejected(self):
+        foreign = make_slot(make_specialist('other'), days=1, hour=15)
+        response = self.post_formset({'form-0-id': foreign.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['formset'].forms[0].errors)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.start_time, time(15))
+
+    def test_bulk_save_moves_appointments_and_drops_cache(self):
+        month_occupancy(self.specialist, self.day.year, self.day.month)
+        response = self.post_formset({
+            'form-0-start_time': '11:00', 'form-0-end_time': '12:00', 'form-0-service': self.services[2].pk,
+            'form-1-date': self.day.isoformat(), 'form-1-start_time': '13:00', 'form-1-end_time': '14:00',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.start_time, self.slot.service), (time(11), self.services[2]))
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.starts_at, self.slot.start_datetime())
+        self.assertEqual(Availability.objects.filter(specialist=self.specialist).count(), 2)
+        self.assertEqual(month_occupancy(self.specialist, self.day.year, self.day.month)[self.day.day]['free'], 1)
+
+    def test_bulk_delete(self):
+        self.post_formset({'form-0-DELETE': 'on'})
+        self.assertFalse(Availability.objects.filter(pk=self.slot.pk).exists())
+        self.assertFalse(Appointment.objects.exists())
+
+
+class RecurringScheduleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = make_specialist()
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+
+    def schedule(self, **kwargs):
+        fields = dict(
+            specialist=self.specialist, weekdays='0,2', start_time=time(10), end_time=time(12),
+            slot_minutes=60, valid_from=self.monday,
+        )
+        fields.update(kwargs)
+        return RecurringSchedule.objects.create(**fields)
+
+    def slots(self):
+        return list(
+            Availability.objects.filter(specialist=self.specialist)
+            .order_by('date', 'start_time').values_list('date', 'start_time', 'end_time')
+        )
+
+    def test_slot_times_drop_incomplete_tail(self):
+        schedule = self.schedule(end_time=time(12, 30))
+        self.assertEqual(schedule.slot_times(), [(time(10), time(11)), (time(11), time(12))])
+        self.assertEqual(schedule.weekdays_display(), 'Пн, Ср')
+
+    def test_weekdays_and_validity_window(self):
+        self.schedule(valid_from=self.monday + timedelta(days=7), valid_until=self.monday + timedelta(days=16))
+        result = generate_slots(RecurringSchedule.objects.all(), self.monday, self.monday + timedelta(days=27))
+        days = [self.monday + timedelta(days=d) for d in (7, 9, 14, 16)]
+        self.assertEqual(self.slots(), [(day, time(h), time(h + 1)) for day in days for h in (10, 11)])
+        self.assertEqual((result.created, result.skipped), (8, 0))
+
+    def test_past_days_and_inactive_schedules_are_skipped(self):
+        self.schedule(weekdays='0,1,2,3,4,5,6', valid_from=self.monday - timedelta(days=30))
+        self.schedule(weekdays='0,1,2,3,4,5,6', start_time=time(14), end_time=time(15), is_active=False)
+        generate_slots(RecurringSchedule.objects.all(), self.monday - timedelta(days=14), self.monday)
+        today = timezone.localdate()
+        days = [today + timedelta(days=d) for d in range((self.monday - today).days + 1)]
+        self.assertEqual(self.slots(), [(day, time(h), time(h + 1)) for day in days for h in (10, 11)])
+
+    def test_overlaps_with_existing_and_other_schedules_are_skipped(self):
+        Availability.objects.create(
+            specialist=self.specialist, date=self.monday, start_time=time(10, 30), end_time=time(11, 15),
+        )
+        self.schedule(weekdays='0')
+        self.schedule(weekdays='0', start_time=time(11, 30), end_time=time(13, 30))
+        self.schedule(weekdays='0', start_time=time(12), end_time=time(13))
+        result = generate_slots(RecurringSchedule.objects.all(), self.monday, self.monday)
+        # 10–11 и 11–12 задевают ручной слот, 12–13 — более ранний 11:30–12:30 другого шаблона
+        self.assertEqual(self.slots(), [
+            (self.monday, time(10, 30), time(11, 15)),
+            (self.monday, time(11, 30), time(12, 30)),
+            (self.monday, time(12, 30), time(13, 30)),
+        ])
+        self.assertEqual((result.created, result.skipped), (2, 3))
+
+    def test_rerun_is_idempotent(self):
+        self.schedule()
+        end = self.monday + timedelta(days=13)
+        first = generate_for_specialists([self.specialist.pk], start=self.monday, end=end)
+        before = self.slots()
+        second = generate_for_specialists([self.specialist.pk], start=self.monday, end=end)
+        self.assertEqual((first.created, second.created, second.skipped), (8, 0, 8))
+        self.assertEqual(self.slots(), before)
+
+    def test_drops_month_occupancy_cache(self):
+        self.schedule(weekdays='0')
+        month_occupancy(self.specialist, self.monday.year, self.monday.month)
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_slots(RecurringSchedule.objects.all(), self.monday, self.monday)
+        self.assertEqual(month_occupancy(self.specialist, self.monday.year, self.monday.month)[self.monday.day]['free'], 2)
+
+    def test_owner_view_adds_schedule_and_generates(self):
+        url = reverse('booking:owner_recurring_schedules', kwargs={'pk': self.specialist.pk})
+        self.client.force_login(make_specialist('other').showcase.workshop.user)
+        self.assertRedirects(self.client.get(url), reverse('booking:owner_specialists_list'))
+
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        self.client.post(url, {
+            'add_schedule': '1', 'weekdays': ['0', '2'], 'start_time': '10:00', 'end_time': '12:00',
+            'slot_minutes': 60, 'valid_from': self.monday.isoformat(),
+        })
+        self.assertEqual(RecurringSchedule.objects.get().weekdays, '0,2')
+        response = self.client.post(url, {'generate_slots': '1', 'weeks': '2'})
+        self.assertRedirects(response, reverse('booking:owner_schedule_manage', kwargs={'pk': self.specialist.pk}))
+        self.assertEqual(len(self.slots()), 8)
+
+    def test_command(self):
+        self.schedule()
+        out = io.StringIO()
+        call_command('generate_slots', '--from', self.monday.isoformat(), '--weeks', '1',
+                     '--specialist', str(self.specialist.pk), stdout=out)
+        self.assertIn('Создано слотов: 6, пропущено из-за пересечений: 0', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('generate_slots', '--from', '18.10.2026', stdout=io.StringIO())
+
+    def test_quarter_for_fifty_specialists_benchmark(self):
+        out = io.StringIO()
+        # сама команда по умолчанию требует < 1 с; здесь запас на медленные машины CI
+        call_command('benchmark_slot_generation', '--max-seconds', '2', stdout=out)
+        self.assertIn('создано слотов: 25870', out.getvalue())
+        self.assertFalse(Availability.objects.exists())
+
+
+class IntervalSetTests(SimpleTestCase):
+    def test_touching_intervals_do_not_overlap(self):
+        intervals = IntervalSet([(time(10), time(11), 'a'), (time(11), time(12), 'b')])
+        self.assertIsNone(intervals.find_overlap(time(12), time(13)))
+        self.assertIsNone(intervals.find_overlap(time(9), time(10)))
+        self.assertEqual(intervals.overlapping_pairs(), [])
+
+    def test_find_overlap_sees_long_earlier_interval(self):
+        intervals = IntervalSet([(time(9), time(18), 'day'), (time(10), time(11), 'a'), (time(12), time(13), 'b')])
+        self.assertEqual(intervals.find_overlap(time(15), time(16)), (time(9), time(18), 'day'))
+        self.assertEqual(intervals.find_overlap(time(12, 30), time(12, 45))[2], 'b')
+        self.assertIsNone(IntervalSet().find_overlap(time(10), time(11)))
+
+    def test_nested_intervals_pair_with_container(self):
+        outer, inner, other = (time(10), time(14), 'outer'), (time(11), time(12), 'inner'), (time(13), time(15), 'other')
+        self.assertEqual(IntervalSet([other, inner, outer]).overlapping_pairs(), [(outer, inner), (outer, other)])
+
+    def test_add_if_free(self):
+        intervals = IntervalSet()
+        self.assertIsNone(intervals.add_if_free(time(10), time(11), 'a'))
+        self.assertIsNone(intervals.add_if_free(time(11), time(12), 'b'))
+        self.assertEqual(intervals.add_if_free(time(10, 30), time(10, 45), 'c'), (time(10), time(11), 'a'))
+        self.assertEqual([payload for _, _, payload in intervals], ['a', 'b'])
+
+    def test_day_conflicts(self):
+        existing = [(time(9), time(10), 'db')]
+        submitted = [(time(9, 30), time(10, 30), 1), (time(10), time(11), 2), (time(10, 45), time(11, 15), 3)]
+        with_existing, between = day_conflicts(existing, submitted)
+        self.assertEqual(with_existing, [(submitted[0], existing[0])])
+        self.assertEqual(between, [(submitted[0], submitted[1]), (submitted[1], submitted[2])])
+
+
+class MarkOverlappingSlotsTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.day = date.today() + timedelta(days=1)
+        self.edited = make_slot(self.specialist, hour=10)          # 10:00–10:45, в formset'е
+        self.stored = make_slot(self.specialist, hour=12)          # 12:00–12:45, только в БД
+
+    def check(self, rows):
+        """rows: [(start, end, delete)] — сначала редактируемый слот, затем новые."""
+        data = {'form-TOTAL_FORMS': len(rows), 'form-INITIAL_FORMS': 1, 'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 1000}
+        for i, (start, end, delete) in enumerate(rows):
+            data.update({f'form-{i}-date': self.day.isoformat(), f'form-{i}-start_time': start, f'form-{i}-end_time': end})
+            if i == 0:
+                data['form-0-id'] = self.edited.pk
+            if delete:
+                data[f'form-{i}-DELETE'] = 'on'
+        formset = AvailabilityFormSet(data, queryset=Availability.objects.filter(pk=self.edited.pk))
+        self.assertTrue(formset.is_valid(), formset.errors)
+        has_errors = mark_overlapping_slots(formset, self.specialist)
+        return has_errors, [bool(form.errors) for form in formset.forms]
+
+    def test_overlap_with_slot_stored_in_db(self):
+        has_errors, errors = self.check([('10:00', '10:45', False), ('12:30', '13:00', False)])
+        self.assertTrue(has_errors)
+        self.assertEqual(errors, [False, True])
+
+    def test_touching_slots_are_allowed(self):
+        self.assertEqual(
+            self.check([('10:00', '10:45', False), ('10:45', '12:00', False), ('12:45', '13:30', False)]),
+            (False, [False, False, False]),
+        )
+
+    def test_nested_slots_between_forms(self):
+        has_errors, errors = self.check([('10:00', '11:30', False), ('10:30', '11:00', False), ('14:00', '15:00', False)])
+        self.assertTrue(has_errors)
+        self.assertEqual(errors, [True, True, False])
+
+    def test_deleted_form_does_not_conflict(self):
+        # удалённый слот не мешает ни новой форме на его месте, ни как слот БД
+        self.assertEqual(
+            self.check([('10:00', '10:45', True), ('10:00', '10:45', False)]),
+            (False, [False, False]),
+        )
+
+    def test_moved_slot_frees_its_old_time(self):
+        self.assertEqual(
+            self.check([('14:00', '14:45', False), ('10:00', '10:45', False)]),
+            (False, [False, False]),
+        )
+
+
+class IcsFeedTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.client_profile = make_client('c1')
+        self.appointment = book_slot(make_slot(self.specialist), self.client_profile, notes='Длинная заметка; ' * 10)
+        self.url = reverse('booking:specialist_ics_feed', kwargs={
+            'pk': self.specialist.pk, 'token': feed_token('specialist', self.specialist.pk),
+        })
+
+    def test_streams_events(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('BEGIN:VEVENT', body)
+        self.assertIn(f'UID:booking-appointment-{self.appointment.pk}@', body)
+        self.assertIn('STATUS:TENTATIVE', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+    def test_unchanged_feed_is_one_query_and_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.appointment.status = Appointment.STATUS_CONFIRMED
+        self.appointment.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_client_feed_and_bad_token(self):
+        url = reverse('booking:client_ics_feed', kwargs={
+            'pk': self.client_profile.pk, 'token': feed_token('client', self.client_profile.pk),
+        })
+        self.assertEqual(self.client.get(url).status_code, 200)
+        bad = reverse('booking:client_ics_feed', kwargs={
+            'pk': self.client_profile.pk + 1, 'token': feed_token('client', self.client_profile.pk),
+        })
+        self.assertEqual(self.client.get(bad).status_code, 404)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.client_profile = make_client('c1')
+        book_slot(make_slot(self.specialist, days=-100), self.client_profile)
+        archive_before(archive_cutoff(90))
+        book_slot(make_slot(self.specialist, days=2), self.client_profile)
+        book_slot(make_slot(make_specialist('other'), days=2), self.client_profile)
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        self.url = reverse('booking:owner_export_appointments')
+
+    def rows(self, params=None):
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content.lstrip('\ufeff')), delimiter=';'))
+
+    def test_archived_and_live_rows_of_own_studio(self):
+        rows = self.rows()
+        self.assertEqual(rows[0][0], 'Дата')
+        self.assertEqual(len(rows), 3)
+        self.assertLess(datetime.strptime(rows[1][0], '%d.%m.%Y'), datetime.strptime(rows[2][0], '%d.%m.%Y'))
+
+    def test_date_range(self):
+        day = date.today() + timedelta(days=2)
+        self.assertEqual(len(self.rows({'from': day.isoformat(), 'to': day.isoformat()})), 2)
+
+    def test_invalid_date_exports_whole_history(self):
+        self.assertEqual(len(self.rows({'from': '2026-02-30'})), 3)
+
+    def test_formula_cells_are_escaped(self):
+        self.client_profile.name = '=HYPERLINK("http://evil","x")'
+        self.client_profile.phone = '+375291234567'   # телефон не экранируется
+        self.client_profile.save()
+        Appointment.objects.filter(client=self.client_profile).update(notes='@SUM(1)')
+        ServicePrice.objects.create(
+            workshop=self.specialist.showcase.workshop, activity_area=ActivityArea.objects.first(),
+            service_name='-1+1', price=10,
+        )
+        Availability.objects.filter(specialist=self.specialist).update(service=ServicePrice.objects.get())
+        Appointment.objects.filter(specialist=self.specialist).update(service=ServicePrice.objects.get())
+        row = self.rows()[-1]
+        self.assertEqual(
+            (row[4], row[5], row[6], row[8]),
+            ('\'=HYPERLINK("http://evil","x")', '+375291234567', "'-1+1", "'@SUM(1)"),
+        )
+        self.assertEqual(row[3], 'Анна')
+        self.assertEqual([_text_cell(v) for v in ('+375 (29) 123-45-67', '-10', '\t10', '+1+1')],
+                         ['+375 (29) 123-45-67', '-10', "'\t10", "'+1+1"])
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.owner = self.specialist.showcase.workshop.user
+        self.owner.email = 'studio@example.com'
+        self.owner.save()
+        self.client_profile = make_client('alice')
+        self.client_profile.user.email = 'alice@example.com'
+        self.client_profile.user.save()
+        self.appointment = book_slot(make_slot(self.specialist), self.client_profile)
+        MemorySender.sent.clear()
+
+    def events(self):
+        return list(NotificationOutbox.objects.order_by('pk').values_list('event', flat=True))
+
+    def test_status_changes_are_written_with_one_insert(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('booking:owner_confirm_appointment', args=[self.appointment.pk]))
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "booking_notificationoutbox"')]
+        self.assertEqual(len(inserts), 1)
+
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        appointment.save()   # статус не менялся — уведомления нет
+        self.client.force_login(self.client_profile.user)
+        self.client.get(reverse('booking:client_cancel_appointment', args=[self.appointment.pk]))
+        self.assertEqual(self.events(), ['created', 'confirmed', 'cancelled'])
+
+    def test_outbox_failure_rolls_back_status_change(self):
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        appointment.status = Appointment.STATUS_CONFIRMED
+        with mock.patch.object(NotificationOutbox.objects, 'create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), transaction.atomic():   # точка сохранения вместо транзакции запроса
+                appointment.save()
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).status, Appointment.STATUS_PENDING)
+
+    def test_drain_sends_and_marks_rows(self):
+        result = drain_outbox(senders=[MemorySender()])
+        self.assertEqual((result.sent, result.processed), (1, 1))
+        self.assertEqual(MemorySender.sent[0].recipients, ['studio@example.com'])
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.STATUS_SENT)
+        self.assertEqual(drain_outbox(senders=[MemorySender()]).processed, 0)
+
+    def test_failing_sender_is_retried_with_backoff_then_failed(self):
+        broken = mock.Mock()
+        broken.send.side_effect = ConnectionError('smtp down')
+        now = timezone.now()
+        self.assertEqual(drain_outbox(senders=[broken], now=now).retried, 1)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.attempts, row.available_at), (1, now + timedelta(seconds=30)))
+        self.assertEqual(drain_outbox(senders=[broken], now=now).processed, 0)   # ещё рано
+
+        NotificationOutbox.objects.update(attempts=MAX_ATTEMPTS - 1, available_at=now)
+        self.assertEqual(drain_outbox(senders=[broken], now=now).failed, 1)
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.STATUS_FAILED)
+
+    def test_file_sender_and_missing_appointment(self):
+        Appointment.objects.filter(pk=self.appointment.pk).update(status=Appointment.STATUS_CANCELLED)
+        NotificationOutbox.objects.create(event=NotificationOutbox.EVENT_CANCELLED, appointment_id=10 ** 9)
+        with tempfile.NamedTemporaryFile('r', suffix='.jsonl', encoding='utf-8') as f:
+            result = drain_outbox(senders=[FileSender(f.name)])
+            self.assertEqual((result.sent, result.failed), (1, 1))
+            self.assertIn('"event": "created"', f.read())
+
+
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = make_specialist()
+        self.owner = self.specialist.showcase.workshop.user
+        self.slots = [make_slot(self.specialist, hour=hour) for hour in (10, 11, 12, 13)]
+        self.pending, self.confirmed, self.cancelled = (
+            book_slot(slot, make_client(f'c{i}')) for i, slot in enumerate(self.slots[:3])
+        )
+        Appointment.objects.filter(pk=self.confirmed.pk).update(status=Appointment.STATUS_CONFIRMED)
+        Appointment.objects.filter(pk=self.cancelled.pk).update(status=Appointment.STATUS_CANCELLED)
+        self.foreign = book_slot(make_slot(make_specialist('other')), make_client('c9'))
+
+    def test_results_per_id_with_one_update_and_one_signal(self):
+        ids = [self.pending.pk, self.confirmed.pk, self.cancelled.pk, self.foreign.pk, 10 ** 9]
+        receiver = mock.Mock()
+        appointments_status_changed.connect(receiver, sender=Appointment)
+        self.addCleanup(appointments_status_changed.disconnect, receiver, sender=Appointment)
+        NotificationOutbox.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            results = bulk_set_status(self.owner, ids, Appointment.STATUS_CONFIRMED)
+        self.assertEqual(results, {
+            self.pending.pk: 'updated', self.confirmed.pk: 'unchanged', self.cancelled.pk: 'not_allowed',
+            self.foreign.pk: 'not_found', 10 ** 9: 'not_found',
+        })
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'INSERT'])
+        self.assertEqual(receiver.call_count, 1)
+        self.assertEqual(list(NotificationOutbox.objects.values_list('event', 'appointment_id')),
+                         [('confirmed', self.pending.pk)])
+        self.assertGreater(Appointment.objects.get(pk=self.pending.pk).updated_at, self.pending.updated_at)
+
+    def test_cancel_frees_slots_in_cached_occupancy(self):
+        day = self.slots[0].date
+        self.assertEqual(month_occupancy(self.specialist, day.year, day.month)[day.day]['free'], 2)
+        bulk_set_status(self.owner, [self.pending.pk, self.confirmed.pk], Appointment.STATUS_CANCELLED)
+        self.assertEqual(month_occupancy(self.specialist, day.year, day.month)[day.day]['free'], 4)
+
+    def test_view_returns_result_map(self):
+        self.client.force_login(self.owner)
+        url = reverse('booking:owner_bulk_appointment_status')
+        response = self.client.post(url, {'status': 'cancelled', 'ids': [self.pending.pk, self.foreign.pk]})
+        self.assertEqual(response.json(), {
+            'status': 'cancelled', 'updated': 1,
+            'results': {str(self.pending.pk): 'updated', str(self.foreign.pk): 'not_found'},
+        })
+        self.assertEqual(Appointment.objects.get(pk=self.foreign.pk).status, Appointment.STATUS_PENDING)
+        self.assertEqual(self.client.post(url, {'status': 'pending', 'ids': [1]}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'status': 'cancelled', 'ids': ['x']}).status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.client_profile = make_client('c1')
+        self.old_slots = [make_slot(self.specialist, days=-100, hour=hour) for hour in range(9, 14)]
+        self.recent = make_slot(self.specialist, days=-5)
+        book_slot(self.old_slots[0], self.client_profile, status=Appointment.STATUS_CONFIRMED)
+        cancelled = book_slot(self.old_slots[1], self.client_profile)
+        cancelled.status = Appointment.STATUS_CANCELLED
+        cancelled.save()
+        book_slot(self.recent, self.client_profile)
+
+    def test_moves_old_rows_in_batches(self):
+        result = archive_before(archive_cutoff(90), batch_size=2)
+        self.assertEqual((result.slots, result.appointments, result.batches), (5, 2, 3))
+        self.assertEqual(list(Availability.objects.all()), [self.recent])
+        self.assertEqual(Appointment.objects.get().availability, self.recent)
+        self.assertEqual(
+            sorted(ArchivedAppointment.objects.values_list('status', flat=True)),
+            [Appointment.STATUS_CANCELLED, Appointment.STATUS_CONFIRMED],
+        )
+        stats = SpecialistMonthStats.objects.get()
+        self.assertEqual(stats.month, self.old_slots[0].date.replace(day=1))
+        self.assertEqual((stats.slots, stats.booked_slots, stats.confirmed, stats.cancelled), (5, 1, 1, 1))
+
+    def test_drops_month_occupancy_cache(self):
+        day = self.old_slots[0].date
+        self.assertEqual(month_occupancy(self.specialist, day.year, day.month)[day.day]['free'], 4)
+        archive_before(archive_cutoff(90))
+        self.assertEqual(month_occupancy(self.specialist, day.year, day.month)[day.day]['free'], 0)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 12
+
+    def test_parallel_bookings_have_exactly_one_winner(self):
+        specialist = make_specialist()
+        slot = make_slot(specialist)
+        clients = [make_client(f'client{i}') for i in range(self.THREADS)]
+
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        lock = threading.Lock()
+
+        def attempt(client):
+            try:
+                barrier.wait()
+                try:
+                    book_slot(slot, client)
+                    outcome = 'booked'
+                except SlotUnavailable:
+                    outcome = 'unavailable'
+                except Exception as exc:  # любая другая ошибка — провал теста
+                    outcome = repr(exc)
+                with lock:
+                    results.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('booked'), 1, results)
+        self.assertEqual(results.count('unavailable'), self.THREADS - 1, results)
+        self.assertEqual(
+            Appointment.objects.filter(availability=slot, status__in=['pending', 'confirmed']).count(), 1
+        )
+
+
+class ListingQueryCountTests(TestCase):
+    """Число запросов в списках записей не зависит от числа записей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialist = make_specialist()
+        workshop = cls.specialist.showcase.workshop
+        service = ServicePrice.objects.create(
+            workshop=workshop, activity_area=ActivityArea.objects.first(), service_name='Маникюр', price=30,
+        )
+        cls.client_profile = make_client('client')
+        cls.day = date.today() + timedelta(days=1)
+        for days in (-20, -10, -3, 1, 1, 1, 2, 5):
+            slot = make_slot(cls.specialist, days=days, hour=9 + Availability.objects.count() % 8)
+            slot.service = service
+            slot.save()
+            book_slot(slot, cls.client_profile, status=Appointment.STATUS_CONFIRMED)
+
+    def setUp(self):
+        cache.clear()
+
+    def add_appointments(self, count):
+        client = make_client('other')
+        for i in range(count):
+            book_slot(make_slot(self.specialist, days=1 + i % 3, hour=i // 3 + 1), client)
+            book_slot(make_slot(self.specialist, days=-1 - i % 3, hour=i // 3 + 1), self.client_profile)
+
+    def assertStableQueries(self, num, url, params=None):
+        with self.assertNumQueries(num):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.add_appointments(6)
+        cache.clear()
+        with self.assertNumQueries(num):
+            self.client.get(url, params)
+
+    def test_client_my_appointments(self):
+        self.client.force_login(self.client_profile.user)
+        # сессия, пользователь, профиль клиента, по COUNT + SELECT на предстоящие и прошедшие,
+        # профиль студии для шапки сайта
+        self.assertStableQueries(8, reverse('booking:client_my_appointments'))
+
+    def test_owner_appointments_list(self):
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        url = reverse('booking:owner_appointments_list', kwargs={'pk': self.specialist.pk})
+        # сессия, пользователь, специалист с витриной и студией, профиль студии для шапки, записи
+        self.assertStableQueries(5, url)
+
+    def test_for_listing_reads_related_rows_in_one_query(self):
+        self.add_appointments(6)
+        with self.assertNumQueries(1):
+            for appointment in Appointment.objects.for_listing():
+                str(appointment.specialist.showcase.workshop)
+                str(appointment.client.user)
+                appointment.availability.date
+                appointment.service and appointment.service.activity_area
+
+
+# строка плана SQLite "SCAN <таблица>" без индекса — полный перебор таблицы
+FULL_SCAN_RE = re.compile(r'^SCAN (?!CONSTANT ROW)\S+$')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+class QueryPlanTests(TestCase):
+    """Горячие запросы бронирования не должны скатываться в полный перебор таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialist = make_specialist()
+        workshop = cls.specialist.showcase.workshop
+        cls.area = ActivityArea.objects.first()
+        cls.service = ServicePrice.objects.create(
+            workshop=workshop, activity_area=cls.area, service_name='Маникюр', price=30,
+        )
+        cls.specialist.services.add(cls.service)
+        cls.client_profile = make_client('client')
+        cls.day = date.today() + timedelta(days=2)
+        for hour in range(9, 18):
+            slot = Availability.objects.create(
+                specialist=cls.specialist, date=cls.day, start_time=time(hour), end_time=time(hour, 45),
+                service=cls.service,
+            )
+            if hour % 2:
+                Appointment.objects.create(client=cls.client_profile, specialist=cls.specialist, availability=slot)
+
+    def setUp(self):
+        cache.clear()
+
+    def capture_plans(self, func):
+        """Выполнить func и вернуть [(sql, [строки плана])] для запросов к таблицам booking."""
+        queries = []
+
+        def wrapper(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            func()
+
+        plans = []
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith('SELECT') or 'booking_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plans.append((sql, [row[3] for row in cursor.fetchall()]))
+        self.assertTrue(plans, 'не перехвачено ни одного запроса к booking')
+        return plans
+
+    def assertNoFullScans(self, func):
+        for sql, plan in self.capture_plans(func):
+            scans = [line for line in plan if FULL_SCAN_RE.match(line)]
+            self.assertFalse(scans, f'Полный перебор таблицы: {scans}\n{sql}\n' + '\n'.join(plan))
+
+    def test_month_occupancy(self):
+        self.assertNoFullScans(lambda: month_occupancy(self.specialist, self.day.year, self.day.month))
+
+    def test_free_slots_of_day(self):
+        self.assertNoFullScans(lambda: list(free_slots(self.specialist, self.day)))
+
+    def test_next_free_slots(self):
+        self.assertNoFullScans(lambda: find_next_free_slots(area=self.area.code))
+        self.assertNoFullScans(lambda: find_next_free_slots(city='Минск'))
+
+    def test_book_slot_checks(self):
+        slot = Availability.objects.filter(appointments__isnull=True).first()
+        self.assertNoFullScans(lambda: book_slot(slot, self.client_profile))
+
+    def test_owner_schedule_page(self):
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        url = reverse('booking:owner_schedule_manage', kwargs={'pk': self.specialist.pk})
+        self.assertNoFullScans(lambda: self.client.get(url, {'month': f'{self.day:%Y-%m}', 'date': self.day.isoformat()}))
+
+    def test_owner_appointments_list(self):
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        url = reverse('booking:owner_appointments_list', kwargs={'pk': self.specialist.pk})
+        self.assertNoFullScans(lambda: self.client.get(url))
+
+    def test_owner_appointments_next_page(self):
+        self.client.force_login(self.specialist.showcase.workshop.user)
+        url = reverse('booking:owner_appointments_list', kwargs={'pk': self.specialist.pk})
+        _, cursor = appointments_page(self.specialist.appointments.all(), limit=2)
+        self.assertNoFullScans(lambda: self.client.get(url, {'status': 'all', 'after': cursor}))
+
+    def test_client_pages(self):
+        self.client.force_login(self.client_profile.user)
+        book_url = reverse('booking:client_book_appointment', kwargs={'pk': self.specialist.pk})
+        self.assertNoFullScans(lambda: self.client.get(book_url, {'date': self.day.isoformat()}))
+        self.assertNoFullScans(lambda: self.client.get(reverse('booking:client_my_appointments')))
@@ -1,6 +1,6 @@
 # booking/urls.py
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'booking'
 
@@ -8,14 +8,35 @@ urlpatterns = [
     # Для владельца (workshop)
     path('specialists/', views.owner_specialists_list, name='owner_specialists_list'),
     path('specialist/<int:pk>/schedule/', views.owner_schedule_manage, name='owner_schedule_manage'),
+    path('specialist/<int:pk>/recurring/', views.owner_recurring_schedules, name='owner_recurring_schedules'),
     path('specialist/<int:pk>/appointments/', views.owner_appointments_list, name='owner_appointments_list'),
+    path('export/appointments.csv', views.owner_export_appointments, name='owner_export_appointments'),
     path('appointment/<int:pk>/confirm/', views.owner_confirm_appointment, name='owner_confirm_appointment'),
     path('appointment/<int:pk>/cancel/', views.owner_cancel_appointment, name='owner_cancel_appointment'),
+    path('appointments/status/', views.owner_bulk_appointment_status, name='owner_bulk_appointment_status'),
 
     # Для клиента
     path('specialist/<int:pk>/book/', views.client_book_appointment, name='client_book_appointment'),
+    # прежний адрес занятости месяца — тот же ответ, что и api_occupancy
+    path('specialist/<int:pk>/occupancy/', api.occupancy, name='specialist_month_occupancy'),
+    path('slot/<int:pk>/hold/', views.hold_slot_view, name='hold_slot'),
+    path('slot/<int:pk>/release/', views.release_slot_view, name='release_slot'),
+    path('specialist/<int:pk>/events/', views.slot_events, name='slot_events'),
     path('my-appointments/', views.client_my_appointments, name='client_my_appointments'),
     path('appointment/<int:pk>/cancel-client/', views.client_cancel_appointment, name='client_cancel_appointment'),
     path('appointment/<int:pk>/delete/', views.owner_delete_appointment, name='owner_delete_appointment'),
+
+    # Календарные ленты по подписанной ссылке
+    path('ics/specialist/<int:pk>/<str:token>.ics', views.specialist_ics_feed, name='specialist_ics_feed'),
+    path('ics/client/<int:pk>/<str:token>.ics', views.client_ics_feed, name='client_ics_feed'),
+
+    # JSON API календарного виджета
+    path('api/specialist/<int:pk>/occupancy/', api.occupancy, name='api_occupancy'),
+    path('api/specialist/<int:pk>/slots/', api.day_slots, name='api_day_slots'),
+    path('api/slot/<int:pk>/book/', api.book, name='api_book'),
+    path('api/appointment/<int:pk>/cancel/', api.cancel, name='api_cancel'),
+
+    # Поиск ближайшего свободного времени
+    path('next-slots/', views.next_free_slots, name='next_free_slots'),
 ]
 
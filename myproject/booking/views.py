@@ -5,16 +5,36 @@ import logging
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.contrib import messages
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.db import IntegrityError, transaction
 
 from .models import Availability, Appointment
-from .forms import AvailabilityFormSet, AppointmentForm
-from accounts.models import WorkshopProfile, ClientProfile, ServicePrice
+from .forms import AvailabilityFormSet, AppointmentForm, RecurringScheduleForm, ServiceChoices, mark_overlapping_slots
+from .events import live_events_enabled, slot_channel, stream_slot_events
+from .export import export_rows, iter_csv
+from .holds import hold_slot, release_slot
+from .ics import check_feed_token, feed_token, feed_version, iter_calendar
+from .schedules import generate_for_specialists
+from .services import (
+    BULK_STATUS_LIMIT, BULK_STATUS_TRANSITIONS, BULK_UPDATED, NEXT_SLOTS_LIMIT, SlotUnavailable,
+    appointments_page, book_slot, bulk_set_status, datetime_range, find_next_free_slots,
+    free_slots, month_bounds, month_occupancy, save_slots,
+)
+from accounts.models import WorkshopProfile, ClientProfile
 from showcase.models import Specialist, Showcase
 
 logger = logging.getLogger(__name__)
 
+APPOINTMENTS_PER_PAGE = 20
+
 # -------------------------
 # Owner (управление расписанием и записями)
 # -------------------------
@@ -65,7 +85,7 @@ import logging
 
 
 from .forms import AvailabilityFormSet, AppointmentForm
-from accounts.models import ClientProfile, ServicePrice, WorkshopProfile
+from accounts.models import ClientProfile, WorkshopProfile
 from showcase.models import Specialist
 
 logger = logging.getLogger(__name__)
@@ -77,19 +97,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.utils.dateparse import parse_date
 from django.contrib import messages
-from django.db.models import Q
 from django.contrib.auth.models import User
 
 from .models import Availability, Appointment
 from .forms import AvailabilityFormSet, AppointmentForm
-from accounts.models import ClientProfile, ServicePrice
+from accounts.models import ClientProfile
 from showcase.models import Specialist
 
 logger = logging.getLogger(__name__)
 
-def times_overlap(start1, end1, start2, end2):
-    return (start1 < end2) and (start2 < end1)
-
 @login_required
 def owner_schedule_manage(request, pk):
     specialist = get_object_or_404(Specialist, pk=pk)
@@ -116,22 +132,31 @@ def owner_schedule_manage(request, pk):
     selected_date = parse_date(date_str) if date_str else None
 
     # границы месяца
-    first_day = date(year, month, 1)
-    last_day = first_day + timedelta(days=calendar.monthrange(year, month)[1] - 1)
-
-    # все Availabilities за месяц
-    avail_month_qs = (
+    first_day, last_day = month_bounds(year, month)
+
+    # редактор слотов — только выбранный день или неделя, а не весь месяц
+    today = date.today()
+    window = request.GET.get("window") or ("day" if selected_date else "week")
+    anchor = selected_date or (today if first_day <= today <= last_day else first_day)
+    if window == "day":
+        window_start = window_end = anchor
+    else:
+        window = "week"
+        window_start = anchor - timedelta(days=anchor.weekday())
+        window_end = window_start + timedelta(days=6)
+    avail_window_qs = (
         Availability.objects
-        .filter(specialist=specialist, date__range=(first_day, last_day))
+        .filter(specialist=specialist, date__range=(window_start, window_end))
         .order_by("date", "start_time")
     )
 
     # все Appointments за месяц (берём select_related для эффективности)
+    month_start, month_end = datetime_range(first_day, last_day)
     appts_month_qs = (
         Appointment.objects
-        .filter(specialist=specialist, availability__date__range=(first_day, last_day))
-        .select_related("client__user", "availability", "service")
-        .order_by("availability__date", "availability__start_time")
+        .filter(specialist=specialist, starts_at__gte=month_start, starts_at__lt=month_end)
+        .for_listing()
+        .order_by("starts_at")
     )
 
     # календарная матрица
@@ -139,43 +164,18 @@ def owner_schedule_manage(request, pk):
     month_days_matrix = list(cal.monthdayscalendar(year, month))
     month_name = calendar.month_name[month]
 
-    # строим словари:
-    # - free_slots_by_day: свободные слоты (availability без pending/confirmed)
-    # - appts_by_day: записи pending/confirmed
-    free_slots_by_day = {}
-    for a in avail_month_qs:
-        if not Appointment.objects.filter(
-            availability=a,
-            status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-        ).exists():
-            free_slots_by_day.setdefault(a.date.day, []).append(a)
-
-    appts_by_day = {}
-    for ap in appts_month_qs:
-        if ap.status in [Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]:
-            d = ap.availability.date.day
-            appts_by_day.setdefault(d, []).append(ap)
-
-    # строим day_counts на основе свободных слотов и записей
-    month_days_count = calendar.monthrange(year, month)[1]
-    day_counts = {
-        d: {
-            "slots": len(free_slots_by_day.get(d, [])),
-            "appts": len(appts_by_day.get(d, []))
-        }
-        for d in range(1, month_days_count + 1)
-    }
+    # свободные слоты и активные записи по дням — одним сгруппированным запросом
+    day_counts = month_occupancy(specialist, year, month)
 
     # Слоты и записи на выбранную дату:
     if selected_date:
         # свободные availabilities (без pending/confirmed)
-        availabilities_day = avail_month_qs.filter(date=selected_date).exclude(
-            appointments__status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-        ).order_by("start_time")
+        availabilities_day = free_slots(specialist, selected_date)
 
         # только активные записи (pending/confirmed)
+        day_start, day_end = datetime_range(selected_date, selected_date)
         appointments_day = appts_month_qs.filter(
-            availability__date=selected_date,
+            starts_at__gte=day_start, starts_at__lt=day_end,
             status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
         )
     else:
@@ -183,6 +183,7 @@ def owner_schedule_manage(request, pk):
         appointments_day = []
 
     # --- далее код обработки POST (назначение клиента, редактирование formset и запись клиента) ---
+    formset = None
     if request.method == "POST":
         # владелец назначает клиента на слот
         if is_owner and request.POST.get("owner_assign_submit"):
@@ -214,23 +215,11 @@ def owner_schedule_manage(request, pk):
                             city=client_city
                         )
 
-                    # проверяем, что слот свободен
                     availability = get_object_or_404(Availability, pk=availability_id, specialist=specialist)
-                    if Appointment.objects.filter(
-                        availability=availability,
-                        status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-                    ).exists():
-                        messages.error(request, "Этот слот уже занят.")
-                    else:
-                        Appointment.objects.create(
-                            client=client,
-                            specialist=specialist,
-                            availability=availability,
-                            service=availability.service,
-                            notes=notes,
-                            status=Appointment.STATUS_CONFIRMED
-                        )
-                        messages.success(request, "Запись добавлена.")
+                    book_slot(availability, client, notes=notes, status=Appointment.STATUS_CONFIRMED)
+                    messages.success(request, "Запись добавлена.")
+                except SlotUnavailable:
+                    messages.error(request, "Этот слот уже занят.")
                 except Exception as e:
                     logger.error(f"Ошибка при назначении клиента: {e}")
                     messages.error(request, "Произошла ошибка при добавлении записи.")
@@ -241,96 +230,31 @@ def owner_schedule_manage(request, pk):
 
         # владелец редактирует formset
         elif is_owner and "formset_submit" in request.POST:
-            formset = AvailabilityFormSet(request.POST, queryset=avail_month_qs)
-            # фильтруем услуги по студии
-            workshop = specialist.showcase.workshop
-            for f in formset.forms:
-                try:
-                    f.fields["service"].queryset = ServicePrice.objects.filter(workshop=workshop)
-                except Exception:
-                    pass
+            formset = AvailabilityFormSet(
+                request.POST, queryset=avail_window_qs,
+                form_kwargs={"service_choices": ServiceChoices(specialist.showcase.workshop)},
+            )
 
             if formset.is_valid():
-                # проверка пересечений
-                deleted_forms = getattr(formset, "deleted_forms", [])
-                deleted_pks = [f.instance.pk for f in deleted_forms if getattr(f.instance, "pk", None)]
-
-                dates_in_forms = set()
-                for f in formset.forms:
-                    cd = getattr(f, "cleaned_data", None)
-                    if not cd or cd.get("DELETE"):
-                        continue
-                    d = cd.get("date")
-                    if d:
-                        dates_in_forms.add(d)
-
-                # существующие интервалы в БД, исключая удалённые
-                db_intervals_by_date = {}
-                if dates_in_forms:
-                    q = Q(specialist=specialist, date__in=list(dates_in_forms))
-                    if deleted_pks:
-                        q &= ~Q(pk__in=deleted_pks)
-                    existing = Availability.objects.filter(q).order_by("date", "start_time")
-                    for a in existing:
-                        db_intervals_by_date.setdefault(a.date, []).append((a.start_time, a.end_time, a.pk))
-
-                new_intervals_by_date = {}
-                has_errors = False
-
-                for idx, form in enumerate(formset.forms):
-                    cd = getattr(form, "cleaned_data", None)
-                    if not cd or cd.get("DELETE"):
-                        continue
-                    d = cd.get("date")
-                    st = cd.get("start_time")
-                    et = cd.get("end_time")
-                    if not d or not st or not et:
-                        form.add_error(None, "Дата, время начала и конца обязательны.")
-                        has_errors = True
-                        continue
-                    if not (st < et):
-                        form.add_error("start_time", "Время начала должно быть раньше времени окончания.")
-                        form.add_error("end_time", "Время окончания должно быть позже времени начала.")
-                        has_errors = True
-                        continue
-
-                    # пересечение с уже существующими слотами в БД
-                    for db_st, db_et, db_pk in db_intervals_by_date.get(d, []):
-                        inst_pk = getattr(form.instance, "pk", None)
-                        if inst_pk and db_pk == inst_pk:
-                            continue
-                        if times_overlap(st, et, db_st, db_et):
-                            form.add_error("start_time", f"Пересекается со слотами {db_st.strftime('%H:%M')}–{db_et.strftime('%H:%M')}.")
-                            form.add_error("end_time", f"Пересекается со слотами {db_st.strftime('%H:%M')}–{db_et.strftime('%H:%M')}.")
-                            has_errors = True
-                            break
-                    if has_errors:
-                        continue
-
-                    # пересечение между формами в formset
-                    li = new_intervals_by_date.setdefault(d, [])
-                    for other_st, other_et, other_idx in li:
-                        if times_overlap(st, et, other_st, other_et):
-                            form.add_error("start_time", "Пересекается с другим слотом в форме.")
-                            form.add_error("end_time", "Пересекается с другим слотом в форме.")
-                            other_form = formset.forms[other_idx]
-                            other_form.add_error("start_time", "Пересекается с другим слотом в форме.")
-                            other_form.add_error("end_time", "Пересекается с другим слотом в форме.")
-                            has_errors = True
-                            break
-                    li.append((st, et, idx))
+                # проверка пересечений: один проход по отсортированным интервалам каждого дня
+                has_errors = mark_overlapping_slots(formset, specialist)
 
                 if has_errors:
                     messages.error(request, "Найдены пересечения. Исправьте, пожалуйста.")
                 else:
-                    instances = formset.save(commit=False)
-                    for instance in instances:
-                        instance.specialist = specialist
-                        instance.save()
-                    for inst in formset.deleted_objects:
-                        inst.delete()
+                    created, updated, deleted = [], [], []
+                    for form in formset.forms:
+                        if form in formset.deleted_forms:
+                            if form.instance.pk:
+                                deleted.append(form.instance)
+                        elif form.has_changed():
+                            if form.instance.pk:
+                                updated.append((form.instance, form.initial["date"]))
+                            else:
+                                created.append(form.instance)
+                    save_slots(specialist, created, updated, deleted)
                     messages.success(request, "Расписание сохранено.")
-                    return redirect(f"{request.path}?month={year:04d}-{month:02d}")
+                    return redirect(request.get_full_path())
 
             else:
                 messages.error(request, "Есть ошибки в формах. Исправьте их.")
@@ -348,34 +272,26 @@ def owner_schedule_manage(request, pk):
                 messages.error(request, "Выберите слот.")
             else:
                 availability = get_object_or_404(Availability, pk=availability_id, specialist=specialist)
-                if Appointment.objects.filter(availability=availability, status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]).exists():
-                    messages.error(request, "Это время уже занято.")
-                else:
-                    form_appt = AppointmentForm(request.POST)
-                    if form_appt.is_valid():
-                        appt = form_appt.save(commit=False)
-                        appt.client = client
-                        appt.specialist = specialist
-                        appt.availability = availability
-                        appt.service = availability.service
-                        appt.save()
+                form_appt = AppointmentForm(request.POST)
+                if form_appt.is_valid():
+                    try:
+                        book_slot(availability, client, notes=form_appt.cleaned_data['notes'])
+                    except SlotUnavailable:
+                        messages.error(request, "Это время уже занято.")
+                    else:
                         messages.success(request, "Вы успешно записаны. Ожидайте подтверждения.")
                         return redirect('booking:client_my_appointments')
-                    else:
-                        messages.error(request, "Ошибка при сохранении записи.")
+                else:
+                    messages.error(request, "Ошибка при сохранении записи.")
             date_param = selected_date.isoformat() if selected_date else ""
             return redirect(f"{request.path}?month={year:04d}-{month:02d}&date={date_param}")
 
-    # формируем formset для владельца
-    formset = None
-    if is_owner:
-        formset = AvailabilityFormSet(queryset=avail_month_qs)
-        workshop = specialist.showcase.workshop
-        for f in formset.forms:
-            try:
-                f.fields["service"].queryset = ServicePrice.objects.filter(workshop=workshop)
-            except Exception:
-                pass
+    # формируем formset для владельца (если POST не прошёл проверку — показываем его с ошибками)
+    if is_owner and formset is None:
+        formset = AvailabilityFormSet(
+            queryset=avail_window_qs,
+            form_kwargs={"service_choices": ServiceChoices(specialist.showcase.workshop)},
+        )
 
     # форма для клиента
     appt_form = None
@@ -386,6 +302,9 @@ def owner_schedule_manage(request, pk):
         "specialist": specialist,
         "is_owner": is_owner,
         "formset": formset,
+        "window": window,
+        "window_start": window_start,
+        "window_end": window_end,
         "month": f"{year:04d}-{month:02d}",
         "month_days_matrix": month_days_matrix,
         "day_counts": day_counts,
@@ -395,7 +314,7 @@ def owner_schedule_manage(request, pk):
         "selected_date": selected_date,
         "availabilities_day": availabilities_day,
         "appointments_day": appointments_day,
-        "availabilities": avail_month_qs,
+        "availabilities": avail_window_qs.select_related("service"),
         "appts_month_qs": appts_month_qs,
         "weekdays": ["Пн","Вт","Ср","Чт","Пт","Сб","Вс"],
         "appt_form": appt_form
@@ -405,27 +324,94 @@ def owner_schedule_manage(request, pk):
 # booking/views.py (только функция owner_appointments_list)
 from django.db.models import Prefetch
 
+OWNER_STATUS_FILTERS = {
+    'active': [Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED],
+    'pending': [Appointment.STATUS_PENDING],
+    'confirmed': [Appointment.STATUS_CONFIRMED],
+    'cancelled': [Appointment.STATUS_CANCELLED],
+    'all': None,
+}
+
+
+def _date_param(request, name):
+    """Дата из ?name=YYYY-MM-DD или None, если параметра нет; ValueError — если это не дата (и 2026-02-30)."""
+    value = request.GET.get(name, '')
+    if not value:
+        return None
+    day = parse_date(value)   # сама бросает ValueError на несуществующую дату
+    if day is None:
+        raise ValueError(f'Неверная дата: {value}')
+    return day
+
+
+def _owner_period(request):
+    """
+    (period, date_from, date_to) из ?period=today|week или ?from=&to=;
+    по умолчанию (и при неверной дате) — с сегодняшнего дня.
+    """
+    today = timezone.localdate()
+    period = request.GET.get('period', '')
+    if period == 'today':
+        return period, today, today
+    if period == 'week':
+        monday = today - timedelta(days=today.weekday())
+        return period, monday, monday + timedelta(days=6)
+    try:
+        date_from, date_to = _date_param(request, 'from'), _date_param(request, 'to')
+    except ValueError:
+        date_from = date_to = None
+    if not date_from and not date_to:
+        date_from = today
+    return '', date_from, date_to
+
+
 @login_required
 def owner_appointments_list(request, pk):
     """
-    Показывает записи для специалиста (владелец).
-    Используем select_related/prefetch, чтобы уменьшить число запросов.
+    Показывает записи для специалиста (владелец): окно дат, фильтр по
+    статусу и keyset-пагинация, так что страница не зависит от длины истории.
     """
-    specialist = get_object_or_404(Specialist, pk=pk)
-    if specialist.showcase.workshop.user != request.user:
+    specialist = get_object_or_404(Specialist.objects.select_related('showcase__workshop'), pk=pk)
+    if specialist.showcase.workshop.user_id != request.user.pk:
         messages.error(request, "Нет доступа.")
         return redirect('booking:owner_specialists_list')
 
+    status = request.GET.get('status', 'active')
+    if status not in OWNER_STATUS_FILTERS:
+        status = 'active'
+    period, date_from, date_to = _owner_period(request)
+
     # Подгружаем availability и client (ClientProfile) сразу, чтобы в шаблоне не делать N дополнительных запросов
-    appointments = (
-        specialist.appointments
-        .select_related('availability', 'service', 'client__user')  # client__user позволяет читать client.user.get_full_name
-        .order_by('availability__date', 'availability__start_time')
-    )
+    appointments = specialist.appointments.for_listing()
+    if OWNER_STATUS_FILTERS[status]:
+        appointments = appointments.filter(status__in=OWNER_STATUS_FILTERS[status])
+    if date_from:
+        appointments = appointments.filter(starts_at__gte=datetime_range(date_from, date_from)[0])
+    if date_to:
+        appointments = appointments.filter(starts_at__lt=datetime_range(date_to, date_to)[1])
+    appointments, next_cursor = appointments_page(appointments, request.GET.get('after'))
+
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_query = params.urlencode()
+    first_query = request.GET.copy()
+    first_query.pop('after', None)
 
     return render(request, 'booking/owner_appointments_list.html', {
         'specialist': specialist,
         'appointments': appointments,
+        'status': status,
+        'period': period,
+        'date_from': date_from,
+        'date_to': date_to,
+        'next_query': next_query,
+        'is_continued': 'after' in request.GET,
+        'first_query': first_query.urlencode(),
+        'ics_url': request.build_absolute_uri(reverse('booking:specialist_ics_feed', kwargs={
+            'pk': specialist.pk, 'token': feed_token('specialist', specialist.pk),
+        })),
     })
 
 
@@ -435,9 +421,19 @@ def owner_confirm_appointment(request, pk):
     if appointment.specialist.showcase.workshop.user != request.user:
         messages.error(request, "Нет доступа.")
         return redirect('accounts:profile')
-    appointment.status = 'confirmed'
-    appointment.save()
-    messages.success(request, "Запись подтверждена.")
+    # подтвердить можно только ожидающую запись (как в BULK_STATUS_TRANSITIONS):
+    # слот отменённой записи мог уже занять другой клиент
+    if appointment.status != Appointment.STATUS_PENDING:
+        messages.error(request, "Подтвердить можно только запись, ожидающую подтверждения.")
+        return redirect('booking:owner_appointments_list', pk=appointment.specialist.pk)
+    appointment.status = Appointment.STATUS_CONFIRMED
+    try:
+        with transaction.atomic():
+            appointment.save()
+    except IntegrityError:
+        messages.error(request, "Это время уже занято другой записью.")
+    else:
+        messages.success(request, "Запись подтверждена.")
     return redirect('booking:owner_appointments_list', pk=appointment.specialist.pk)
 
 
@@ -452,6 +448,30 @@ def owner_cancel_appointment(request, pk):
     messages.success(request, "Запись отменена.")
     return redirect('booking:owner_appointments_list', pk=appointment.specialist.pk)
 
+@login_required
+@require_POST
+def owner_bulk_appointment_status(request):
+    """
+    JSON: сменить статус нескольких записей студии, POST status=confirmed|cancelled&ids=1&ids=2...
+    Ответ — {"status", "updated", "results": {id: updated|unchanged|not_allowed|not_found}}.
+    """
+    status = request.POST.get('status')
+    if status not in BULK_STATUS_TRANSITIONS:
+        return JsonResponse({'error': 'Неизвестный статус.'}, status=400)
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in request.POST.getlist('ids')))
+    except ValueError:
+        return JsonResponse({'error': 'Неверный id записи.'}, status=400)
+    if not ids or len(ids) > BULK_STATUS_LIMIT:
+        return JsonResponse({'error': f'Выберите от 1 до {BULK_STATUS_LIMIT} записей.'}, status=400)
+
+    results = bulk_set_status(request.user, ids, status)
+    return JsonResponse({
+        'status': status,
+        'updated': sum(result == BULK_UPDATED for result in results.values()),
+        'results': {str(pk): result for pk, result in results.items()},
+    })
+
 # booking/views.py
 from django.contrib.auth.models import User
 from django.contrib import messages
@@ -469,6 +489,48 @@ def owner_delete_appointment(request, pk):
     messages.success(request, "Запись удалена.")
     return redirect('booking:owner_appointments_list', pk=appointment.specialist.pk)
 
+@login_required
+def owner_recurring_schedules(request, pk):
+    """Шаблоны недельного расписания специалиста и генерация слотов по ним."""
+    specialist = get_object_or_404(Specialist.objects.select_related('showcase__workshop'), pk=pk)
+    workshop = specialist.showcase.workshop
+    if workshop.user != request.user:
+        messages.error(request, "Нет доступа.")
+        return redirect('booking:owner_specialists_list')
+
+    form = RecurringScheduleForm(workshop=workshop)
+    if request.method == 'POST':
+        if 'add_schedule' in request.POST:
+            form = RecurringScheduleForm(request.POST, workshop=workshop)
+            if form.is_valid():
+                schedule = form.save(commit=False)
+                schedule.specialist = specialist
+                schedule.save()
+                messages.success(request, "Шаблон добавлен.")
+                return redirect('booking:owner_recurring_schedules', pk=specialist.pk)
+        elif 'delete_schedule' in request.POST:
+            specialist.recurring_schedules.filter(pk=request.POST.get('schedule_id')).delete()
+            messages.success(request, "Шаблон удалён.")
+            return redirect('booking:owner_recurring_schedules', pk=specialist.pk)
+        elif 'generate_slots' in request.POST:
+            try:
+                weeks = max(1, min(int(request.POST.get('weeks', 4)), 26))
+            except ValueError:
+                weeks = 4
+            result = generate_for_specialists([specialist.pk], weeks=weeks)
+            messages.success(
+                request,
+                f"Создано слотов: {result.created}. Пропущено из-за пересечений: {result.skipped}."
+            )
+            return redirect('booking:owner_schedule_manage', pk=specialist.pk)
+
+    return render(request, 'booking/owner_recurring_schedules.html', {
+        'specialist': specialist,
+        'schedules': specialist.recurring_schedules.select_related('service'),
+        'form': form,
+    })
+
+
 # -------------------------
 # Client (календарь + запись + список своих записей)
 # -------------------------
@@ -522,31 +584,11 @@ def client_book_appointment(request, pk):
     month_days_matrix = list(cal.monthdayscalendar(year_m, month_m))
     month_name = MONTHS_RU[month_m] if 1 <= month_m <= 12 else calendar.month_name[month_m]
 
-    # Свободные слоты за месяц (исключаем слоты с pending/confirmed записями)
-    avail_month_qs = Availability.objects.filter(
-        specialist=specialist,
-        date__year=year_m,
-        date__month=month_m
-    ).exclude(
-        appointments__status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-    ).order_by('date', 'start_time')
-
-    # Подсчёт свободных слотов по дням
-    slots_by_day = {}
-    for a in avail_month_qs:
-        d = a.date.day
-        slots_by_day.setdefault(d, []).append(a)
-
-    month_days_count = calendar.monthrange(year_m, month_m)[1]
-    day_counts = {day: len(slots_by_day.get(day, [])) for day in range(1, month_days_count + 1)}
-
-    # Свободные слоты на выбранную дату
-    availabilities = Availability.objects.filter(
-        specialist=specialist,
-        date=selected_date
-    ).exclude(
-        appointments__status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-    ).order_by('start_time')
+    # Занятость по дням месяца (свободные слоты, записи, первое свободное время)
+    day_counts = month_occupancy(specialist, year_m, month_m)
+
+    # Свободные слоты на выбранную дату (свои удержания клиент видит)
+    availabilities = free_slots(specialist, selected_date, client=client)
 
     # Обработка записи (POST)
     error = None
@@ -557,25 +599,18 @@ def client_book_appointment(request, pk):
             return redirect(f'{request.path}?month={year_m}-{month_m:02d}&date={selected_date.isoformat()}')
 
         availability = get_object_or_404(Availability, pk=availability_id, specialist=specialist)
-        # Повторно проверяем, что слот ещё свободен
-        if Appointment.objects.filter(
-            availability=availability,
-            status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-        ).exists():
-            error = "Это время уже занято."
-        else:
-            form = AppointmentForm(request.POST)
-            if form.is_valid():
-                appt = form.save(commit=False)
-                appt.client = client
-                appt.specialist = specialist
-                appt.availability = availability
-                appt.service = availability.service
-                appt.save()
+        form = AppointmentForm(request.POST)
+        if form.is_valid():
+            # занятость проверяется внутри транзакции book_slot
+            try:
+                book_slot(availability, client, notes=form.cleaned_data['notes'])
+            except SlotUnavailable as exc:
+                error = str(exc)
+            else:
                 messages.success(request, "Вы успешно записаны. Ожидайте подтверждения.")
                 return redirect('booking:client_my_appointments')
-            else:
-                error = "Ошибка при заполнении формы записи."
+        else:
+            error = "Ошибка при заполнении формы записи."
     else:
         form = AppointmentForm()
 
@@ -591,7 +626,8 @@ def client_book_appointment(request, pk):
         'form': form,
         'today': date.today().isoformat(),
         'weekdays': ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"],
-        'error': error
+        'error': error,
+        'live_events': live_events_enabled(),
     }
     return render(request, 'booking/client_book_appointment.html', context)
 
@@ -604,10 +640,18 @@ def client_my_appointments(request):
         messages.error(request, "Клиентский профиль не найден.")
         return redirect('accounts:profile')
 
-    appointments = client.appointments.all().order_by('availability__date', 'availability__start_time')
+    # предстоящие (ближайшие сверху) и прошедшие (последние сверху) листаются отдельно
+    now = timezone.now()
+    appointments = client.appointments.for_listing()
+    upcoming_page = Paginator(appointments.upcoming(now), APPOINTMENTS_PER_PAGE).get_page(request.GET.get('upcoming'))
+    past_page = Paginator(appointments.past(now), APPOINTMENTS_PER_PAGE).get_page(request.GET.get('past'))
     return render(request, 'booking/client_my_appointments.html', {
-        'appointments': appointments,
-        'today': date.today().isoformat(),
+        'upcoming_page': upcoming_page,
+        'past_page': past_page,
+        'ics_url': request.build_absolute_uri(reverse('booking:client_ics_feed', kwargs={
+            'pk': client.pk, 'token': feed_token('client', client.pk),
+        })),
+        'today': date.today(),
     })
 
 
@@ -629,3 +673,163 @@ def client_cancel_appointment(request, pk):
     else:
         messages.error(request, "Нельзя отменить прошедшую запись.")
     return redirect('booking:client_my_appointments')
+
+
+@login_required
+@require_POST
+def hold_slot_view(request, pk):
+    """JSON: удержать слот за клиентом, пока он заполняет форму записи."""
+    availability = get_object_or_404(Availability, pk=pk)
+    try:
+        client = request.user.clientprofile
+    except ClientProfile.DoesNotExist:
+        return JsonResponse({'error': 'Клиентский профиль не найден.'}, status=403)
+    try:
+        expires_at = hold_slot(availability, client)
+    except SlotUnavailable as exc:
+        return JsonResponse({'held': False, 'error': str(exc)}, status=409)
+    return JsonResponse({'held': True, 'slot': availability.pk, 'expires_at': expires_at.isoformat()})
+
+
+@login_required
+@require_POST
+def release_slot_view(request, pk):
+    """JSON: снять своё удержание слота."""
+    availability = get_object_or_404(Availability, pk=pk)
+    try:
+        client = request.user.clientprofile
+    except ClientProfile.DoesNotExist:
+        return JsonResponse({'error': 'Клиентский профиль не найден.'}, status=403)
+    return JsonResponse({'released': release_slot(availability, client), 'slot': availability.pk})
+
+
+@login_required
+async def slot_events(request, pk):
+    """
+    SSE: события "слот занят"/"слот освободился" специалиста на ?date=YYYY-MM-DD.
+    Асинхронный view — соединение держит только ASGI-сервер (myproject/asgi.py);
+    без BOOKING_LIVE_EVENTS (запуск под WSGI) — 204, и браузер не переподключается.
+    """
+    if not live_events_enabled():
+        return HttpResponse(status=204)
+    try:
+        day = _date_param(request, 'date') or timezone.localdate()
+    except ValueError:
+        return HttpResponse('Неверная дата.', status=400, content_type='text/plain; charset=utf-8')
+    if not await Specialist.objects.filter(pk=pk).aexists():
+        raise Http404
+    response = StreamingHttpResponse(stream_slot_events(slot_channel(pk, day)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'   # nginx не должен буферизовать поток
+    return response
+
+
+@login_required
+def owner_export_appointments(request):
+    """CSV со всеми записями специалистов студии, ?from=&to=YYYY-MM-DD&specialist=<id>."""
+    try:
+        workshop = request.user.workshopprofile
+    except WorkshopProfile.DoesNotExist:
+        messages.error(request, "Профиль студии не найден.")
+        return redirect('accounts:profile')
+
+    try:
+        date_from, date_to = _date_param(request, 'from'), _date_param(request, 'to')
+    except ValueError:   # как в _owner_period: неверная дата — период по умолчанию (вся история)
+        date_from = date_to = None
+    try:
+        specialist_id = int(request.GET.get('specialist', '') or 0) or None
+    except ValueError:
+        specialist_id = None
+
+    response = StreamingHttpResponse(
+        iter_csv(export_rows(workshop, date_from, date_to, specialist_id)),
+        content_type='text/csv; charset=utf-8',
+    )
+    period = '_'.join(d.isoformat() for d in (date_from, date_to) if d) or 'all'
+    response['Content-Disposition'] = f'attachment; filename="appointments_{period}.csv"'
+    return response
+
+
+# -------------------------
+# Календарные ленты (.ics)
+# -------------------------
+def _ics_response(request, appointments, get_name, for_client=False):
+    """
+    Неизменившаяся лента — один агрегатный запрос и 304; иначе события
+    отдаются потоком. get_name вызывается только для полного ответа.
+    """
+    count, last_modified = feed_version(appointments)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    etag = f'"{count}-{last_modified.timestamp() if last_modified else 0}"'
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+
+    response = StreamingHttpResponse(
+        iter_calendar(get_name(), appointments, for_client=for_client),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def specialist_ics_feed(request, pk, token):
+    """Лента записей специалиста для календаря владельца."""
+    if not check_feed_token('specialist', pk, token):
+        raise Http404
+    return _ics_response(
+        request,
+        Appointment.objects.filter(specialist_id=pk),
+        lambda: f"Записи — {get_object_or_404(Specialist, pk=pk)}",
+    )
+
+
+def client_ics_feed(request, pk, token):
+    """Лента записей клиента."""
+    if not check_feed_token('client', pk, token):
+        raise Http404
+    return _ics_response(request, Appointment.objects.filter(client_id=pk), lambda: 'Мои записи', for_client=True)
+
+
+# -------------------------
+# Поиск ближайшего свободного времени
+# -------------------------
+def next_free_slots(request):
+    """
+    JSON: ближайшие свободные слоты по всем специалистам.
+    ?service=маникюр&area=<код ActivityArea>&city=Минск&limit=10
+    """
+    try:
+        limit = int(request.GET.get('limit', NEXT_SLOTS_LIMIT))
+    except ValueError:
+        limit = NEXT_SLOTS_LIMIT
+    slots = find_next_free_slots(
+        service=request.GET.get('service', '').strip(),
+        area=request.GET.get('area', '').strip(),
+        city=request.GET.get('city', '').strip(),
+        limit=limit,
+    )
+
+    results = []
+    for slot in slots:
+        specialist = slot.specialist
+        workshop = specialist.showcase.workshop
+        book_url = reverse('booking:client_book_appointment', kwargs={'pk': specialist.pk})
+        results.append({
+            'availability_id': slot.pk,
+            'date': slot.date.isoformat(),
+            'start_time': slot.start_time.strftime('%H:%M'),
+            'end_time': slot.end_time.strftime('%H:%M'),
+            'specialist': {'id': specialist.pk, 'name': str(specialist), 'position': specialist.position},
+            'workshop': workshop.workshop_name,
+            'city': workshop.city,
+            'service': slot.service.service_name if slot.service else None,
+            'price': str(slot.service.price) if slot.service else None,
+            'book_url': f"{book_url}?month={slot.date:%Y-%m}&date={slot.date.isoformat()}",
+        })
+    return JsonResponse({'results': results})
+
@@ -84,6 +84,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'myproject.wsgi.application'
 
+# Живые обновления слотов (SSE) держат соединение открытым — включать только
+# при запуске под ASGI (myproject/asgi.py), например BOOKING_LIVE_EVENTS=1 uvicorn myproject.asgi:application
+BOOKING_LIVE_EVENTS = os.environ.get('BOOKING_LIVE_EVENTS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
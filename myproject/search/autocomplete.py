@@ -0,0 +1,252 @@
+# search/autocomplete.py
+"""
+Подсказки для строки поиска: in-memory триграммный индекс по названиям
+студий (WorkshopProfile.workshop_name), услугам из static/services.json
+("works") и ServicePrice.service_name.
+
+Индекс строится лениво при первом запросе и дальше обновляется
+точечно: сигналы accounts/signals.py вызывают workshop_changed /
+service_changed / service_deleted, а services.json перечитывается,
+если у файла изменился mtime. Индекс живёт в памяти процесса.
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from django.contrib.staticfiles import finders
+
+from accounts.models import ServicePrice, WorkshopProfile
+
+KIND_WORKSHOP = 'workshop'
+KIND_SERVICE = 'service'
+
+MIN_QUERY_LENGTH = 2
+MIN_COVERAGE = 0.4
+# сколько элементов posting-листов просматриваем на этапе отбора кандидатов
+CANDIDATE_BUDGET = 4000
+RESCORE_LIMIT = 200
+WORKS_CHECK_INTERVAL = 30  # секунд между проверками mtime services.json
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def trigrams(text, prefix=False):
+    """
+    Триграммы слов с отступом в начале ("  м", " ма", "ман", ...).
+    Для строки запроса (prefix=True) хвост слова не дополняется —
+    пользователь ещё печатает.
+    """
+    grams = set()
+    for word in normalize(text).split(' '):
+        if not word:
+            continue
+        padded = '  ' + word + ('' if prefix else ' ')
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class _Entry:
+    __slots__ = ('kind', 'label', 'payload', 'grams', 'sources')
+
+    def __init__(self, kind, label, payload, grams):
+        self.kind = kind
+        self.label = label
+        self.payload = payload
+        self.grams = grams
+        self.sources = set()
+
+
+class TrigramIndex:
+    """
+    entry_id -> _Entry и trigram -> set(entry_id).
+    Одинаковые названия услуг из разных студий и services.json
+    схлопываются в одну подсказку (счётчик источников в entry.sources).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._postings = {}
+        self._by_label = {}    # (kind, normalized label) -> entry_id
+        self._by_source = {}   # source key -> entry_id
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, source, kind, label, payload=None):
+        """Добавить/обновить подсказку из источника source (например ('service', pk))."""
+        norm = normalize(label)
+        if not norm:
+            self.remove(source)
+            return
+        with self._lock:
+            # у студий одинаковые названия не схлопываем — это разные ссылки
+            label_key = (kind, source) if kind == KIND_WORKSHOP else (kind, norm)
+            current = self._by_source.get(source)
+            # у студии label_key от названия не зависит — переименование сверяем по самому названию
+            if (current is not None and self._by_label.get(label_key) == current
+                    and normalize(self._entries[current].label) == norm):
+                self._entries[current].payload = payload
+                return
+            self.remove(source)
+
+            entry_id = self._by_label.get(label_key)
+            if entry_id is None:
+                entry_id = self._next_id
+                self._next_id += 1
+                entry = _Entry(kind, label.strip(), payload, frozenset(trigrams(norm)))
+                self._entries[entry_id] = entry
+                self._by_label[label_key] = entry_id
+                for gram in entry.grams:
+                    self._postings.setdefault(gram, set()).add(entry_id)
+            self._entries[entry_id].sources.add(source)
+            self._by_source[source] = entry_id
+
+    def remove(self, source):
+        with self._lock:
+            entry_id = self._by_source.pop(source, None)
+            if entry_id is None:
+                return
+            entry = self._entries[entry_id]
+            entry.sources.discard(source)
+            if entry.sources:
+                return
+            del self._entries[entry_id]
+            label_key = (entry.kind, source) if entry.kind == KIND_WORKSHOP else (entry.kind, normalize(entry.label))
+            self._by_label.pop(label_key, None)
+            for gram in entry.grams:
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(entry_id)
+                    if not posting:
+                        del self._postings[gram]
+
+    def search(self, query, limit=10):
+        """
+        [(entry, score)] по убыванию score = доля триграмм запроса,
+        найденных в подсказке (опечатка портит 2–3 триграммы из многих).
+        Кандидаты набираются из самых редких триграмм запроса в пределах
+        CANDIDATE_BUDGET; если часть частых триграмм пропущена, лучшие
+        RESCORE_LIMIT кандидатов пересчитываются точно по их триграммам.
+        """
+        qgrams = trigrams(query, prefix=True)
+        if not qgrams:
+            return []
+        with self._lock:
+            postings = sorted(
+                (p for p in (self._postings.get(g) for g in qgrams) if p),
+                key=len,
+            )
+            counts = Counter()
+            budget = CANDIDATE_BUDGET
+            exact = True
+            for posting in postings:
+                if counts and len(posting) > budget:
+                    exact = False
+                    break
+                counts.update(posting)
+                budget -= len(posting)
+
+            n = len(qgrams)
+            min_count = MIN_COVERAGE * n
+            if exact:
+                candidates = [(c, entry_id) for entry_id, c in counts.items() if c >= min_count]
+            else:
+                candidates = [
+                    (len(qgrams & self._entries[entry_id].grams), entry_id)
+                    for entry_id, _ in counts.most_common(RESCORE_LIMIT)
+                ]
+            # при равном покрытии короче — точнее
+            best = heapq.nlargest(
+                limit,
+                ((c, -len(self._entries[entry_id].label), entry_id) for c, entry_id in candidates if c >= min_count),
+            )
+            return [(self._entries[entry_id], c / n) for c, _, entry_id in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+_works_state = {'mtime': None, 'checked_at': 0.0}
+
+
+def _load_works(index):
+    """(Пере)загрузить подсказки из services.json, если файл изменился."""
+    path = finders.find('services.json')
+    if not path:
+        return
+    mtime = os.path.getmtime(path)
+    if mtime == _works_state['mtime']:
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        services_data = json.load(f)
+    fresh = {
+        ('work', normalize(work)): work
+        for item in services_data
+        for work in item.get('works', [])
+    }
+    stale = [s for s in list(index._by_source) if s[0] == 'work' and s not in fresh]
+    for source in stale:
+        index.remove(source)
+    for source, work in fresh.items():
+        index.add(source, KIND_SERVICE, work)
+    _works_state['mtime'] = mtime
+
+
+def build_index():
+    index = TrigramIndex()
+    for pk, name, username in WorkshopProfile.objects.values_list('pk', 'workshop_name', 'user__username').iterator():
+        index.add(('workshop', pk), KIND_WORKSHOP, name, payload=username)
+    for pk, name in ServicePrice.objects.values_list('pk', 'service_name').iterator():
+        index.add(('service', pk), KIND_SERVICE, name)
+    _load_works(index)
+    _works_state['checked_at'] = time.monotonic()
+    return index
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_index()
+    now = time.monotonic()
+    if now - _works_state['checked_at'] > WORKS_CHECK_INTERVAL:
+        _works_state['checked_at'] = now
+        _load_works(_index)
+    return _index
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
+        _works_state['mtime'] = None
+
+
+# --- точечное обновление из сигналов: пока индекс не построен, делать нечего ---
+
+def workshop_changed(workshop):
+    if _index is not None:
+        _index.add(('workshop', workshop.pk), KIND_WORKSHOP, workshop.workshop_name, payload=workshop.user.username)
+
+
+def workshop_deleted(workshop_id):
+    if _index is not None:
+        _index.remove(('workshop', workshop_id))
+
+
+def service_changed(service_price):
+    if _index is not None:
+        _index.add(('service', service_price.pk), KIND_SERVICE, service_price.service_name)
+
+
+def service_deleted(service_price_id):
+    if _index is not None:
+        _index.remove(('service', service_price_id))
@@ -0,0 +1,115 @@
+# search/documents.py
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from accounts.models import ServicePrice, WorkshopProfile
+from showcase.models import Showcase, Specialist
+from . import facets, fulltext
+from .models import WorkshopSearchDocument
+from .services import normalize_city
+
+
+def _join_codes(values):
+    values = sorted(set(v for v in values if v))
+    return f",{','.join(values)}," if values else ''
+
+
+def _document_fields(workshop, areas, prices, specialists_count):
+    try:
+        showcase = workshop.showcase
+        banner = showcase.cover_photo.name if showcase.cover_photo else ''
+    except Showcase.DoesNotExist:
+        banner = ''
+    return {
+        'username': workshop.user.username,
+        'name': workshop.workshop_name,
+        'name_key': workshop.workshop_name.casefold(),
+        'city': ' '.join(workshop.city.split()),
+        'city_key': normalize_city(workshop.city),
+        'activity_codes': _join_codes(a.code for a in areas),
+        'categories': _join_codes(a.category for a in areas),
+        'activity_labels': ', '.join(a.name for a in areas),
+        'banner': banner,
+        'min_price': prices.get('min_price'),
+        'max_price': prices.get('max_price'),
+        'specialists_count': specialists_count or 0,
+    }
+
+
+def is_workshop_cascade(origin):
+    """
+    post_delete пришёл из каскадного удаления самой студии (или её пользователя):
+    документ удалится вместе со студией, пересчитывать его нельзя.
+    """
+    model = getattr(origin, 'model', None) or type(origin)
+    return issubclass(model, (WorkshopProfile, User))
+
+
+def refresh_workshop_document(workshop_id):
+    """Пересчитать документ одной студии (вызывается из сигналов)."""
+    workshop = (
+        WorkshopProfile.objects
+        .select_related('user', 'showcase')
+        .filter(pk=workshop_id)
+        .first()
+    )
+    if workshop is None:
+        WorkshopSearchDocument.objects.filter(workshop_id=workshop_id).delete()
+        fulltext.remove_workshop(workshop_id)
+        facets.invalidate()
+        return None
+
+    areas = list(workshop.activity_area.order_by('name'))
+    prices = ServicePrice.objects.filter(workshop=workshop).aggregate(
+        min_price=Min('price'), max_price=Max('price')
+    )
+    specialists_count = Specialist.objects.filter(showcase__workshop=workshop, is_active=True).count()
+
+    document, _ = WorkshopSearchDocument.objects.update_or_create(
+        workshop=workshop,
+        defaults=_document_fields(workshop, areas, prices, specialists_count),
+    )
+    fulltext.index_workshop(workshop.pk)
+    facets.invalidate()
+    return document
+
+
+def rebuild_all_documents(batch_size=500):
+    """Полная пересборка документов и полнотекстового индекса."""
+    prices = {
+        row['workshop']: row
+        for row in ServicePrice.objects.values('workshop').annotate(
+            min_price=Min('price'), max_price=Max('price')
+        )
+    }
+    specialists = dict(
+        Specialist.objects.filter(is_active=True)
+        .values_list('showcase__workshop')
+        .annotate(n=Count('pk'))
+    )
+    workshops = (
+        WorkshopProfile.objects
+        .select_related('user', 'showcase')
+        .prefetch_related('activity_area')
+        .order_by('pk')
+    )
+
+    total = 0
+    with transaction.atomic():
+        WorkshopSearchDocument.objects.all().delete()
+        batch = []
+        for workshop in workshops.iterator(chunk_size=batch_size):
+            areas = sorted(workshop.activity_area.all(), key=lambda a: a.name)
+            fields = _document_fields(workshop, areas, prices.get(workshop.pk, {}), specialists.get(workshop.pk))
+            batch.append(WorkshopSearchDocument(workshop=workshop, **fields))
+            if len(batch) >= batch_size:
+                WorkshopSearchDocument.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            WorkshopSearchDocument.objects.bulk_create(batch)
+            total += len(batch)
+        fulltext.rebuild_index(batch_size=batch_size)
+    facets.invalidate()
+    return total
@@ -0,0 +1,90 @@
+# search/facets.py
+"""
+Фасеты для страницы поиска: сколько студий в каждой категории, городе
+и ценовом диапазоне при текущих фильтрах.
+
+Каждый фасет считается одним GROUP BY / условным агрегатом по
+WorkshopSearchDocument с учётом всех фильтров, кроме своего
+(иначе выбранная категория "обнулила" бы соседние). Результат
+кэшируется по комбинации фильтров; версия кэша увеличивается
+при каждом изменении поисковых документов.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Min
+
+from accounts.models import ActivityArea, WorkshopProfile
+from .services import PRICE_BUCKETS, filtered_documents, price_bucket_q
+
+CACHE_TIMEOUT = 300
+VERSION_KEY = 'search:facets:version'
+MAX_CITIES = 20
+
+
+def _category_counts(filters):
+    labels = dict(ActivityArea.CATEGORY_CHOICES)
+    workshops = filtered_documents(filters, exclude='category').values('workshop_id')
+    rows = (
+        WorkshopProfile.activity_area.through.objects
+        .filter(workshopprofile_id__in=workshops)
+        .values('activityarea__category')
+        .annotate(n=Count('workshopprofile_id', distinct=True))
+    )
+    counts = {row['activityarea__category']: row['n'] for row in rows}
+    return [
+        {'value': code, 'label': labels[code], 'count': counts[code]}
+        for code, _ in ActivityArea.CATEGORY_CHOICES
+        if counts.get(code)
+    ]
+
+
+def _city_counts(filters):
+    rows = (
+        filtered_documents(filters, exclude='city')
+        .exclude(city_key='')
+        .values('city_key')
+        .annotate(n=Count('workshop_id'), label=Min('city'))
+        .order_by('-n', 'city_key')[:MAX_CITIES]
+    )
+    return [{'value': row['label'], 'label': row['label'], 'count': row['n']} for row in rows]
+
+
+def _price_counts(filters):
+    aggregates = {
+        f'bucket_{i}': Count('workshop_id', filter=price_bucket_q(key))
+        for i, (key, _, _, _) in enumerate(PRICE_BUCKETS)
+    }
+    totals = filtered_documents(filters, exclude='price').aggregate(**aggregates)
+    return [
+        {'value': key, 'label': label, 'count': totals[f'bucket_{i}']}
+        for i, (key, label, _, _) in enumerate(PRICE_BUCKETS)
+    ]
+
+
+def _cache_key(filters):
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    digest = hashlib.md5(json.dumps(filters.as_query(), sort_keys=True).encode('utf-8')).hexdigest()
+    return f'search:facets:{version}:{digest}'
+
+
+def compute_facets(filters):
+    key = _cache_key(filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = {
+            'categories': _category_counts(filters),
+            'cities': _city_counts(filters),
+            'prices': _price_counts(filters),
+        }
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate():
+    """Сбросить все закэшированные фасеты (новая версия ключей)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
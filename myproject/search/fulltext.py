@@ -0,0 +1,157 @@
+# search/fulltext.py
+"""
+Полнотекстовый индекс студий на SQLite FTS5.
+
+Одна строка виртуальной таблицы на студию (rowid = workshop_id):
+название, описание, услуги (ServicePrice.service_name) и специалисты
+(Specialist.position/bio). Обновляется из refresh_workshop_document,
+то есть теми же сигналами, что и WorkshopSearchDocument.
+На других СУБД функции индекса ничего не делают.
+"""
+import re
+
+from django.db import connection
+
+from accounts.models import ServicePrice, WorkshopProfile
+from showcase.models import Specialist
+
+FTS_TABLE = 'search_workshop_fts'
+
+# Таблица создаётся миграцией 0002_workshop_fts:
+#   fts5(name, description, services, specialists,
+#        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')
+# unicode61 приводит кириллицу к нижнему регистру, "ё" сводим к "е" сами;
+# prefix='2 3' — отдельные индексы префиксов для быстрых запросов вида "ман*".
+
+# веса колонок для bm25: name, description, services, specialists
+BM25_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+MAX_TERMS = 8
+
+# окончания, которые отрезаем у слов запроса перед префиксным поиском:
+# "маникюра" -> "маникюр*", "стрижки" -> "стрижк*"
+_RU_ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем',
+    'ы', 'и', 'а', 'я', 'о', 'е', 'у', 'ю', 'ь',
+], key=len, reverse=True)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def normalize(text):
+    return (text or '').lower().replace('ё', 'е')
+
+
+def _stem(word):
+    if len(word) < 5:
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[:-len(ending)]
+    return word
+
+
+def build_match_query(query):
+    """
+    Строка пользователя -> выражение FTS5: каждое слово в кавычках
+    (спецсимволы FTS не проходят) с префиксным поиском, слова через AND.
+    Пустая строка, если искать нечего.
+    """
+    words = _WORD_RE.findall(normalize(query))[:MAX_TERMS]
+    return ' '.join(f'"{_stem(word)}"*' for word in words)
+
+
+def _workshop_texts(workshop_ids):
+    """{workshop_id: (name, description, services, specialists)} тремя запросами."""
+    texts = {
+        pk: [name, description, [], []]
+        for pk, name, description in WorkshopProfile.objects
+        .filter(pk__in=workshop_ids)
+        .values_list('pk', 'workshop_name', 'description')
+    }
+    for workshop_id, service_name in (
+        ServicePrice.objects.filter(workshop_id__in=workshop_ids).values_list('workshop_id', 'service_name')
+    ):
+        texts[workshop_id][2].append(service_name)
+    for workshop_id, position, bio in (
+        Specialist.objects.filter(showcase__workshop_id__in=workshop_ids, is_active=True)
+        .values_list('showcase__workshop_id', 'position', 'bio')
+    ):
+        texts[workshop_id][3].extend([position, bio])
+    return {
+        pk: (normalize(name), normalize(description), normalize(' '.join(services)), normalize(' '.join(specs)))
+        for pk, (name, description, services, specs) in texts.items()
+    }
+
+
+def _write_rows(cursor, workshop_ids):
+    rows = _workshop_texts(workshop_ids)
+    cursor.executemany(
+        f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in workshop_ids]
+    )
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, description, services, specialists) VALUES (%s, %s, %s, %s, %s)",
+        [(pk, *values) for pk, values in rows.items()],
+    )
+
+
+def index_workshop(workshop_id):
+    """Переиндексировать одну студию (или удалить её строку, если студии нет)."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        _write_rows(cursor, [workshop_id])
+
+
+def remove_workshop(workshop_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [workshop_id])
+
+
+def rebuild_index(batch_size=500):
+    if not is_available():
+        return
+    ids = list(WorkshopProfile.objects.order_by('pk').values_list('pk', flat=True))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        for i in range(0, len(ids), batch_size):
+            _write_rows(cursor, ids[i:i + batch_size])
+
+
+def matching_ids_sql(match_query):
+    """(sql, params) подзапроса rowid всех студий, подходящих под запрос."""
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_query]
+
+
+def ranked_ids(match_query, candidates_sql=None, candidates_params=(), after=None, limit=20):
+    """
+    [(workshop_id, score)] по возрастанию bm25 (меньше — релевантнее).
+    candidates_sql — подзапрос с workshop_id, которым ограничиваем выдачу
+    (фильтры по городу/категории); after — (score, workshop_id) для keyset.
+    """
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    sql = (
+        f"SELECT rowid, score FROM ("
+        f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [match_query]
+    if candidates_sql:
+        sql += f" AND rowid IN ({candidates_sql})"
+        params.extend(candidates_params)
+    sql += ")"
+    if after:
+        sql += " WHERE score > %s OR (score = %s AND rowid > %s)"
+        params.extend([after[0], after[0], after[1]])
+    sql += " ORDER BY score, rowid LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
@@ -0,0 +1,93 @@
+import json
+import random
+import time
+
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from search.autocomplete import KIND_SERVICE, KIND_WORKSHOP, TrigramIndex
+
+ALPHABET = 'абвгдежзийклмнопрстуфхцчшщыэюя'
+NAME_WORDS = [
+    'студия', 'салон', 'beauty', 'лофт', 'мастерская', 'кабинет', 'ателье', 'бутик',
+    'красоты', 'стиля', 'ногтей', 'волос', 'лица', 'тела', 'взгляда', 'образа',
+]
+
+
+def _typo(rng, text):
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    op = rng.choice(('replace', 'delete', 'swap'))
+    if op == 'replace':
+        return text[:i] + rng.choice(ALPHABET) + text[i + 1:]
+    if op == 'delete':
+        return text[:i] + text[i + 1:]
+    return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк триграммного автодополнения на синтетическом индексе (без БД).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--target-ms', type=float, default=5.0, help='Допустимый p99, мс')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        works = []
+        path = finders.find('services.json')
+        if path:
+            with open(path, 'r', encoding='utf-8') as f:
+                works = [w for item in json.load(f) for w in item.get('works', [])]
+        if not works:
+            raise CommandError('services.json не найден — нечем наполнить словарь услуг.')
+
+        index = TrigramIndex()
+        labels = []
+        started = time.perf_counter()
+        for i in range(options['entries']):
+            if i % 3 == 0:
+                # названия студий: уникальные
+                label = f"{rng.choice(NAME_WORDS).capitalize()} {rng.choice(NAME_WORDS)} {''.join(rng.choices(ALPHABET, k=6))}"
+                index.add(('workshop', i), KIND_WORKSHOP, label, payload=f'user{i}')
+            else:
+                # услуги: вариации названий из services.json
+                label = f"{rng.choice(works)} {''.join(rng.choices(ALPHABET, k=5))}"
+                index.add(('service', i), KIND_SERVICE, label)
+            labels.append(label)
+        build_s = time.perf_counter() - started
+
+        queries = []
+        for _ in range(options['queries']):
+            label = rng.choice(labels)
+            prefix = label[:rng.randint(3, min(len(label), 14))]
+            queries.append(_typo(rng, prefix) if rng.random() < 0.5 else prefix)
+
+        for q in queries[:50]:  # прогрев
+            index.search(q)
+
+        timings = []
+        hits = 0
+        for q in queries:
+            t0 = time.perf_counter()
+            results = index.search(q, limit=10)
+            timings.append((time.perf_counter() - t0) * 1000)
+            hits += bool(results)
+        timings.sort()
+
+        def pct(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+        self.stdout.write(
+            f'entries={len(index)} build={build_s:.1f}s queries={len(queries)} '
+            f'with_results={hits / len(queries):.1%}'
+        )
+        self.stdout.write(
+            f'p50={pct(0.50):.2f}ms p95={pct(0.95):.2f}ms p99={pct(0.99):.2f}ms max={timings[-1]:.2f}ms'
+        )
+        if pct(0.99) > options['target_ms']:
+            raise CommandError(f"p99 {pct(0.99):.2f}ms выше цели {options['target_ms']}ms")
+        self.stdout.write(self.style.SUCCESS(f"p99 в пределах {options['target_ms']}ms"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from search.documents import rebuild_all_documents
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает таблицу поисковых документов студий.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = rebuild_all_documents(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано документов: {total}'))
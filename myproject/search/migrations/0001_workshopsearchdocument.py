@@ -0,0 +1,78 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def populate_documents(apps, schema_editor):
+    WorkshopProfile = apps.get_model('accounts', 'WorkshopProfile')
+    ServicePrice = apps.get_model('accounts', 'ServicePrice')
+    Showcase = apps.get_model('showcase', 'Showcase')
+    Specialist = apps.get_model('showcase', 'Specialist')
+    WorkshopSearchDocument = apps.get_model('search', 'WorkshopSearchDocument')
+
+    prices = {
+        row['workshop']: row
+        for row in ServicePrice.objects.values('workshop').annotate(min_price=Min('price'), max_price=Max('price'))
+    }
+    specialists = dict(
+        Specialist.objects.filter(is_active=True).values_list('showcase__workshop').annotate(n=Count('pk'))
+    )
+    banners = dict(Showcase.objects.exclude(cover_photo='').values_list('workshop_id', 'cover_photo'))
+
+    documents = []
+    for workshop in WorkshopProfile.objects.select_related('user').prefetch_related('activity_area'):
+        areas = sorted(workshop.activity_area.all(), key=lambda a: a.name)
+        codes = sorted({a.code for a in areas})
+        categories = sorted({a.category for a in areas})
+        documents.append(WorkshopSearchDocument(
+            workshop_id=workshop.pk,
+            username=workshop.user.username,
+            name=workshop.workshop_name,
+            city=workshop.city,
+            activity_codes=f",{','.join(codes)}," if codes else '',
+            categories=f",{','.join(categories)}," if categories else '',
+            activity_labels=', '.join(a.name for a in areas),
+            banner=banners.get(workshop.pk) or '',
+            min_price=prices.get(workshop.pk, {}).get('min_price'),
+            max_price=prices.get(workshop.pk, {}).get('max_price'),
+            specialists_count=specialists.get(workshop.pk, 0),
+        ))
+    WorkshopSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkshopSearchDocument',
+            fields=[
+                ('workshop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='accounts.workshopprofile')),
+                ('username', models.CharField(max_length=150)),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='Город')),
+                ('activity_codes', models.TextField(blank=True)),
+                ('categories', models.TextField(blank=True)),
+                ('activity_labels', models.TextField(blank=True, verbose_name='Сферы деятельности')),
+                ('banner', models.CharField(blank=True, max_length=255, verbose_name='Баннер')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('specialists_count', models.PositiveIntegerField(default=0, verbose_name='Активных специалистов')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ студии',
+                'verbose_name_plural': 'Поисковые документы студий',
+                'indexes': [models.Index(fields=['name', 'workshop'], name='search_doc_name_idx'), models.Index(fields=['city', 'name', 'workshop'], name='search_doc_city_name_idx')],
+            },
+        ),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# search/migrations/0002_workshop_fts.py
+from django.db import migrations
+
+FTS_TABLE = 'search_workshop_fts'
+
+SERVICES_SQL = (
+    "(SELECT group_concat(p.service_name, ' ') FROM accounts_serviceprice p "
+    "WHERE p.workshop_id = w.id)"
+)
+SPECIALISTS_SQL = (
+    "(SELECT group_concat(s.position || ' ' || s.bio, ' ') FROM showcase_specialist s "
+    "JOIN showcase_showcase sc ON sc.id = s.showcase_id "
+    "WHERE sc.workshop_id = w.id AND s.is_active)"
+)
+
+
+def _yo(expr):
+    # то же, что search.fulltext.normalize: "ё" -> "е" (регистр сворачивает unicode61)
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, description, services, specialists, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, description, services, specialists) "
+        f"SELECT w.id, {_yo('w.workshop_name')}, {_yo('w.description')}, "
+        f"{_yo(SERVICES_SQL)}, {_yo(SPECIALISTS_SQL)} "
+        "FROM accounts_workshopprofile w"
+    )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_workshopsearchdocument'),
+        ('showcase', '0014_alter_specialist_services'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
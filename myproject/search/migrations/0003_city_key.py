@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+def fill_city_key(apps, schema_editor):
+    # то же, что search.services.normalize_city
+    Document = apps.get_model('search', 'WorkshopSearchDocument')
+    batch = []
+    for document in Document.objects.only('pk', 'city').iterator(chunk_size=1000):
+        document.city_key = ' '.join(document.city.split()).casefold()
+        batch.append(document)
+        if len(batch) >= 1000:
+            Document.objects.bulk_update(batch, ['city_key'])
+            batch = []
+    Document.objects.bulk_update(batch, ['city_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_remove_clientprofile_telegram_and_more'),
+        ('search', '0002_workshop_fts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='workshopsearchdocument',
+            name='search_doc_city_name_idx',
+        ),
+        migrations.AddField(
+            model_name='workshopsearchdocument',
+            name='city_key',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(fill_city_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='workshopsearchdocument',
+            index=models.Index(fields=['city_key', 'name', 'workshop'], name='search_doc_citykey_name_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+def fill_name_key(apps, schema_editor):
+    Document = apps.get_model('search', 'WorkshopSearchDocument')
+    batch = []
+    for document in Document.objects.only('pk', 'name').iterator(chunk_size=1000):
+        document.name_key = document.name.casefold()
+        batch.append(document)
+        if len(batch) >= 1000:
+            Document.objects.bulk_update(batch, ['name_key'])
+            batch = []
+    Document.objects.bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_city_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workshopsearchdocument',
+            name='name_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(fill_name_key, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,49 @@
+from django.core.files.storage import default_storage
 from django.db import models
 
-# Create your models here.
+from accounts.models import WorkshopProfile
+
+
+class WorkshopSearchDocument(models.Model):
+    """
+    Плоская копия данных студии для поиска: одна строка на студию,
+    без JOIN'ов к User, ActivityArea, Showcase и ServicePrice.
+    Поддерживается сигналами (accounts/signals.py, showcase/signals.py),
+    полная пересборка — manage.py rebuild_search_documents.
+    """
+    workshop = models.OneToOneField(
+        WorkshopProfile, on_delete=models.CASCADE, primary_key=True, related_name='search_document'
+    )
+    username = models.CharField(max_length=150)
+    name = models.CharField(max_length=100, verbose_name='Название')
+    city = models.CharField(max_length=100, blank=True, verbose_name='Город')
+    # город в casefold (search.services.normalize_city): фильтр по равенству идёт по индексу,
+    # а LIKE от city__iexact индекс не использует; lower() SQLite кириллицу не сворачивает
+    city_key = models.CharField(max_length=100, blank=True, default='')
+    # название в casefold: фильтр по подстроке name_key__contains=value.casefold(),
+    # LIKE SQLite без учёта регистра сравнивает только ASCII
+    name_key = models.CharField(max_length=255, blank=True, default='')   # casefold может удлинить строку (ß → ss)
+    # коды и категории храним как ",code1,code2," — фильтр через contains=",code,"
+    activity_codes = models.TextField(blank=True)
+    categories = models.TextField(blank=True)
+    activity_labels = models.TextField(blank=True, verbose_name='Сферы деятельности')
+    banner = models.CharField(max_length=255, blank=True, verbose_name='Баннер')
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    specialists_count = models.PositiveIntegerField(default=0, verbose_name='Активных специалистов')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Поисковый документ студии'
+        verbose_name_plural = 'Поисковые документы студий'
+        indexes = [
+            models.Index(fields=['name', 'workshop'], name='search_doc_name_idx'),
+            models.Index(fields=['city_key', 'name', 'workshop'], name='search_doc_citykey_name_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def banner_url(self):
+        return default_storage.url(self.banner) if self.banner else None
@@ -0,0 +1,181 @@
+# search/services.py
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import fulltext
+from .models import WorkshopSearchDocument
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# диапазоны по минимальной цене услуги студии: (ключ, подпись, от, до)
+PRICE_BUCKETS = [
+    ('0-30', 'до 30 руб.', None, 30),
+    ('30-60', '30–60 руб.', 30, 60),
+    ('60-100', '60–100 руб.', 60, 100),
+    ('100-', 'от 100 руб.', 100, None),
+]
+
+
+def normalize_city(city):
+    """Ключ города для WorkshopSearchDocument.city_key: без пробелов по краям, в casefold."""
+    return ' '.join((city or '').split()).casefold()
+
+
+@dataclass
+class SearchFilters:
+    city: str = ''
+    area: str = ''       # ActivityArea.code
+    category: str = ''   # ActivityArea.category
+    name: str = ''       # подстрока названия студии
+    q: str = ''          # полнотекстовый запрос (FTS5, ранжирование bm25)
+    price: str = ''      # ключ из PRICE_BUCKETS
+
+    @classmethod
+    def from_request(cls, request):
+        get = request.GET
+        return cls(
+            city=get.get('city', '').strip(),
+            area=get.get('area', '').strip(),
+            category=get.get('category', '').strip(),
+            name=get.get('name', '').strip(),
+            q=get.get('q', '').strip(),
+            price=get.get('price', '').strip(),
+        )
+
+    def as_query(self):
+        """Непустые фильтры — для ссылок пагинации."""
+        return {k: v for k, v in self.__dict__.items() if v}
+
+
+@dataclass
+class SearchPage:
+    results: list = field(default_factory=list)
+    next_cursor: str = None
+
+
+def encode_cursor(key, pk):
+    raw = json.dumps([key, pk], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor, key_type=str):
+    """Возвращает (key, pk) или None, если курсор битый."""
+    if not cursor:
+        return None
+    try:
+        key, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return key_type(key), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_result(doc):
+    return {
+        'username': doc.username,
+        'name': doc.name,
+        'city': doc.city,
+        'activities': doc.activity_labels or 'Не указано',
+        'banner': doc.banner_url,
+    }
+
+
+def price_bucket_q(key):
+    for bucket_key, _, low, high in PRICE_BUCKETS:
+        if bucket_key == key:
+            q = Q(min_price__isnull=False)
+            if low is not None:
+                q &= Q(min_price__gte=low)
+            if high is not None:
+                q &= Q(min_price__lt=high)
+            return q
+    return None
+
+
+def filtered_documents(filters, exclude=None):
+    """WorkshopSearchDocument с фильтрами страницы; exclude — имя фильтра, который пропускаем."""
+    qs = WorkshopSearchDocument.objects.all()
+    if filters.city and exclude != 'city':
+        qs = qs.filter(city_key=normalize_city(filters.city))
+    if filters.area and exclude != 'area':
+        qs = qs.filter(activity_codes__contains=f',{filters.area},')
+    if filters.category and exclude != 'category':
+        qs = qs.filter(categories__contains=f',{filters.category},')
+    if filters.price and exclude != 'price':
+        bucket_q = price_bucket_q(filters.price)
+        if bucket_q is not None:
+            qs = qs.filter(bucket_q)
+    if filters.name:
+        qs = qs.filter(name_key__contains=filters.name.casefold())
+    if filters.q and exclude != 'q':
+        match_query = fulltext.build_match_query(filters.q)
+        if match_query and fulltext.is_available():
+            qs = qs.filter(workshop_id__in=RawSQL(*fulltext.matching_ids_sql(match_query)))
+        elif match_query:
+            qs = qs.filter(name_key__contains=filters.q.casefold())
+    return qs
+
+
+def search_workshops(filters, cursor=None, limit=PAGE_SIZE):
+    """
+    Один запрос к плоской таблице WorkshopSearchDocument с keyset-пагинацией
+    по (name, workshop_id): стоимость страницы не зависит от её номера
+    и размера каталога. С filters.q выдача ранжируется по bm25 (FTS5).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    match_query = fulltext.build_match_query(filters.q) if filters.q else ''
+    if match_query and fulltext.is_available():
+        return _search_ranked(filtered_documents(filters, exclude='q'), match_query, cursor, limit)
+
+    qs = filtered_documents(filters)
+
+    after = decode_cursor(cursor)
+    if after:
+        after_name, after_pk = after
+        qs = qs.filter(Q(name__gt=after_name) | Q(name=after_name, workshop_id__gt=after_pk))
+
+    documents = list(qs.order_by('name', 'workshop_id')[:limit + 1])
+    has_next = len(documents) > limit
+    documents = documents[:limit]
+
+    results = [_to_result(doc) for doc in documents]
+
+    next_cursor = None
+    if has_next and documents:
+        last = documents[-1]
+        next_cursor = encode_cursor(last.name, last.workshop_id)
+    return SearchPage(results=results, next_cursor=next_cursor)
+
+
+def _search_ranked(qs, match_query, cursor, limit):
+    """
+    Полнотекстовый путь: id и bm25 берём из FTS5 (фильтры страницы
+    передаются подзапросом), затем документы одним запросом по pk.
+    Keyset-курсор — (score, workshop_id).
+    """
+    candidates_sql, candidates_params = None, ()
+    if qs.query.where:
+        candidates_sql, candidates_params = qs.values('workshop_id').query.sql_with_params()
+
+    ranked = fulltext.ranked_ids(
+        match_query,
+        candidates_sql=candidates_sql,
+        candidates_params=candidates_params,
+        after=decode_cursor(cursor, key_type=float),
+        limit=limit + 1,
+    )
+    has_next = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    documents = WorkshopSearchDocument.objects.in_bulk([pk for pk, _ in ranked])
+    results = [_to_result(documents[pk]) for pk, _ in ranked if pk in documents]
+
+    next_cursor = None
+    if has_next and ranked:
+        last_pk, last_score = ranked[-1]
+        next_cursor = encode_cursor(last_score, last_pk)
+    return SearchPage(results=results, next_cursor=next_cursor)
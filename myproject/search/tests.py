@@ -1,3 +1,246 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import ActivityArea, ServicePrice, WorkshopProfile
+from showcase.models import Showcase, Specialist
+from . import autocomplete, fulltext
+from .facets import compute_facets
+from .models import WorkshopSearchDocument
+from .services import SearchFilters, filtered_documents, search_workshops
+
+
+def make_area(code, category='hair', name=None):
+    return ActivityArea.objects.create(code=code, category=category, name=name or code)
+
+
+def make_workshop(username, name, city='Минск', areas=(), description=''):
+    user = User.objects.create_user(username)
+    workshop = WorkshopProfile.objects.create(
+        user=user, workshop_name=name, workshop_address='ул. Ленина, 1', phone='+375291234567',
+        city=city, description=description,
+    )
+    if areas:
+        workshop.activity_area.set(areas)
+    return workshop
+
+
+def add_price(workshop, price, name='Услуга', area=None):
+    area = area or ActivityArea.objects.first() or make_area('test_area')
+    return ServicePrice.objects.create(workshop=workshop, activity_area=area, service_name=name, price=price)
+
+
+def names(page):
+    return [result['name'] for result in page.results]
+
+
+class SearchViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('search:search'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        area = make_area('test_hair')
+        for i in range(3):
+            add_price(make_workshop(f's{i}', f'Студия {i:03d}', areas=[area]), 30 + i, area=area)
+        small = [self.count_queries(params) for params in ({}, {'q': 'студия'}, {'city': 'Минск', 'price': '30-60'})]
+        for i in range(3, 45):
+            add_price(make_workshop(f's{i}', f'Студия {i:03d}', areas=[area]), 30 + i, area=area)
+        large = [self.count_queries(params) for params in ({}, {'q': 'студия'}, {'city': 'Минск', 'price': '30-60'})]
+        self.assertEqual(small, large)
+
+    def test_cursor_pagination_walks_all_pages_once(self):
+        for i in range(45):
+            make_workshop(f's{i}', f'Студия {i:03d}')
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = search_workshops(SearchFilters(), cursor=cursor)
+            seen.extend(names(page))
+            pages += 1
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [f'Студия {i:03d}' for i in range(45)])
+
+    def test_broken_cursor_starts_from_first_page(self):
+        make_workshop('a', 'Альфа')
+        self.assertEqual(names(search_workshops(SearchFilters(), cursor='не курсор')), ['Альфа'])
+
+
+class FilterAndFullTextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.nails = make_area('test_nails', category='nails')
+        self.hair = make_area('test_hair', category='hair')
+        self.by_name = make_workshop('a', 'Маникюр Люкс', areas=[self.nails])
+        add_price(self.by_name, 25, area=self.nails)
+        self.by_text = make_workshop('b', 'Бьюти Дом', city='Гомель', areas=[self.nails, self.hair],
+                                     description='Делаем маникюр и педикюр')
+        add_price(self.by_text, 80, area=self.hair)
+        self.other = make_workshop('c', 'Барбершоп', areas=[self.hair], description='Стрижки')
+
+    def test_filters(self):
+        self.assertEqual(names(search_workshops(SearchFilters(area='test_hair'))), ['Барбершоп', 'Бьюти Дом'])
+        self.assertEqual(names(search_workshops(SearchFilters(category='nails'))), ['Бьюти Дом', 'Маникюр Люкс'])
+        self.assertEqual(names(search_workshops(SearchFilters(price='60-100'))), ['Бьюти Дом'])
+        self.assertEqual(names(search_workshops(SearchFilters(name='Дом'))), ['Бьюти Дом'])
+
+    def test_name_filter_ignores_cyrillic_case(self):
+        make_workshop('d', 'Студия Маникюра')
+        self.assertEqual(names(search_workshops(SearchFilters(name='маникюр'))), ['Маникюр Люкс', 'Студия Маникюра'])
+        self.assertEqual(names(search_workshops(SearchFilters(name='СТУДИЯ'))), ['Студия Маникюра'])
+
+    def test_full_text_matches_word_forms_and_ranks_name_first(self):
+        self.assertEqual(fulltext.build_match_query('Маникюра!'), '"маникюр"*')
+        self.assertEqual(names(search_workshops(SearchFilters(q='маникюра'))), ['Маникюр Люкс', 'Бьюти Дом'])
+        self.assertEqual(names(search_workshops(SearchFilters(q='стрижка'))), ['Барбершоп'])
+
+    def test_ranked_pages_and_filters(self):
+        first = search_workshops(SearchFilters(q='маникюр'), limit=1)
+        second = search_workshops(SearchFilters(q='маникюр'), cursor=first.next_cursor, limit=1)
+        self.assertEqual((names(first), names(second), second.next_cursor), (['Маникюр Люкс'], ['Бьюти Дом'], None))
+        self.assertEqual(names(search_workshops(SearchFilters(q='маникюр', city='гомель'))), ['Бьюти Дом'])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.nails = make_area('test_nails', category='nails')
+        add_price(make_workshop('a', 'Альфа', areas=[self.nails]), 25, area=self.nails)
+        add_price(make_workshop('b', 'Бета', city='Гомель', areas=[self.nails]), 70, area=self.nails)
+
+    def counts(self, facet, filters=None):
+        return {item['value']: item['count'] for item in compute_facets(filters or SearchFilters())[facet]}
+
+    def test_each_facet_ignores_its_own_filter(self):
+        filters = SearchFilters(city='Минск', category='nails')
+        self.assertEqual(self.counts('cities', filters), {'Минск': 1, 'Гомель': 1})
+        self.assertEqual(self.counts('categories', filters), {'nails': 1})
+        self.assertEqual(self.counts('prices', filters), {'0-30': 1, '30-60': 0, '60-100': 0, '100-': 0})
+
+    def test_cached_until_documents_change(self):
+        self.assertEqual(self.counts('cities'), {'Минск': 1, 'Гомель': 1})
+        with self.assertNumQueries(0):
+            self.counts('cities')
+        make_workshop('c', 'Гамма', city='Гомель')
+        self.assertEqual(self.counts('cities'), {'Гомель': 2, 'Минск': 1})
+
+
+class DocumentSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.workshop = make_workshop('studio', 'Студия')
+
+    def document(self):
+        return WorkshopSearchDocument.objects.get(workshop=self.workshop)
+
+    def test_document_follows_related_changes(self):
+        area = make_area('test_brows', category='brows_lashes', name='Брови')
+        self.workshop.activity_area.add(area)
+        add_price(self.workshop, 40, area=area)
+        add_price(self.workshop, 15, area=area)
+        showcase = Showcase.objects.create(workshop=self.workshop)
+        Specialist.objects.create(showcase=showcase, first_name='Анна')
+        Specialist.objects.create(showcase=showcase, first_name='Олег', is_active=False)
+        self.workshop.user.username = 'renamed'
+        self.workshop.user.save()
+
+        document = self.document()
+        self.assertEqual(
+            (document.activity_codes, document.categories, document.activity_labels),
+            (',test_brows,', ',brows_lashes,', 'Брови'),
+        )
+        self.assertEqual((document.min_price, document.max_price, document.specialists_count), (15, 40, 1))
+        self.assertEqual(document.username, 'renamed')
+
+    def test_activity_area_changes_reach_documents(self):
+        area = make_area('test_brows', category='brows_lashes', name='Брови')
+        self.workshop.activity_area.add(area)
+        area.name, area.category = 'Брови и ресницы', 'makeup'
+        area.save()
+        document = self.document()
+        self.assertEqual((document.activity_labels, document.categories), ('Брови и ресницы', ',makeup,'))
+        self.assertEqual(names(search_workshops(SearchFilters(category='makeup'))), ['Студия'])
+
+        area.delete()
+        document = self.document()
+        self.assertEqual((document.activity_codes, document.categories, document.activity_labels), ('', '', ''))
+
+    def test_rename_and_delete_reach_full_text_index(self):
+        self.workshop.workshop_name = 'Лилия'
+        self.workshop.save()
+        self.assertEqual(names(search_workshops(SearchFilters(q='лилия'))), ['Лилия'])
+        self.workshop.user.delete()
+        self.assertFalse(WorkshopSearchDocument.objects.exists())
+        self.assertEqual(names(search_workshops(SearchFilters(q='лилия'))), [])
+
+
+class CityFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_workshop('a', 'Альфа', city='Минск')
+        make_workshop('b', 'Бета', city='  минск ')
+        make_workshop('c', 'Гамма', city='Гомель')
+
+    def test_city_is_matched_case_insensitively_for_cyrillic(self):
+        page = search_workshops(SearchFilters(city='МИНСК'))
+        self.assertEqual([r['name'] for r in page.results], ['Альфа', 'Бета'])
+
+    def test_city_filter_uses_city_index(self):
+        qs = filtered_documents(SearchFilters(city='Гомель')).order_by('name', 'workshop_id')
+        self.assertIn('search_doc_citykey_name_idx', qs.explain())
+
+    def test_city_facet_groups_spellings(self):
+        response = self.client.get(reverse('search:search'), {'city': 'минск'})
+        cities = {item['label']: (item['count'], item['selected']) for item in response.context['facet_cities']}
+        self.assertEqual(cities, {'Минск': (2, True), 'Гомель': (1, False)})
+
+
+class AutocompleteIndexTests(TestCase):
+    def setUp(self):
+        autocomplete.reset_index()
+        self.addCleanup(autocomplete.reset_index)
+        self.workshop = make_workshop('roza', 'Салон Роза')
+        self.index = autocomplete.get_index()
+
+    def labels(self, query):
+        return [entry.label for entry, _ in self.index.search(query)]
+
+    def test_renamed_workshop_replaces_old_trigrams(self):
+        self.workshop.workshop_name = 'Студия Лилия'
+        self.workshop.save()
+        self.assertIn('Студия Лилия', self.labels('лилия'))
+        self.assertNotIn('Салон Роза', self.labels('роза'))
+
+    def test_same_name_only_updates_payload(self):
+        self.index.add(('workshop', self.workshop.pk), autocomplete.KIND_WORKSHOP, 'салон  роза', payload='new')
+        [(entry, _)] = [(e, s) for e, s in self.index.search('роза') if e.kind == autocomplete.KIND_WORKSHOP]
+        self.assertEqual((entry.label, entry.payload), ('Салон Роза', 'new'))
+
+    def test_services_share_entry_until_last_source_removed(self):
+        area = make_area('test_manicure', category='nails')
+        first = ServicePrice.objects.create(workshop=self.workshop, activity_area=area, service_name='Маникюр', price=20)
+        other = make_workshop('liliya', 'Лилия')
+        second = ServicePrice.objects.create(workshop=other, activity_area=area, service_name='маникюр', price=25)
+        [shared] = [e for e, _ in self.index.search('маникюр') if ('service', first.pk) in e.sources]
+        self.assertIn(('service', second.pk), shared.sources)
+
+        first.delete()
+        self.assertTrue([e for e, _ in self.index.search('маникюр') if ('service', second.pk) in e.sources])
+        second.service_name = 'Педикюр'
+        second.save()
+        self.assertFalse([e for e, _ in self.index.search('маникюр') if ('service', second.pk) in e.sources])
+        self.assertIn('Педикюр', self.labels('педикюр'))
+
+    def test_typo_still_matches(self):
+        self.assertEqual(self.labels('салн роза')[0], 'Салон Роза')
@@ -5,4 +5,5 @@ app_name = 'search'
 
 urlpatterns = [
     path('', views.search_view, name='search'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
 ]
\ No newline at end of file
@@ -1,28 +1,70 @@
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.http import urlencode
 
-# Create your views here.
-from django.shortcuts import render
-from accounts.models import WorkshopProfile
-from showcase.models import Showcase
+from accounts.models import ActivityArea
+from . import autocomplete
+from .facets import compute_facets
+from .services import PRICE_BUCKETS, SearchFilters, normalize_city, search_workshops
+
+
+def _facet_links(filters, param, items):
+    """Элементы фасета со ссылками: клик ставит значение фильтра, повторный — снимает."""
+    current = getattr(filters, param)
+    links = []
+    for item in items:
+        query = filters.as_query()
+        # город в фильтре может быть набран в другом регистре, чем в фасете
+        selected = normalize_city(item['value']) == normalize_city(current)
+        if selected:
+            query.pop(param, None)
+        else:
+            query[param] = item['value']
+        links.append({**item, 'selected': selected, 'url': '?' + urlencode(query)})
+    return links
 
-from django.shortcuts import render
-from accounts.models import WorkshopProfile
-from showcase.models import Showcase
 
 def search_view(request):
-    workshops = WorkshopProfile.objects.all().order_by('workshop_name')
-    workshop_data = []
-    for workshop in workshops:
-        activities = ', '.join([area.name for area in workshop.activity_area.all()])
-        try:
-            showcase = workshop.showcase
-            banner = showcase.cover_photo.url if showcase.cover_photo else None
-        except Showcase.DoesNotExist:
-            banner = None
-        workshop_data.append({
-            'username': workshop.user.username,
-            'name': workshop.workshop_name,
-            'activities': activities or 'Не указано',
-            'banner': banner,
-        })
-    return render(request, 'search/search.html', {'workshops': workshop_data})
\ No newline at end of file
+    filters = SearchFilters.from_request(request)
+    page = search_workshops(filters, cursor=request.GET.get('after'))
+
+    next_url = None
+    if page.next_cursor:
+        next_url = '?' + urlencode({**filters.as_query(), 'after': page.next_cursor})
+
+    facets = compute_facets(filters)
+
+    return render(request, 'search/search.html', {
+        'workshops': page.results,
+        'filters': filters,
+        'next_url': next_url,
+        'is_first_page': not request.GET.get('after'),
+        'categories': ActivityArea.CATEGORY_CHOICES,
+        'areas': ActivityArea.objects.order_by('category', 'name').only('code', 'name'),
+        'price_buckets': [(key, label) for key, label, _, _ in PRICE_BUCKETS],
+        'facet_categories': _facet_links(filters, 'category', facets['categories']),
+        'facet_cities': _facet_links(filters, 'city', facets['cities']),
+        'facet_prices': _facet_links(filters, 'price', facets['prices']),
+    })
+
+
+def autocomplete_view(request):
+    """JSON-подсказки для строки поиска: ?q=маник&limit=10."""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 20))
+    except ValueError:
+        limit = 10
+    if len(query) < autocomplete.MIN_QUERY_LENGTH:
+        return JsonResponse({'query': query, 'results': []})
+
+    results = []
+    for entry, score in autocomplete.get_index().search(query, limit=limit):
+        item = {'label': entry.label, 'kind': entry.kind, 'score': round(score, 3)}
+        if entry.kind == autocomplete.KIND_WORKSHOP:
+            item['url'] = reverse('showcase:view_showcase', kwargs={'username': entry.payload})
+        else:
+            item['url'] = reverse('search:search') + '?' + urlencode({'q': entry.label})
+        results.append(item)
+    return JsonResponse({'query': query, 'results': results})
@@ -0,0 +1,37 @@
+# showcase/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from search.documents import is_workshop_cascade, refresh_workshop_document
+from .models import Showcase, Specialist
+
+
+def _workshop_id(showcase_id):
+    return Showcase.objects.filter(pk=showcase_id).values_list('workshop_id', flat=True).first()
+
+
+@receiver(post_save, sender=Showcase)
+def showcase_saved(sender, instance, **kwargs):
+    refresh_workshop_document(instance.workshop_id)
+
+
+@receiver(post_delete, sender=Showcase)
+def showcase_deleted(sender, instance, origin=None, **kwargs):
+    if not is_workshop_cascade(origin):
+        refresh_workshop_document(instance.workshop_id)
+
+
+@receiver(post_save, sender=Specialist)
+def specialist_saved(sender, instance, **kwargs):
+    workshop_id = _workshop_id(instance.showcase_id)
+    if workshop_id:
+        refresh_workshop_document(workshop_id)
+
+
+@receiver(post_delete, sender=Specialist)
+def specialist_deleted(sender, instance, origin=None, **kwargs):
+    if is_workshop_cascade(origin):
+        return
+    workshop_id = _workshop_id(instance.showcase_id)
+    if workshop_id:
+        refresh_workshop_document(workshop_id)